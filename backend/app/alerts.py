@@ -0,0 +1,226 @@
+"""
+庫存告警規則
+
+每次抽取庫存時，upsert 語句直接返回這次新增或數量、狀態有變動的列（連同變動前的值），
+規則只針對這些列評估，需要其他資料時也只以變動的日期查詢索引，不重新掃描整張表：
+
+- low_availability: 變動日期的整個營區已接近售完（開放房型的入住率達門檻）
+- occupancy_jump: 與最新快照相比，同一房型同一天的入住率變化超過門檻
+- status_closed: 未來日期由 OPEN 改為 CLOSE
+- suspicious_response: PMS 回傳的每一天剩餘房數都是 0，而原本還有空房（疑似異常回應）
+
+觸發的告警寫入 inventory_alerts 並發出 alerts.fired 事件；同一告警（規則、房型、日期）
+在確認前不會重複觸發。
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List, Optional
+
+import asyncpg
+
+from metrics import ALERTS_FIRED
+
+logger = logging.getLogger(__name__)
+
+# 營區入住率達此百分比視為即將售完
+LOW_AVAILABILITY_OCCUPANCY = float(os.getenv("ALERT_LOW_AVAILABILITY_OCCUPANCY", "90"))
+
+# 只對今天起幾天內的日期發出即將售完告警
+LOW_AVAILABILITY_DAYS = int(os.getenv("ALERT_LOW_AVAILABILITY_DAYS", "60"))
+
+# 與最新快照相比，入住率變化超過幾個百分點視為異常
+OCCUPANCY_JUMP_POINTS = float(os.getenv("ALERT_OCCUPANCY_JUMP_POINTS", "50"))
+
+# 回應至少有幾天才判斷是否全為 0
+SUSPICIOUS_RESPONSE_MIN_DAYS = 7
+
+WEEKDAY_NAMES = ("一", "二", "三", "四", "五", "六", "日")
+
+
+@dataclass
+class IngestChanges:
+    """一次抽取（一個房型）寫入的內容：收到的筆數與變動的列"""
+    hotel_id: str
+    inv_type_code: str
+    received: int = 0
+    zero_quantity: int = 0
+    rows: List[dict] = field(default_factory=list)  # date, quantity, status, previous_quantity, previous_status
+
+    def add(self, items: List[dict], changed_rows) -> None:
+        self.received += len(items)
+        self.zero_quantity += sum(1 for item in items if item["quantity"] == 0)
+        self.rows.extend(dict(row) for row in changed_rows)
+
+
+def _alert(rule: str, severity: str, changes: IngestChanges, message: str,
+           target_date: Optional[date] = None, inv_type_code: Optional[str] = None, **details) -> dict:
+    return {
+        "rule": rule,
+        "severity": severity,
+        "hotel_id": changes.hotel_id,
+        "inv_type_code": inv_type_code,
+        "target_date": target_date,
+        "message": message,
+        "details": details,
+    }
+
+
+async def _low_availability(conn, changes: IngestChanges, today: date) -> List[dict]:
+    dates = sorted({row["date"] for row in changes.rows
+                    if today <= row["date"] <= today + timedelta(days=LOW_AVAILABILITY_DAYS)})
+    if not dates:
+        return []
+
+    rows = await conn.fetch("""
+        SELECT i.date,
+               SUM(rt.total_rooms) FILTER (WHERE i.status = 'OPEN') AS open_rooms,
+               SUM(i.quantity) FILTER (WHERE i.status = 'OPEN') AS available
+        FROM inventory_data i
+        JOIN room_types rt ON rt.hotel_id = i.hotel_id AND rt.inv_type_code = i.inv_type_code
+        WHERE i.hotel_id = $1 AND i.date = ANY($2::date[])
+        GROUP BY i.date
+    """, changes.hotel_id, dates)
+
+    alerts = []
+    for row in rows:
+        if not row["open_rooms"]:
+            continue
+        occupancy = round((row["open_rooms"] - row["available"]) / row["open_rooms"] * 100, 2)
+        if occupancy < LOW_AVAILABILITY_OCCUPANCY:
+            continue
+        weekday = WEEKDAY_NAMES[row["date"].weekday()]
+        alerts.append(_alert(
+            "low_availability", "critical" if row["available"] <= 0 else "warning", changes,
+            f"{row['date']}（{weekday}）入住率 {occupancy}%，剩餘 {row['available']} 間",
+            target_date=row["date"], occupancy_rate=occupancy,
+            available=row["available"], open_rooms=row["open_rooms"],
+            weekend=row["date"].weekday() >= 4,
+        ))
+    return alerts
+
+
+async def _occupancy_jump(conn, changes: IngestChanges, total_rooms: int) -> List[dict]:
+    snapshot = await conn.fetchrow("""
+        SELECT id, snapshot_date FROM data_snapshots
+        WHERE status = 'completed'
+        ORDER BY snapshot_date DESC LIMIT 1
+    """)
+    if snapshot is None or not total_rooms:
+        return []
+
+    changed = {row["date"]: row for row in changes.rows}
+    previous = await conn.fetch("""
+        SELECT date, quantity FROM inventory_snapshots
+        WHERE snapshot_id = $1 AND snapshot_date = $2
+          AND inv_type_code = $3 AND hotel_id = $4 AND date = ANY($5::date[])
+    """, snapshot["id"], snapshot["snapshot_date"], changes.inv_type_code, changes.hotel_id,
+        list(changed))
+
+    alerts = []
+    for row in previous:
+        # 剩餘房數減少即入住率上升
+        points = round((row["quantity"] - changed[row["date"]]["quantity"]) / total_rooms * 100, 2)
+        if abs(points) < OCCUPANCY_JUMP_POINTS:
+            continue
+        alerts.append(_alert(
+            "occupancy_jump", "warning", changes,
+            f"{row['date']} 入住率較 {snapshot['snapshot_date']} 快照{'上升' if points > 0 else '下降'} "
+            f"{abs(points)} 個百分點",
+            target_date=row["date"], inv_type_code=changes.inv_type_code, change_points=points,
+            snapshot_date=snapshot["snapshot_date"], snapshot_quantity=row["quantity"],
+            quantity=changed[row["date"]]["quantity"],
+        ))
+    return alerts
+
+
+def _status_closed(changes: IngestChanges, today: date) -> List[dict]:
+    dates = sorted(row["date"] for row in changes.rows
+                   if row["date"] >= today and row["previous_status"] == "OPEN" and row["status"] == "CLOSE")
+    if not dates:
+        return []
+    # 同一次抽取關閉的日期合併為一則
+    return [_alert(
+        "status_closed", "info", changes,
+        f"{len(dates)} 天改為 CLOSE（{dates[0]} ~ {dates[-1]}）",
+        target_date=dates[0], inv_type_code=changes.inv_type_code, dates=dates,
+    )]
+
+
+def _suspicious_response(changes: IngestChanges) -> List[dict]:
+    if changes.received < SUSPICIOUS_RESPONSE_MIN_DAYS or changes.zero_quantity < changes.received:
+        return []
+    previous_available = sum(row["previous_quantity"] or 0 for row in changes.rows)
+    if not previous_available:
+        return []
+    return [_alert(
+        "suspicious_response", "critical", changes,
+        f"PMS 回傳 {changes.received} 天剩餘房數皆為 0（原本共有 {previous_available} 間空房）",
+        inv_type_code=changes.inv_type_code, days=changes.received, previous_available=previous_available,
+    )]
+
+
+async def evaluate_ingest(conn, changes: IngestChanges, today: Optional[date] = None) -> List[dict]:
+    """對這次抽取變動的列評估所有規則，返回觸發的告警（尚未寫入）"""
+    if not changes.rows:
+        return []
+    today = today or date.today()
+    total_rooms = await conn.fetchval(
+        "SELECT total_rooms FROM room_types WHERE hotel_id = $1 AND inv_type_code = $2",
+        changes.hotel_id, changes.inv_type_code)
+
+    alerts = _suspicious_response(changes)
+    # 疑似異常的回應不再產生即將售完或入住率跳動的告警
+    if not alerts:
+        alerts += await _low_availability(conn, changes, today)
+        alerts += await _occupancy_jump(conn, changes, total_rooms)
+    alerts += _status_closed(changes, today)
+    return alerts
+
+
+def _dedupe_key(alert: dict) -> str:
+    return ":".join(str(alert[k] or "") for k in ("rule", "hotel_id", "inv_type_code", "target_date"))
+
+
+async def store_alerts(conn, alerts: List[dict]) -> List[dict]:
+    """寫入告警，已有未確認的相同告警時略過，返回新觸發的告警"""
+    if not alerts:
+        return []
+
+    rows = await conn.fetch("""
+        INSERT INTO inventory_alerts
+        (rule, severity, hotel_id, inv_type_code, target_date, message, details, dedupe_key)
+        SELECT t.rule, t.severity, t.hotel_id, t.inv_type_code, t.target_date, t.message,
+               t.details::jsonb, t.dedupe_key
+        FROM unnest($1::varchar[], $2::varchar[], $3::varchar[], $4::varchar[], $5::date[],
+                    $6::text[], $7::text[], $8::varchar[])
+            AS t(rule, severity, hotel_id, inv_type_code, target_date, message, details, dedupe_key)
+        ON CONFLICT (dedupe_key) WHERE acknowledged_at IS NULL DO NOTHING
+        RETURNING id, rule, severity, hotel_id, inv_type_code, target_date, message, fired_at
+    """,
+        [a["rule"] for a in alerts],
+        [a["severity"] for a in alerts],
+        [a["hotel_id"] for a in alerts],
+        [a["inv_type_code"] for a in alerts],
+        [a["target_date"] for a in alerts],
+        [a["message"] for a in alerts],
+        [json.dumps(a["details"], ensure_ascii=False, default=str) for a in alerts],
+        [_dedupe_key(a) for a in alerts])
+
+    for row in rows:
+        ALERTS_FIRED.inc(rule=row["rule"], hotel_id=row["hotel_id"])
+    return [dict(row) for row in rows]
+
+
+async def process_ingest(conn, changes: IngestChanges) -> List[dict]:
+    """評估並保存一次抽取的告警；inventory_alerts 表尚未建立時略過"""
+    try:
+        fired = await store_alerts(conn, await evaluate_ingest(conn, changes))
+    except asyncpg.UndefinedTableError:
+        return []
+    for alert in fired:
+        logger.warning(f"🚨 [{alert['rule']}] 酒店 {alert['hotel_id']} {alert['inv_type_code'] or ''}: "
+                       f"{alert['message']}")
+    return fired
@@ -0,0 +1,147 @@
+"""
+空房搜尋索引
+
+電話訂房時要立即回答「這幾天哪些營區、哪些房型還有 N 間以上」。每個行程保存一份
+房型 × 日期的可售房數陣列（今天起 AVAILABILITY_DAYS 天，CLOSE 或沒有庫存數據的日子為 0），
+搜尋只是對陣列切片取最小值，不查詢資料庫。
+
+與目錄相同採延遲重新載入：庫存寫入（inventory.updated）、房型異動（room_types.updated）
+與 LISTEN 重連（listener.connected）時標記過期，下次搜尋時重新載入；跨日後也會重新載入。
+載入只讀取 OPEN 且有剩餘房數的列，由 idx_inventory_data_open 部分索引以 index-only scan 取得。
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+from catalog import CatalogSnapshot, RoomTypeKey
+
+logger = logging.getLogger(__name__)
+
+# 索引涵蓋今天起幾天
+AVAILABILITY_DAYS = int(os.getenv("AVAILABILITY_INDEX_DAYS", "365"))
+
+AVAILABILITY_EVENTS = ("inventory.updated", "room_types.updated", "listener.connected")
+
+
+class AvailabilityCube:
+    """某一時間點的可售房數，建立後不再變動"""
+
+    def __init__(self, start_date: date, keys: List[RoomTypeKey], available: np.ndarray,
+                 catalog: CatalogSnapshot):
+        self.start_date = start_date
+        self.end_date = start_date + timedelta(days=available.shape[1] - 1)
+        self.keys = keys
+        self.available = available
+        self.catalog = catalog
+        self.loaded_at = datetime.now()
+
+    def covers(self, start_date: date, end_date: date) -> bool:
+        return self.start_date <= start_date and end_date <= self.end_date
+
+    def search(self, start_date: date, end_date: date, min_units: int = 1,
+               hotel_id: Optional[str] = None, inv_type_code: Optional[str] = None,
+               require_all_dates: bool = True) -> List[dict]:
+        """
+        返回在區間內有 min_units 間以上可售的房型與日期
+
+        require_all_dates 為 True 時只返回每一天都符合的房型（整段住宿可訂）。
+        """
+        first = (start_date - self.start_date).days
+        window = self.available[:, first:first + (end_date - start_date).days + 1]
+        matched = window >= min_units
+        rows = np.flatnonzero(matched.all(axis=1) if require_all_dates else matched.any(axis=1))
+
+        results = []
+        for r in rows:
+            key = self.keys[r]
+            if (hotel_id and key[0] != hotel_id) or (inv_type_code and key[1] != inv_type_code):
+                continue
+            rt = self.catalog.room_type(*key)
+            days = np.flatnonzero(matched[r])
+            results.append({
+                "hotel_id": key[0],
+                "hotel_name": rt["hotel_name"],
+                "inv_type_code": key[1],
+                "room_type_name": rt["name"],
+                "min_available": int(window[r].min()),
+                "dates": [{"date": start_date + timedelta(days=int(d)), "available": int(window[r, d])}
+                          for d in days],
+            })
+        return results
+
+
+class AvailabilityIndex:
+    """行程內共用的空房索引，過期時在下次搜尋時重新載入"""
+
+    def __init__(self, days: int = AVAILABILITY_DAYS):
+        self.days = days
+        self._cube: Optional[AvailabilityCube] = None
+        self._version = 0
+        self._loaded_version = -1
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def current(self) -> Optional[AvailabilityCube]:
+        return self._cube
+
+    def invalidate(self) -> None:
+        self._version += 1
+
+    def handle_event(self, event: dict) -> None:
+        if event.get("event") in AVAILABILITY_EVENTS:
+            self.invalidate()
+
+    def _is_fresh(self, cube: Optional[AvailabilityCube], catalog: CatalogSnapshot) -> bool:
+        return (cube is not None and self._loaded_version == self._version
+                and cube.catalog is catalog and cube.start_date == date.today())
+
+    async def load(self, conn, catalog: CatalogSnapshot) -> AvailabilityCube:
+        version = self._version
+        started = time.perf_counter()
+        start_date = date.today()
+        keys = [(rt["hotel_id"], rt["inv_type_code"]) for rt in catalog.list_room_types()]
+        positions = {key: i for i, key in enumerate(keys)}
+
+        rows = await conn.fetch("""
+            SELECT hotel_id, inv_type_code, date, quantity
+            FROM inventory_data
+            WHERE status = 'OPEN' AND quantity > 0 AND date BETWEEN $1 AND $2
+        """, start_date, start_date + timedelta(days=self.days - 1))
+
+        available = np.zeros((len(keys), self.days), dtype=np.int32)
+        # 目錄中沒有的房型（已刪除）略過
+        rows = [row for row in rows if (row["hotel_id"], row["inv_type_code"]) in positions]
+        if rows:
+            room_index = np.fromiter((positions[(row["hotel_id"], row["inv_type_code"])] for row in rows),
+                                     dtype=np.int64, count=len(rows))
+            day_index = np.fromiter(((row["date"] - start_date).days for row in rows),
+                                    dtype=np.int64, count=len(rows))
+            available[room_index, day_index] = [row["quantity"] for row in rows]
+
+        self._cube = AvailabilityCube(start_date, keys, available, catalog)
+        # 載入期間又收到異動事件時維持過期，下次搜尋再載入
+        self._loaded_version = version
+        logger.info(f"🔎 空房索引已載入: {len(keys)} 個房型 × {self.days} 天, {len(rows)} 筆可售 "
+                    f"({(time.perf_counter() - started) * 1000:.0f}ms)")
+        return self._cube
+
+    async def get(self, pool, catalog: CatalogSnapshot) -> AvailabilityCube:
+        cube = self._cube
+        if self._is_fresh(cube, catalog):
+            return cube
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._is_fresh(self._cube, catalog):
+                async with pool.acquire() as conn:
+                    await self.load(conn, catalog)
+            return self._cube
+
+
+availability_index = AvailabilityIndex()
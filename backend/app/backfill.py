@@ -0,0 +1,250 @@
+"""
+歷史庫存批次匯入（backfill）
+
+來源（CSV、Parquet 檔案或 PMS 分段抽取）先以 COPY 寫入暫存表，再一次合併進
+inventory_data，最後重算受影響日期的週統計與期間統計。整個流程在同一個交易中，
+失敗時不會留下部分資料。
+
+CSV / Parquet 欄位以名稱對應，至少需要 inv_type_code、hotel_id、date、quantity、status，
+其他欄位（例如 /export 匯出檔的 id、created_at）會被忽略。
+"""
+import asyncio
+import csv
+import logging
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from events import notify
+from partitions import INVENTORY_TABLE, ensure_partitions
+from period_statistics import refresh_period_statistics
+from pms_client import HotelAPI, PMSAPIError
+from weekly_statistics import recompute_weekly_statistics
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = "inventory_backfill_staging"
+STAGING_COLUMNS = ["inv_type_code", "hotel_id", "date", "quantity", "status"]
+
+# PMS 分段抽取：每段天數與同時進行的請求數
+PMS_CHUNK_DAYS = 90
+PMS_CONCURRENCY = 4
+
+# Parquet 每批讀取筆數
+PARQUET_BATCH_ROWS = 50000
+
+
+@dataclass
+class BackfillResult:
+    staged_rows: int = 0
+    merged_rows: int = 0
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    hotel_ids: List[str] = field(default_factory=list)
+    weekly_statistics_rows: int = 0
+    period_statistics_rows: int = 0
+
+
+async def create_staging_table(conn) -> None:
+    # id、created_at 讓匯出檔可以原樣載入，合併時忽略；row_position 記錄載入順序
+    await conn.execute(f"""
+        CREATE TEMP TABLE {STAGING_TABLE} (
+            row_position BIGSERIAL,
+            id BIGINT,
+            inv_type_code VARCHAR(10),
+            hotel_id VARCHAR(10),
+            date DATE,
+            quantity INTEGER,
+            status VARCHAR(10),
+            created_at TIMESTAMP
+        ) ON COMMIT DROP
+    """)
+
+
+def _check_columns(path: str, columns: List[str]) -> None:
+    """檔案欄位需包含 STAGING_COLUMNS，除 id、created_at 外不可有其他欄位"""
+    missing = set(STAGING_COLUMNS) - set(columns)
+    if missing:
+        raise ValueError(f"{path} 缺少欄位: {', '.join(sorted(missing))}")
+    unknown = set(columns) - set(STAGING_COLUMNS) - {"id", "created_at"}
+    if unknown:
+        raise ValueError(f"{path} 有無法辨識的欄位: {', '.join(sorted(unknown))}")
+
+
+def _csv_columns(path: str) -> List[str]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    columns = [c.strip() for c in header]
+    _check_columns(path, columns)
+    return columns
+
+
+async def stage_csv(conn, path: str) -> int:
+    """COPY FROM 直接讀取 CSV 檔案"""
+    result = await conn.copy_to_table(
+        STAGING_TABLE, source=path, columns=_csv_columns(path), format="csv", header=True
+    )
+    return int(result.split()[-1])
+
+
+def _parquet_records(path: str) -> Iterable[Tuple]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet 匯入需要安裝 pyarrow")
+
+    parquet = pq.ParquetFile(path)
+    # 在開始 COPY 前檢查（生成器內的檢查要到第一次讀取時才執行）
+    _check_columns(path, parquet.schema_arrow.names)
+
+    def records():
+        for batch in parquet.iter_batches(batch_size=PARQUET_BATCH_ROWS, columns=STAGING_COLUMNS):
+            columns = [batch.column(name).to_pylist() for name in STAGING_COLUMNS]
+            yield from zip(*columns)
+
+    return records()
+
+
+async def stage_parquet(conn, path: str) -> int:
+    """分批讀取 Parquet 並以 COPY 寫入暫存表"""
+    result = await conn.copy_records_to_table(
+        STAGING_TABLE, records=_parquet_records(path), columns=STAGING_COLUMNS
+    )
+    return int(result.split()[-1])
+
+
+async def stage_file(conn, path: str) -> int:
+    if path.lower().endswith(".parquet"):
+        return await stage_parquet(conn, path)
+    if path.lower().endswith(".csv"):
+        return await stage_csv(conn, path)
+    raise ValueError(f"不支援的檔案格式: {path}（僅支援 .csv 與 .parquet）")
+
+
+def date_chunks(start_date: date, end_date: date, days: int = PMS_CHUNK_DAYS) -> List[Tuple[date, date]]:
+    chunks = []
+    current = start_date
+    while current <= end_date:
+        chunk_end = min(current + timedelta(days=days - 1), end_date)
+        chunks.append((current, chunk_end))
+        current = chunk_end + timedelta(days=1)
+    return chunks
+
+
+async def stage_pms(conn, hotel_api: HotelAPI, room_types, start_date: date, end_date: date,
+                    chunk_days: int = PMS_CHUNK_DAYS, concurrency: int = PMS_CONCURRENCY,
+                    failed: Optional[List[str]] = None) -> int:
+    """
+    依房型與日期分段向 PMS 抽取，完成的分段立即 COPY 進暫存表
+
+    PMS 請求可並行，寫入仍在同一條連線上依序進行。失敗的分段記錄在 failed，不中斷其他分段。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(inv_type_code: str, hotel_id: str, chunk_start: date, chunk_end: date):
+        async with semaphore:
+            records = []
+            try:
+                async for batch in hotel_api.stream_inventory_data(
+                    inv_type_code, chunk_start.isoformat(), chunk_end.isoformat(), hotel_id
+                ):
+                    records.extend(
+                        (inv_type_code, hotel_id, date.fromisoformat(item["date"]),
+                         item["quantity"], item["status"])
+                        for item in batch
+                    )
+            except PMSAPIError as e:
+                if failed is not None:
+                    failed.append(f"{hotel_id}-{inv_type_code} {chunk_start}~{chunk_end}: {str(e)}")
+                return []
+            return records
+
+    tasks = [
+        asyncio.create_task(fetch(rt["inv_type_code"], rt["hotel_id"], chunk_start, chunk_end))
+        for rt in room_types
+        for chunk_start, chunk_end in date_chunks(start_date, end_date, chunk_days)
+    ]
+
+    staged = 0
+    try:
+        for task in asyncio.as_completed(tasks):
+            records = await task
+            if records:
+                await conn.copy_records_to_table(STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+                staged += len(records)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return staged
+
+
+async def merge_staging(conn, result: BackfillResult) -> None:
+    """檢查暫存資料後合併進 inventory_data（同一房型同一天以最後出現的記錄為準）"""
+    summary = await conn.fetchrow(f"""
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE inv_type_code IS NULL OR hotel_id IS NULL OR date IS NULL
+                                OR quantity IS NULL OR status NOT IN ('OPEN', 'CLOSE')
+                                OR status IS NULL) AS invalid,
+               MIN(date) AS start_date, MAX(date) AS end_date,
+               ARRAY_AGG(DISTINCT hotel_id) AS hotel_ids
+        FROM {STAGING_TABLE}
+    """)
+    if summary["invalid"]:
+        raise ValueError(f"有 {summary['invalid']} 筆資料欄位缺漏或狀態不是 OPEN/CLOSE，已取消匯入")
+    if not summary["total"]:
+        return
+
+    result.start_date = summary["start_date"]
+    result.end_date = summary["end_date"]
+    result.hotel_ids = sorted(h for h in summary["hotel_ids"] if h is not None)
+
+    await ensure_partitions(conn, INVENTORY_TABLE, result.start_date, result.end_date)
+
+    merged = await conn.execute(f"""
+        INSERT INTO inventory_data (inv_type_code, hotel_id, date, quantity, status)
+        SELECT DISTINCT ON (inv_type_code, hotel_id, date)
+               inv_type_code, hotel_id, date, quantity, status
+        FROM {STAGING_TABLE}
+        ORDER BY inv_type_code, hotel_id, date, row_position DESC
+        ON CONFLICT (inv_type_code, date, hotel_id)
+        DO UPDATE SET
+            quantity = EXCLUDED.quantity,
+            status = EXCLUDED.status
+    """)
+    result.merged_rows = int(merged.split()[-1])
+
+
+async def run_backfill(conn, stage, recompute: bool = True) -> BackfillResult:
+    """
+    在單一交易中：建立暫存表 → stage(conn) 載入 → 合併 → 重算受影響的週與期間統計
+
+    stage 為 async callable，接收連線並返回載入筆數。
+    """
+    result = BackfillResult()
+    async with conn.transaction():
+        await create_staging_table(conn)
+        result.staged_rows = await stage(conn)
+        await merge_staging(conn, result)
+        if not result.merged_rows:
+            return result
+
+        # 只有單一酒店時限定酒店，避免重算其他酒店
+        hotel_id = result.hotel_ids[0] if len(result.hotel_ids) == 1 else None
+        await notify(conn, "inventory.updated", hotel_id=hotel_id, start_date=result.start_date,
+                     end_date=result.end_date, rows=result.merged_rows, source="backfill")
+
+        if recompute:
+            result.weekly_statistics_rows = await recompute_weekly_statistics(
+                conn, result.start_date, result.end_date, hotel_id
+            )
+            result.period_statistics_rows = await refresh_period_statistics(
+                conn, result.start_date, result.end_date, hotel_id
+            )
+            await notify(conn, "statistics.updated", kind="backfill", hotel_id=hotel_id,
+                         start_date=result.start_date, end_date=result.end_date)
+
+    logger.info(
+        f"✅ Backfill 完成: 載入 {result.staged_rows} 筆, 合併 {result.merged_rows} 筆 "
+        f"({result.start_date} ~ {result.end_date}), 週統計 {result.weekly_statistics_rows} 筆"
+    )
+    return result
@@ -0,0 +1,203 @@
+"""
+訂房進度（pace）與 pickup
+
+每個房型每個入住日保存一列 booking_pace，sold_by_dba[d + 1] 為入住前 d 天的快照中
+已售出的房間數（total_rooms - quantity），沒有快照的日子為 NULL。
+每建立一個快照只更新該快照對應的那一格，不需重讀歷史快照；快照依保留天數刪除後進度仍然保留。
+
+讀取時：
+- 沒有快照的日子沿用前一次（離入住日較遠）觀察到的已售數
+- as_of 之後的進度尚未發生，保持為空
+- 去年同期（STLY）以 364 天（52 週）平移，星期幾相同
+"""
+import logging
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 保存入住前幾天內的進度
+MAX_PACE_DAYS = 365
+
+# 去年同期的平移天數
+LAST_YEAR_OFFSET = timedelta(days=364)
+
+
+async def record_snapshot_pace(conn, snapshot_id: int, snapshot_date: date,
+                               max_days: int = MAX_PACE_DAYS) -> int:
+    """把一個快照的已售房數寫入入住前 (入住日 - 快照日) 天那一格，返回更新筆數"""
+    # 新的入住日先建立整列空白陣列，之後以下標寫入，陣列下界固定為 1
+    await conn.execute("""
+        INSERT INTO booking_pace (hotel_id, inv_type_code, stay_date, sold_by_dba)
+        SELECT s.hotel_id, s.inv_type_code, s.date, array_fill(NULL::smallint, ARRAY[$3 + 1])
+        FROM inventory_snapshots s
+        JOIN room_types rt ON rt.hotel_id = s.hotel_id AND rt.inv_type_code = s.inv_type_code
+        WHERE s.snapshot_id = $1 AND s.snapshot_date = $2
+          AND s.date BETWEEN $2 AND $2 + $3::int
+        ON CONFLICT DO NOTHING
+    """, snapshot_id, snapshot_date, max_days)
+
+    result = await conn.execute("""
+        UPDATE booking_pace p
+        SET sold_by_dba[s.date - $2 + 1] = rt.total_rooms - s.quantity,
+            updated_at = CURRENT_TIMESTAMP
+        FROM inventory_snapshots s
+        JOIN room_types rt ON rt.hotel_id = s.hotel_id AND rt.inv_type_code = s.inv_type_code
+        WHERE s.snapshot_id = $1 AND s.snapshot_date = $2
+          AND s.date BETWEEN $2 AND $2 + $3::int
+          AND p.hotel_id = s.hotel_id AND p.inv_type_code = s.inv_type_code AND p.stay_date = s.date
+    """, snapshot_id, snapshot_date, max_days)
+    return int(result.split()[-1])
+
+
+async def rebuild_booking_pace(conn, max_days: int = MAX_PACE_DAYS) -> int:
+    """依快照日期順序重新寫入所有已完成快照的進度（可重複執行），返回處理的快照數"""
+    snapshots = await conn.fetch("""
+        SELECT id, snapshot_date FROM data_snapshots
+        WHERE status = 'completed'
+        ORDER BY snapshot_date
+    """)
+    for snapshot in snapshots:
+        rows = await record_snapshot_pace(conn, snapshot["id"], snapshot["snapshot_date"], max_days)
+        logger.info(f"📈 快照 {snapshot['snapshot_date']} 訂房進度: {rows} 筆")
+    return len(snapshots)
+
+
+@dataclass
+class PaceMatrix:
+    """每個入住日一列、入住前 0..max_days 天一欄的已售房數（各房型加總，NaN 為尚無數據）"""
+    stay_dates: List[date]
+    sold: np.ndarray
+
+    def __post_init__(self):
+        self._positions = {stay: i for i, stay in enumerate(self.stay_dates)}
+
+    def row(self, stay_date: date) -> Optional[np.ndarray]:
+        i = self._positions.get(stay_date)
+        return self.sold[i] if i is not None else None
+
+
+def fill_forward(sold: np.ndarray, stay_dates: List[date], as_of: date) -> np.ndarray:
+    """沒有快照的格子沿用離入住日較遠的觀察值，as_of 之後的格子設為 NaN"""
+    sold = sold.copy()
+    for d in range(sold.shape[1] - 2, -1, -1):
+        missing = np.isnan(sold[:, d])
+        sold[missing, d] = sold[missing, d + 1]
+    first_dba = np.array([(stay - as_of).days for stay in stay_dates])
+    sold[np.arange(sold.shape[1])[None, :] < first_dba[:, None]] = np.nan
+    return sold
+
+
+async def load_pace(conn, start_date: date, end_date: date, as_of: date, max_days: int,
+                    hotel_id: Optional[str] = None, inv_type_code: Optional[str] = None) -> PaceMatrix:
+    """讀取入住日區間的進度，補齊沒有快照的日子後依入住日加總各房型"""
+    conditions, args = [], [start_date, end_date]
+    for column, value in (("hotel_id", hotel_id), ("inv_type_code", inv_type_code)):
+        if value is not None:
+            args.append(value)
+            conditions.append(f"AND {column} = ${len(args)}")
+
+    rows = await conn.fetch(f"""
+        SELECT stay_date, sold_by_dba AS sold
+        FROM booking_pace
+        WHERE stay_date BETWEEN $1 AND $2 {" ".join(conditions)}
+    """, *args)
+
+    width = max_days + 1
+    if not rows:
+        return PaceMatrix([], np.empty((0, width)))
+
+    # 讀取整列再補齊，max_days 那一格才能沿用更早的觀察值
+    sold = np.full((len(rows), max(width, max(len(row["sold"]) for row in rows))), np.nan)
+    for i, row in enumerate(rows):
+        values = np.array(row["sold"], dtype=float)  # None 轉為 NaN
+        sold[i, :len(values)] = values
+    stays = [row["stay_date"] for row in rows]
+    sold = fill_forward(sold, stays, as_of)[:, :width]
+
+    stay_dates = sorted(set(stays))
+    positions = {stay: i for i, stay in enumerate(stay_dates)}
+    index = np.array([positions[stay] for stay in stays])
+    total = np.zeros((len(stay_dates), width))
+    observed = np.zeros((len(stay_dates), width), dtype=bool)
+    np.add.at(total, index, np.nan_to_num(sold))
+    np.logical_or.at(observed, index, ~np.isnan(sold))
+    total[~observed] = np.nan
+    return PaceMatrix(stay_dates, total)
+
+
+def pace_curve(matrix: PaceMatrix) -> List[dict]:
+    """入住前每一天的累計已售房數（各入住日加總），stay_dates 為有數據的入住日數"""
+    curve = []
+    observed = ~np.isnan(matrix.sold)
+    for d in range(matrix.sold.shape[1]):
+        count = int(observed[:, d].sum())
+        if count:
+            curve.append({
+                "days_before_arrival": d,
+                "sold_rooms": int(np.nansum(matrix.sold[:, d])),
+                "stay_dates": count,
+            })
+    return curve
+
+
+def _value(row: Optional[np.ndarray], d: int) -> Optional[int]:
+    if row is None or d >= len(row) or np.isnan(row[d]):
+        return None
+    return int(row[d])
+
+
+async def latest_snapshot_date(conn) -> Optional[date]:
+    return await conn.fetchval("SELECT MAX(snapshot_date) FROM data_snapshots WHERE status = 'completed'")
+
+
+async def booking_pace(conn, start_date: date, end_date: date, as_of: date, max_days: int = 90,
+                       hotel_id: Optional[str] = None, inv_type_code: Optional[str] = None,
+                       compare_last_year: bool = True) -> dict:
+    """入住日區間的訂房進度曲線，以及去年同期的曲線"""
+    matrix = await load_pace(conn, start_date, end_date, as_of, max_days, hotel_id, inv_type_code)
+    result = {"stay_dates": len(matrix.stay_dates), "pace": pace_curve(matrix)}
+
+    if compare_last_year:
+        last_year = await load_pace(conn, start_date - LAST_YEAR_OFFSET, end_date - LAST_YEAR_OFFSET,
+                                    as_of - LAST_YEAR_OFFSET, max_days, hotel_id, inv_type_code)
+        result["last_year"] = {
+            "start_date": start_date - LAST_YEAR_OFFSET,
+            "end_date": end_date - LAST_YEAR_OFFSET,
+            "stay_dates": len(last_year.stay_dates),
+            "pace": pace_curve(last_year),
+        }
+    return result
+
+
+async def booking_pickup(conn, start_date: date, end_date: date, as_of: date, days: int = 7,
+                         hotel_id: Optional[str] = None, inv_type_code: Optional[str] = None) -> List[dict]:
+    """
+    每個入住日截至 as_of 的已售房數（on the books）與前 days 天內的 pickup，附去年同期
+
+    as_of 時已入住的日期以入住當天的已售房數計算。
+    """
+    max_days = min(max((end_date - as_of).days, 0) + days, MAX_PACE_DAYS)
+    current = await load_pace(conn, start_date, end_date, as_of, max_days, hotel_id, inv_type_code)
+    last_year = await load_pace(conn, start_date - LAST_YEAR_OFFSET, end_date - LAST_YEAR_OFFSET,
+                                as_of - LAST_YEAR_OFFSET, max_days, hotel_id, inv_type_code)
+
+    result = []
+    for stay_date in current.stay_dates:
+        dba = max((stay_date - as_of).days, 0)
+        row = current.row(stay_date)
+        ly_row = last_year.row(stay_date - LAST_YEAR_OFFSET)
+        on_the_books, earlier = _value(row, dba), _value(row, dba + days)
+        ly_on_the_books, ly_earlier = _value(ly_row, dba), _value(ly_row, dba + days)
+        result.append({
+            "stay_date": stay_date,
+            "days_before_arrival": dba,
+            "on_the_books": on_the_books,
+            "pickup": on_the_books - earlier if None not in (on_the_books, earlier) else None,
+            "last_year_on_the_books": ly_on_the_books,
+            "last_year_pickup": ly_on_the_books - ly_earlier if None not in (ly_on_the_books, ly_earlier) else None,
+        })
+    return result
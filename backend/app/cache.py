@@ -0,0 +1,45 @@
+"""
+行程內的查詢結果快取
+
+每個後端實例各自持有，資料異動時由 events.py 的資料更新事件清除，
+TTL 只是 LISTEN 連線中斷期間漏接事件時的保險。
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from metrics import CACHE_REQUESTS
+
+
+class TTLCache:
+    """有過期時間與容量上限（LRU）的快取"""
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            return default
+
+        self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(cache=self.name, result="hit")
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
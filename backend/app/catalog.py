@@ -0,0 +1,133 @@
+"""
+房型與酒店目錄
+
+room_types 與 hotels 很少變動，卻幾乎每個端點都要查詢。整個行程共用一份記憶體中的目錄：
+啟動時載入；本實例的房型異動直接標記為過期，其他實例的異動透過資料更新事件
+（room_types.updated、hotels.updated）標記為過期，下次讀取時重新載入。
+LISTEN 連線重連時（listener.connected）也會標記過期，避免斷線期間漏接事件。
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# hotels 表尚未建立時使用的露營區名稱
+DEFAULT_HOTEL_NAMES = {
+    "2436": "霧繞",
+    "2799": "霧語",
+    "2155": "山中靜靜",
+    "2656": "暖硫"
+}
+
+RoomTypeKey = Tuple[str, str]  # (hotel_id, inv_type_code)
+
+CATALOG_EVENTS = ("room_types.updated", "hotels.updated", "listener.connected")
+
+
+class CatalogSnapshot:
+    """某一時間點的目錄內容，建立後不再變動，可在多個請求間共用（對外只返回複本）"""
+
+    def __init__(self, room_types: Iterable, hotel_names: Mapping[str, str]):
+        self._hotel_names = dict(hotel_names)
+        self._room_types: List[dict] = sorted(
+            ({**dict(row), "hotel_name": self.hotel_name(row["hotel_id"])} for row in room_types),
+            key=lambda rt: (rt["hotel_id"], rt["inv_type_code"]),
+        )
+        self._by_key: Dict[RoomTypeKey, dict] = {
+            (rt["hotel_id"], rt["inv_type_code"]): rt for rt in self._room_types
+        }
+
+        self.hotels: Dict[str, dict] = {}  # hotel_id -> 房型數與房間總數
+        for rt in self._room_types:
+            hotel = self.hotels.setdefault(rt["hotel_id"], {
+                "hotel_id": rt["hotel_id"],
+                "hotel_name": rt["hotel_name"],
+                "room_types_count": 0,
+                "total_rooms": 0,
+            })
+            hotel["room_types_count"] += 1
+            hotel["total_rooms"] += rt["total_rooms"]
+
+    def hotel_name(self, hotel_id: str) -> str:
+        return self._hotel_names.get(hotel_id, f"酒店-{hotel_id}")
+
+    def room_type(self, hotel_id: str, inv_type_code: str) -> Optional[dict]:
+        rt = self._by_key.get((hotel_id, inv_type_code))
+        return dict(rt) if rt is not None else None
+
+    def list_room_types(self, hotel_id: Optional[str] = None) -> List[dict]:
+        return [dict(rt) for rt in self._room_types if hotel_id is None or rt["hotel_id"] == hotel_id]
+
+    def with_room_type_names(self, rows: Iterable, include_total_rooms: bool = False) -> List[dict]:
+        """
+        為資料列加上 room_type_name、hotel_name（以及目前的 total_rooms）
+
+        取代 JOIN room_types：目錄中沒有的房型（已刪除）會被略過，與 JOIN 的結果相同。
+        """
+        result = []
+        for row in rows:
+            rt = self._by_key.get((row["hotel_id"], row["inv_type_code"]))
+            if rt is None:
+                continue
+            data = {**dict(row), "room_type_name": rt["name"], "hotel_name": rt["hotel_name"]}
+            if include_total_rooms:
+                data["total_rooms"] = rt["total_rooms"]
+            result.append(data)
+        return result
+
+
+class Catalog:
+    """行程內共用的目錄，過期時在下次讀取時重新載入"""
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 0
+        self._loaded_version = -1
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def current(self) -> Optional[CatalogSnapshot]:
+        """最近一次載入的目錄（可能已過期），尚未載入時為 None"""
+        return self._snapshot
+
+    def invalidate(self) -> None:
+        self._version += 1
+
+    def handle_event(self, event: dict) -> None:
+        if event.get("event") in CATALOG_EVENTS:
+            self.invalidate()
+
+    async def load(self, conn) -> CatalogSnapshot:
+        version = self._version
+        room_types = await conn.fetch("SELECT * FROM room_types")
+        hotel_names = dict(DEFAULT_HOTEL_NAMES)
+        try:
+            hotel_names.update({row["hotel_id"]: row["name"]
+                                for row in await conn.fetch("SELECT hotel_id, name FROM hotels")})
+        except asyncpg.UndefinedTableError:
+            pass
+
+        self._snapshot = CatalogSnapshot(room_types, hotel_names)
+        # 載入期間又收到異動事件時維持過期，下次讀取再載入
+        self._loaded_version = version
+        logger.info(f"📚 目錄已載入: {len(self._snapshot.hotels)} 個酒店, {len(room_types)} 個房型")
+        return self._snapshot
+
+    async def get(self, pool) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and self._loaded_version == self._version:
+            return snapshot
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._snapshot is None or self._loaded_version != self._version:
+                async with pool.acquire() as conn:
+                    await self.load(conn)
+            return self._snapshot
+
+
+catalog = Catalog()
@@ -0,0 +1,154 @@
+"""
+資料更新事件推送
+
+寫入端（抽取庫存、重算統計、建立快照）完成後以 pg_notify 發出事件，
+每個後端實例各自用一條專用連線 LISTEN 同一頻道，再轉發給連上 /events 的
+SSE 客戶端。多個副本時任何一台寫入，所有副本的客戶端都會收到通知。
+"""
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Set
+
+import asyncpg
+
+from metrics import EVENTS_PUBLISHED, SSE_CLIENTS
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "data_updates"
+
+# 客戶端來不及讀取時最多暫存的事件數，超過則丟棄最舊的
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# LISTEN 連線的健康檢查間隔與重連等待上限（秒）
+PING_INTERVAL = 30
+MAX_RECONNECT_DELAY = 60
+
+
+async def notify(conn, event: str, **data) -> None:
+    """
+    發出資料更新事件
+
+    在交易中呼叫時，事件會在交易提交後才送出；回滾則不送出。
+    pg_notify 的 payload 上限約 8000 bytes，只放識別資訊，客戶端再自行查詢。
+
+    交易中失敗時直接拋出：錯誤已使交易中止，應由呼叫端回滾，而不是讓之後的語句才失敗。
+    交易外的單獨通知失敗只記錄警告，不影響已完成的寫入。
+    """
+    payload = json.dumps({"event": event, "ts": datetime.now().isoformat(), **data}, default=str)
+    in_transaction = conn.is_in_transaction()
+    try:
+        await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+    except Exception as e:
+        if in_transaction:
+            raise
+        logger.warning(f"⚠️ 發送事件 {event} 失敗: {str(e)}")
+
+
+class EventHub:
+    """LISTEN 資料更新頻道，並分發給本實例的 SSE 訂閱者"""
+
+    def __init__(self, channel: str = CHANNEL):
+        self.channel = channel
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._handlers: List[Callable[[dict], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_handler(self, handler: Callable[[dict], None]) -> None:
+        """
+        行程內的事件處理（例如清除快取）
+
+        除了資料更新事件，每次 LISTEN 連線建立時也會收到 {"event": "listener.connected"}，
+        表示斷線期間可能漏接事件。
+        """
+        self._handlers.append(handler)
+
+    def start(self, connect: Callable[[], Awaitable[asyncpg.Connection]]) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(connect))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self, connect) -> None:
+        """維持 LISTEN 連線，斷線後以遞增間隔重連"""
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = await connect()
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(self.channel, self._on_notify)
+                logger.info(f"✅ 已監聽資料更新頻道 {self.channel}")
+                self._dispatch({"event": "listener.connected"})
+                delay = 1
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=PING_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await conn.fetchval("SELECT 1")
+                logger.warning(f"⚠️ 資料更新頻道連線被關閉，{delay} 秒後重連")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ 資料更新頻道連線中斷，{delay} 秒後重連: {str(e)}")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"⚠️ 無法解析事件內容: {payload[:200]}")
+            return
+        self.publish(event)
+
+    def _dispatch(self, event: dict) -> None:
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.warning(f"⚠️ 事件處理失敗 {event.get('event')}: {str(e)}")
+
+    def publish(self, event: dict) -> None:
+        """分發給本實例的事件處理與所有訂閱者"""
+        EVENTS_PUBLISHED.inc(event=event.get("event", "unknown"))
+        self._dispatch(event)
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    @contextmanager
+    def subscribe(self):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        SSE_CLIENTS.set(len(self._subscribers))
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+            SSE_CLIENTS.set(len(self._subscribers))
+
+
+def format_sse(event: dict) -> str:
+    """轉為 text/event-stream 格式，事件名稱作為 SSE event 欄位"""
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+event_hub = EventHub()
@@ -0,0 +1,189 @@
+"""
+資料匯出
+
+以串流方式匯出庫存、週統計與快照表，記憶體用量與資料量無關：
+- CSV: Postgres COPY ... TO STDOUT，收到的區塊直接轉送
+- Parquet: 伺服器端游標分批讀取，每批寫成一個 row group 後立即送出（需安裝 pyarrow）
+
+API 端點（/export/{dataset}）與 scripts/export_data.py 共用此模組。
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import date
+from typing import AsyncIterator, List, Optional, Tuple
+
+# 每個 Parquet row group 的筆數
+PARQUET_BATCH_ROWS = 50000
+
+# COPY 區塊的緩衝數量，客戶端讀取較慢時會暫停從資料庫讀取
+COPY_QUEUE_SIZE = 16
+
+
+@dataclass(frozen=True)
+class ExportDataset:
+    table: str
+    date_column: str
+    order_by: str
+
+
+EXPORT_DATASETS = {
+    "inventory": ExportDataset("inventory_data", "date", "date, hotel_id, inv_type_code"),
+    "weekly_statistics": ExportDataset("weekly_statistics", "week_start_date",
+                                       "week_start_date, hotel_id, inv_type_code"),
+    "inventory_snapshots": ExportDataset("inventory_snapshots", "snapshot_date",
+                                         "snapshot_date, hotel_id, inv_type_code, date"),
+    "weekly_statistics_snapshots": ExportDataset("weekly_statistics_snapshots", "snapshot_date",
+                                                 "snapshot_date, hotel_id, inv_type_code, week_start_date"),
+}
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def build_export_query(dataset: str, hotel_id: Optional[str] = None, inv_type_code: Optional[str] = None,
+                       start_date: Optional[date] = None, end_date: Optional[date] = None) -> Tuple[str, list]:
+    """組出匯出查詢；日期範圍套用在各資料集的日期欄位（快照表為快照日期）"""
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"不支援的資料集: {dataset}")
+    spec = EXPORT_DATASETS[dataset]
+
+    conditions, args = [], []
+    for condition, value in (
+        ("hotel_id = {}", hotel_id),
+        ("inv_type_code = {}", inv_type_code),
+        (f"{spec.date_column} >= {{}}", start_date),
+        (f"{spec.date_column} <= {{}}", end_date),
+    ):
+        if value is not None:
+            args.append(value)
+            conditions.append(condition.format(f"${len(args)}"))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT * FROM {spec.table} {where} ORDER BY {spec.order_by}", args
+
+
+def export_filename(dataset: str, fmt: str, start_date: Optional[date] = None,
+                    end_date: Optional[date] = None) -> str:
+    parts = [dataset] + [d.isoformat() for d in (start_date, end_date) if d]
+    return f"{'_'.join(parts)}.{fmt}"
+
+
+async def stream_csv(conn, query: str, args: list) -> AsyncIterator[bytes]:
+    """COPY ... TO STDOUT 的 CSV 串流（含標題列）"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=COPY_QUEUE_SIZE)
+
+    async def sink(chunk):
+        # asyncpg 傳入的緩衝區可能被重複使用，先複製一份
+        await queue.put(bytes(chunk))
+
+    async def copy():
+        try:
+            await conn.copy_from_query(query, *args, output=sink, format="csv", header=True)
+        finally:
+            await queue.put(None)
+
+    task = asyncio.create_task(copy())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet 匯出需要安裝 pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def _arrow_schema(pa, attributes):
+    types = {
+        "int2": pa.int16(), "int4": pa.int32(), "int8": pa.int64(),
+        "float4": pa.float32(), "float8": pa.float64(), "numeric": pa.float64(),
+        "bool": pa.bool_(), "date": pa.date32(),
+        "timestamp": pa.timestamp("us"), "timestamptz": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([pa.field(a.name, types.get(a.type.name, pa.string())) for a in attributes])
+
+
+class _ChunkSink:
+    """ParquetWriter 的輸出目標，寫入的位元組在每個 row group 之後取出送出"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_parquet(conn, query: str, args: list,
+                         batch_rows: int = PARQUET_BATCH_ROWS) -> AsyncIterator[bytes]:
+    """游標分批讀取並寫成 Parquet，每批一個 row group"""
+    pa, pq = require_pyarrow()
+
+    async with conn.transaction():
+        statement = await conn.prepare(query)
+        schema = _arrow_schema(pa, statement.get_attributes())
+        numeric = [i for i, a in enumerate(statement.get_attributes()) if a.type.name == "numeric"]
+
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        cursor = await statement.cursor(*args)
+        while True:
+            rows = await cursor.fetch(batch_rows)
+            if not rows:
+                break
+            columns = [[row[i] for row in rows] for i in range(len(schema))]
+            for i in numeric:
+                columns[i] = [None if v is None else float(v) for v in columns[i]]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            data = sink.drain()
+            if data:
+                yield data
+
+        writer.close()
+        yield sink.drain()
+
+
+def stream_export(conn, fmt: str, query: str, args: list) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        return stream_csv(conn, query, args)
+    if fmt == "parquet":
+        return stream_parquet(conn, query, args)
+    raise ValueError(f"不支援的格式: {fmt}")
@@ -0,0 +1,324 @@
+"""
+入住率預測（批次預先計算）
+
+每晚（或 POST /forecasts/refresh）為所有房型計算未來 FORECAST_WEEKS 週的入住率預測，
+寫入 occupancy_forecasts；GET /forecasts 只讀取結果，不在請求中擬合模型。
+
+每個房型每一週的預測由兩個模型組成：
+- 季節基準（seasonal）: 最近 LEVEL_WEEKS 週的平均入住率 × 去年同週相對於去年同期水準的比例
+- pickup: 目前的已訂入住率（on the books）+ 過去一年在相同提前天數之後平均還會增加的入住率
+  （由 booking_pace 的逐日進度計算）
+離入住越近越相信 pickup，提前 PICKUP_HORIZON_DAYS 天以上只用季節基準。
+預測值不會低於已訂入住率，也不超過 100%。
+
+資料一次讀出後依酒店切成 NumPy 矩陣（房型 × 週），同一酒店的所有房型一次向量化計算；
+多家酒店時以 process pool 平行擬合，避免 CPU 計算佔住事件迴圈。
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import asyncpg
+import numpy as np
+
+from booking_pace import fill_forward
+from events import notify
+from occupancy import OccupancyFrame
+
+logger = logging.getLogger(__name__)
+
+# 預測未來幾週（含本週）
+FORECAST_WEEKS = 26
+
+# 讀取多少週的歷史週統計（需涵蓋去年同期）
+HISTORY_WEEKS = 104
+
+# 近期水準的週數
+LEVEL_WEEKS = 8
+
+# 去年同週（52 週前，星期幾相同）
+SEASON_LAG_WEEKS = 52
+
+# 季節比例的上下限，避免去年水準很低時放大雜訊
+SEASONAL_RATIO_LIMITS = (0.25, 4.0)
+
+# 提前幾天以內開始採用 pickup 模型（權重隨提前天數線性遞減）
+PICKUP_HORIZON_DAYS = 91
+
+# 同一提前天數至少要有幾個入住日的進度才採用 pickup
+MIN_PICKUP_SAMPLES = 14
+
+# 平行擬合的行程數，1 表示不啟用 process pool
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+
+@dataclass
+class HotelForecastInput:
+    """一家酒店的擬合輸入（可序列化傳給子行程）"""
+    hotel_id: str
+    inv_type_codes: List[str]
+    total_rooms: np.ndarray        # [房型]
+    history: np.ndarray            # [房型 × HISTORY_WEEKS] 歷史實際入住率，NaN 為沒有數據
+    on_the_books: np.ndarray       # [房型 × 預測週數] 已訂入住率，NaN 為沒有庫存數據
+    pace_sold: np.ndarray          # [入住日 × 提前天數] 過去一年各入住日的已售房數（已補齊）
+    pace_room_index: np.ndarray    # [入住日] 對應的房型位置
+    week_starts: List[date]
+    lead_days: np.ndarray          # [預測週數] 預測週中間（星期四）距今天數
+
+
+@dataclass
+class ForecastResult:
+    rows: int
+    hotels: int
+    generated_at: datetime
+    duration_s: float
+
+
+def _nanmean(values: np.ndarray, axis: int) -> np.ndarray:
+    observed = ~np.isnan(values)
+    count = observed.sum(axis=axis)
+    total = np.where(observed, values, 0).sum(axis=axis)
+    return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def _pickup_curve(data: HotelForecastInput, width: int):
+    """每個房型在提前 d 天之後平均還會增加的入住率（%）與樣本數，[房型 × width]"""
+    rooms = len(data.inv_type_codes)
+    total = np.zeros((rooms, width))
+    count = np.zeros((rooms, width))
+    if len(data.pace_sold):
+        sold = data.pace_sold[:, :width]
+        capacity = data.total_rooms[data.pace_room_index].astype(float)
+        remaining = (sold[:, :1] - sold) / np.where(capacity > 0, capacity, np.nan)[:, None] * 100
+        observed = ~np.isnan(remaining)
+        np.add.at(total, data.pace_room_index, np.where(observed, remaining, 0))
+        np.add.at(count, data.pace_room_index, observed)
+    curve = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    return curve, count
+
+
+def fit_hotel_forecast(data: HotelForecastInput) -> List[dict]:
+    """一次計算一家酒店所有房型的預測（純函數，供 process pool 呼叫）"""
+    weeks = len(data.week_starts)
+    history = data.history
+
+    # 季節基準：近期水準 × 去年同週 / 去年同期水準
+    level = _nanmean(history[:, -LEVEL_WEEKS:], axis=1)
+    ly_start = HISTORY_WEEKS - SEASON_LAG_WEEKS
+    # 超過 SEASON_LAG_WEEKS 週的部分沒有去年同週（補 NaN，只用 pickup 或已訂入住率）
+    last_year = np.full((history.shape[0], weeks), np.nan)
+    observed = history[:, ly_start:ly_start + weeks]
+    last_year[:, :observed.shape[1]] = observed
+    ly_level = _nanmean(history[:, ly_start - LEVEL_WEEKS:ly_start], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = last_year / ly_level[:, None]
+    ratio = np.where(np.isfinite(ratio), np.clip(ratio, *SEASONAL_RATIO_LIMITS), 1.0)
+    baseline = np.where(np.isnan(level)[:, None], last_year, level[:, None] * ratio)
+    baseline = np.clip(baseline, 0, 100)
+
+    # pickup：已訂 + 相同提前天數之後的平均增量
+    leads = data.lead_days
+    curve, samples = _pickup_curve(data, int(leads.max()) + 1)
+    pickup = curve[:, leads]
+    pickup[samples[:, leads] < MIN_PICKUP_SAMPLES] = np.nan
+    otb = data.on_the_books
+    pickup_forecast = np.clip(otb + np.maximum(pickup, 0), 0, 100)
+
+    weight = np.clip(1 - leads / PICKUP_HORIZON_DAYS, 0, 1)[None, :] * ~np.isnan(pickup_forecast)
+    has_baseline = ~np.isnan(baseline)
+    forecast = np.where(
+        has_baseline,
+        weight * np.nan_to_num(pickup_forecast) + (1 - weight) * np.nan_to_num(baseline),
+        np.where(np.isnan(pickup_forecast), otb, pickup_forecast),
+    )
+    forecast = np.clip(np.fmax(forecast, otb), 0, 100)
+
+    model = np.full(forecast.shape, "on_the_books", dtype=object)
+    model[has_baseline] = "seasonal"
+    model[(weight > 0) & ~has_baseline] = "pickup"
+    model[(weight > 0) & has_baseline] = "blend"
+    model[(weight >= 1) & ~np.isnan(pickup_forecast)] = "pickup"
+
+    def rate(value) -> Optional[float]:
+        return None if np.isnan(value) else round(float(value), 2)
+
+    rows = []
+    for r, inv_type_code in enumerate(data.inv_type_codes):
+        for k, week_start in enumerate(data.week_starts):
+            if np.isnan(forecast[r, k]):
+                continue
+            rows.append({
+                "hotel_id": data.hotel_id,
+                "inv_type_code": inv_type_code,
+                "week_start_date": week_start,
+                "forecast_occupancy_rate": rate(forecast[r, k]),
+                "on_the_books_rate": rate(otb[r, k]),
+                "baseline_rate": rate(baseline[r, k]),
+                "pickup_rate": rate(pickup[r, k]),
+                "lead_days": int(leads[k]),
+                "model": model[r, k],
+            })
+    return rows
+
+
+async def load_forecast_inputs(conn, as_of: date, weeks: int = FORECAST_WEEKS,
+                               hotel_id: Optional[str] = None) -> List[HotelForecastInput]:
+    """讀取所有房型的歷史週統計、已訂庫存與過去一年的訂房進度，依酒店整理成矩陣"""
+    current_monday = as_of - timedelta(days=as_of.weekday())
+    history_start = current_monday - timedelta(weeks=HISTORY_WEEKS)
+    week_starts = [current_monday + timedelta(weeks=k) for k in range(weeks)]
+    forecast_end = week_starts[-1] + timedelta(days=6)
+    hotel_filter, hotel_args = ("AND hotel_id = $1", [hotel_id]) if hotel_id else ("", [])
+
+    room_types = await conn.fetch(f"""
+        SELECT hotel_id, inv_type_code, total_rooms FROM room_types
+        WHERE TRUE {hotel_filter}
+        ORDER BY hotel_id, inv_type_code
+    """, *hotel_args)
+    n = len(hotel_args)
+    history_rows = await conn.fetch(f"""
+        SELECT hotel_id, inv_type_code, week_start_date, actual_occupancy_rate
+        FROM weekly_statistics
+        WHERE week_start_date >= ${n + 1} AND week_start_date < ${n + 2} {hotel_filter}
+    """, *hotel_args, history_start, current_monday)
+    inventory_rows = await conn.fetch(f"""
+        SELECT i.inv_type_code, i.hotel_id, i.date, i.quantity, i.status, rt.total_rooms
+        FROM inventory_data i
+        JOIN room_types rt ON i.inv_type_code = rt.inv_type_code AND i.hotel_id = rt.hotel_id
+        WHERE i.date BETWEEN ${n + 1} AND ${n + 2} {hotel_filter.replace("hotel_id", "i.hotel_id")}
+    """, *hotel_args, current_monday, forecast_end)
+    try:
+        pace_rows = await conn.fetch(f"""
+            SELECT hotel_id, inv_type_code, stay_date, sold_by_dba AS sold
+            FROM booking_pace
+            WHERE stay_date >= ${n + 1} AND stay_date < ${n + 2} {hotel_filter}
+        """, *hotel_args, as_of - timedelta(days=364), as_of)
+    except asyncpg.UndefinedTableError:
+        # 沒有訂房進度時只用季節基準與已訂入住率
+        logger.warning("⚠️ booking_pace 表不存在，預測不使用 pickup（請執行 database/booking_pace_schema.sql）")
+        pace_rows = []
+
+    # 房型位置：(hotel_id, inv_type_code) -> (酒店, 列)
+    hotels: Dict[str, List] = {}
+    positions = {}
+    for rt in room_types:
+        codes = hotels.setdefault(rt["hotel_id"], [])
+        positions[(rt["hotel_id"], rt["inv_type_code"])] = len(codes)
+        codes.append(rt)
+
+    history = {h: np.full((len(codes), HISTORY_WEEKS), np.nan) for h, codes in hotels.items()}
+    for row in history_rows:
+        r = positions.get((row["hotel_id"], row["inv_type_code"]))
+        if r is not None and row["actual_occupancy_rate"] is not None:
+            history[row["hotel_id"]][r, (row["week_start_date"] - history_start).days // 7] = \
+                float(row["actual_occupancy_rate"])
+
+    on_the_books = {h: np.full((len(codes), weeks), np.nan) for h, codes in hotels.items()}
+    for s in OccupancyFrame.from_records(inventory_rows).group(["hotel", "room_type", "week"]):
+        r = positions.get((s["hotel_id"], s["inv_type_code"]))
+        if r is not None:
+            on_the_books[s["hotel_id"]][r, (s["week_start_date"] - current_monday).days // 7] = \
+                s["actual_occupancy_rate"]
+
+    pace: Dict[str, List] = {h: [] for h in hotels}
+    for row in pace_rows:
+        r = positions.get((row["hotel_id"], row["inv_type_code"]))
+        if r is not None:
+            pace[row["hotel_id"]].append((r, row["stay_date"], row["sold"]))
+
+    lead_days = np.array([max((week_start + timedelta(days=3) - as_of).days, 0) for week_start in week_starts])
+    width = int(lead_days.max()) + 1
+
+    inputs = []
+    for h, codes in hotels.items():
+        # 讀取整列再補齊，最後一格才能沿用更早的觀察值
+        sold = np.full((len(pace[h]), max([width] + [len(values) for _, _, values in pace[h]])), np.nan)
+        for i, (_, _, values) in enumerate(pace[h]):
+            values = np.array(values, dtype=float)  # None 轉為 NaN
+            sold[i, :len(values)] = values
+        stays = [stay for _, stay, _ in pace[h]]
+        inputs.append(HotelForecastInput(
+            hotel_id=h,
+            inv_type_codes=[rt["inv_type_code"] for rt in codes],
+            total_rooms=np.array([rt["total_rooms"] for rt in codes]),
+            history=history[h],
+            on_the_books=on_the_books[h],
+            pace_sold=fill_forward(sold, stays, as_of)[:, :width],
+            pace_room_index=np.array([r for r, _, _ in pace[h]], dtype=np.int64),
+            week_starts=week_starts,
+            lead_days=lead_days,
+        ))
+    return inputs
+
+
+async def fit_forecasts(inputs: List[HotelForecastInput], workers: int = FORECAST_WORKERS) -> List[dict]:
+    """以 process pool 平行擬合各酒店（單一酒店或 workers <= 1 時在執行緒中計算）"""
+    loop = asyncio.get_running_loop()
+    if workers <= 1 or len(inputs) <= 1:
+        results = [await loop.run_in_executor(None, fit_hotel_forecast, data) for data in inputs]
+    else:
+        # spawn 避免 fork 複製事件迴圈與資料庫連線
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(inputs)), mp_context=context) as pool:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(pool, fit_hotel_forecast, data) for data in inputs
+            ])
+    return [row for rows in results for row in rows]
+
+
+async def store_forecasts(conn, rows: List[dict], generated_at: datetime,
+                          hotel_id: Optional[str] = None) -> int:
+    """以新的預測取代舊結果（需在交易中呼叫，讀取端在提交前仍看到舊的預測）"""
+    if hotel_id:
+        await conn.execute("DELETE FROM occupancy_forecasts WHERE hotel_id = $1", hotel_id)
+    else:
+        await conn.execute("DELETE FROM occupancy_forecasts")
+    if not rows:
+        return 0
+
+    await conn.execute("""
+        INSERT INTO occupancy_forecasts
+        (hotel_id, inv_type_code, week_start_date, forecast_occupancy_rate, on_the_books_rate,
+         baseline_rate, pickup_rate, lead_days, model, generated_at)
+        SELECT t.*, $10::timestamp
+        FROM unnest($1::varchar[], $2::varchar[], $3::date[], $4::numeric[], $5::numeric[],
+                    $6::numeric[], $7::numeric[], $8::int[], $9::varchar[])
+            AS t(hotel_id, inv_type_code, week_start_date, forecast_occupancy_rate, on_the_books_rate,
+                 baseline_rate, pickup_rate, lead_days, model)
+    """,
+        [r["hotel_id"] for r in rows],
+        [r["inv_type_code"] for r in rows],
+        [r["week_start_date"] for r in rows],
+        [r["forecast_occupancy_rate"] for r in rows],
+        [r["on_the_books_rate"] for r in rows],
+        [r["baseline_rate"] for r in rows],
+        [r["pickup_rate"] for r in rows],
+        [r["lead_days"] for r in rows],
+        [r["model"] for r in rows],
+        generated_at)
+    return len(rows)
+
+
+async def run_forecast(conn, as_of: Optional[date] = None, weeks: int = FORECAST_WEEKS,
+                       hotel_id: Optional[str] = None, workers: int = FORECAST_WORKERS) -> ForecastResult:
+    """讀取資料、擬合並寫入 occupancy_forecasts，完成後發出 forecasts.updated 事件"""
+    started = time.perf_counter()
+    as_of = as_of or date.today()
+    generated_at = datetime.now()
+
+    inputs = await load_forecast_inputs(conn, as_of, weeks, hotel_id)
+    rows = await fit_forecasts(inputs, workers)
+
+    async with conn.transaction():
+        written = await store_forecasts(conn, rows, generated_at, hotel_id)
+        await notify(conn, "forecasts.updated", hotel_id=hotel_id, rows=written,
+                     start_date=as_of - timedelta(days=as_of.weekday()), weeks=weeks)
+
+    return ForecastResult(rows=written, hotels=len(inputs), generated_at=generated_at,
+                          duration_s=round(time.perf_counter() - started, 2))
@@ -0,0 +1,135 @@
+"""
+結構化日誌設定
+
+- LOG_LEVEL: 日誌等級（預設 INFO）
+- LOG_FORMAT: json 或 text（預設 json）
+- LOG_SAMPLE_RATES: 事件抽樣比例，例如 "inventory.stored=0.2,stats.calculate_failed=0.1"
+- LOG_MAX_FIELD_LENGTH: 單一欄位最大長度，超過會截斷（預設 500）
+"""
+import json
+import logging
+import os
+import random
+import re
+from datetime import datetime, date
+from typing import Any, Dict, Optional
+
+# 由 setup_logging() 依環境變數設定（.env 載入後才讀取）
+LOG_MAX_FIELD_LENGTH = 500
+SAMPLE_RATES: Dict[str, float] = {}
+
+_SECRET_KEYS = re.compile(r"pass(word)?|secret|token|api_key|authorization", re.IGNORECASE)
+_SECRET_IN_TEXT = re.compile(
+    r"""(?P<key>["']?(?:password|passwd|secret|echo_token|token|api_key)["']?\s*[:=]\s*)(?P<quote>["']?)[^"'&,\s}]+""",
+    re.IGNORECASE,
+)
+_REDACTED = "***"
+
+
+def _parse_sample_rates(raw: str) -> Dict[str, float]:
+    rates = {}
+    for part in raw.split(","):
+        if "=" not in part:
+            continue
+        event, rate = part.split("=", 1)
+        try:
+            rates[event.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+
+def truncate(value: Any, limit: Optional[int] = None) -> Any:
+    """截斷過長的字串"""
+    if limit is None:
+        limit = LOG_MAX_FIELD_LENGTH
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...(+{len(value) - limit} chars)"
+    return value
+
+
+def redact_text(text: str) -> str:
+    """遮蔽字串中的密碼、token 等敏感資訊"""
+    return _SECRET_IN_TEXT.sub(lambda m: f"{m.group('key')}{m.group('quote')}{_REDACTED}", text)
+
+
+def redact(value: Any) -> Any:
+    """遞迴遮蔽 dict/list 中的敏感欄位，並截斷過長字串"""
+    if isinstance(value, dict):
+        return {
+            k: _REDACTED if isinstance(k, str) and _SECRET_KEYS.search(k) else redact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return truncate(redact_text(value))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def log_event(logger: logging.Logger, level: int, event: str, message: str = "", **fields) -> None:
+    """記錄結構化事件；等級未啟用或未被抽中時不做任何格式化"""
+    if not logger.isEnabledFor(level):
+        return
+    rate = SAMPLE_RATES.get(event, 1.0)
+    if rate < 1.0 and random.random() >= rate:
+        return
+    if rate < 1.0:
+        fields["sample_rate"] = rate
+    logger.log(level, message or event, extra={"event": event, "fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆日誌輸出一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(redact_text(record.getMessage())),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            payload["event"] = event
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(redact(fields))
+        if record.exc_info:
+            payload["exc_info"] = truncate(self.formatException(record.exc_info), LOG_MAX_FIELD_LENGTH * 4)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """本機除錯用的文字格式，同樣做遮蔽與截斷"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = truncate(redact_text(super().format(record)))
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in redact(fields).items())
+        return line
+
+
+def setup_logging() -> None:
+    """設定根 logger（在 load_dotenv() 之後呼叫）"""
+    global LOG_MAX_FIELD_LENGTH, SAMPLE_RATES
+    LOG_MAX_FIELD_LENGTH = int(os.getenv("LOG_MAX_FIELD_LENGTH", "500"))
+    SAMPLE_RATES = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+    level = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        handler.setFormatter(TextFormatter())
+    else:
+        handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
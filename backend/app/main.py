@@ -1,32 +1,69 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import List, Optional
 import asyncio
-import aiohttp
 import asyncpg
+import json
 import os
+import time
 from datetime import datetime, date, timedelta
 import logging
 from dotenv import load_dotenv
 
+# 以下模組在匯入時讀取環境變數（QUERY_PROFILING 等），需先載入 .env
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from alerts import IngestChanges, process_ingest
+from availability import availability_index
+from backfill import PMS_CHUNK_DAYS, run_backfill, stage_pms
+from booking_pace import (
+    MAX_PACE_DAYS, booking_pace, booking_pickup, latest_snapshot_date,
+    rebuild_booking_pace,
+)
+from events import event_hub, format_sse, notify
+from export import (
+    EXPORT_DATASETS, EXPORT_FORMATS,
+    build_export_query, export_filename, require_pyarrow, stream_export,
+)
+from forecast import FORECAST_WEEKS, run_forecast
+from log_config import setup_logging, log_event
+from cache import TTLCache
+from catalog import DEFAULT_HOTEL_NAMES, CatalogSnapshot, catalog
+from occupancy import OccupancyFrame, mean_by, pivot_rates, summarize_rates
+from partitions import INVENTORY_TABLE, ensure_partitions, cleanup_old_snapshots
+from period_statistics import PERIOD_TYPES, refresh_period_statistics, refresh_season, compare_periods
+from metrics import (
+    registry as metrics_registry,
+    HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT,
+    INVENTORY_ROWS_UPSERTED, INVENTORY_ROWS_PER_INGEST,
+    STATISTICS_RECOMPUTE_DURATION,
+)
+from pms_client import HotelAPI, PMSAPIError
+from room_type_sync import find_room_types_in_use, normalize_room_types, sync_room_types
+from query_profiler import (
+    QUERY_PROFILING_ENABLED, QUERY_PROFILING_SLOW_MS,
+    QueryProfile, current_profile, profiled, slow_requests,
+)
+from snapshot_comparison import SnapshotComparisonCache
+from snapshot_diff import DIFF_PAGE_SIZE, MAX_DIFF_PAGE_SIZE, decode_cursor, fetch_inventory_diff
+from snapshot_builder import build_snapshot, claim_snapshot
+from snapshot_restore import EmptySnapshotError, restore_snapshot
+from time_travel import LIVE, DataSource, SnapshotNotFound, resolve_as_of
+from weekly_statistics import recompute_weekly_statistics, upsert_weekly_statistics
 
-# 露營區名稱映射
-HOTEL_NAMES = {
-    "2436": "霧繞",
-    "2799": "霧語", 
-    "2155": "山中靜靜",
-    "2656": "暖硫"
-}
+setup_logging()
+logger = logging.getLogger(__name__)
 
 def get_hotel_name(hotel_id: str) -> str:
-    """獲取酒店中文名稱"""
-    return HOTEL_NAMES.get(hotel_id, f"酒店-{hotel_id}")
+    """獲取酒店中文名稱（來自目錄，尚未載入時使用預設名稱）"""
+    snapshot = catalog.current
+    if snapshot is not None:
+        return snapshot.hotel_name(hotel_id)
+    return DEFAULT_HOTEL_NAMES.get(hotel_id, f"酒店-{hotel_id}")
 
 class InventoryData(BaseModel):
     date: str
@@ -67,18 +104,28 @@ class DatabaseManager:
     def __init__(self):
         self.pool = None
     
+    @staticmethod
+    def _connect_options() -> dict:
+        return dict(
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", "5432")),
+            user=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD", "password"),
+            database=os.getenv("DB_NAME", "hotel_management"),
+        )
+    
     async def create_pool(self):
         if self.pool is None:
             self.pool = await asyncpg.create_pool(
-                host=os.getenv("DB_HOST", "localhost"),
-                port=int(os.getenv("DB_PORT", "5432")),
-                user=os.getenv("DB_USER", "postgres"),
-                password=os.getenv("DB_PASSWORD", "password"),
-                database=os.getenv("DB_NAME", "hotel_management"),
+                **self._connect_options(),
                 min_size=5,
                 max_size=20
             )
     
+    async def connect(self) -> asyncpg.Connection:
+        """不經連接池的專用連線（LISTEN 需要長期佔用一條連線）"""
+        return await asyncpg.connect(**self._connect_options())
+    
     async def close_pool(self):
         if self.pool:
             await self.pool.close()
@@ -87,13 +134,31 @@ class DatabaseManager:
         try:
             if self.pool is None:
                 await self.create_pool()
-            return self.pool
+            return profiled(self.pool)
         except Exception as e:
             logger.error(f"❌ 獲取數據庫連接失敗: {str(e)}")
             raise HTTPException(status_code=503, detail=f"數據庫服務不可用: {str(e)}")
 
 db_manager = DatabaseManager()
 
+async def get_catalog() -> CatalogSnapshot:
+    """房型與酒店目錄（記憶體快取，異動時由資料更新事件標記過期）"""
+    return await catalog.get(await db_manager.get_connection())
+
+AS_OF_DESCRIPTION = "歷史時點：YYYY-MM-DD（當天或之前最近的快照）或快照ID，不指定則為即時資料"
+
+async def get_data_source(conn, as_of: Optional[str]) -> DataSource:
+    """把 as_of 參數轉為資料來源（格式錯誤 400，找不到快照 404）"""
+    try:
+        return await resolve_as_of(conn, as_of)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SnapshotNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+event_hub.add_handler(catalog.handle_event)
+event_hub.add_handler(availability_index.handle_event)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup - 優雅處理數據庫連接
@@ -104,52 +169,31 @@ async def lifespan(app: FastAPI):
         logger.warning(f"⚠️ 數據庫連接失敗，以無數據庫模式運行: {str(e)}")
         # 不阻止應用啟動，允許前端正常工作
     
+    if db_manager.pool is not None:
+        try:
+            await get_catalog()
+        except Exception as e:
+            logger.warning(f"⚠️ 房型目錄載入失敗，將於首次使用時重試: {str(e)}")
+    
+    # 資料更新事件：資料庫暫時無法連線時會在背景持續重試
+    event_hub.start(db_manager.connect)
+    
     yield
     
     # Shutdown
+    await event_hub.stop()
     try:
         await db_manager.close_pool()
         logger.info("✅ 數據庫連接池已關閉")
     except Exception as e:
         logger.warning(f"⚠️ 關閉數據庫連接池時出錯: {str(e)}")
 
-class HotelAPI:
-    def __init__(self):
-        self.base_url = "https://pms.shalom.com.tw/api/cm/channel/inventory/"
-        self.echo_token = os.getenv("API_ECHO_TOKEN", "GD837Fjk3")
-        self.password = os.getenv("API_PASSWORD", "mz9k8czQHqnFt8Q")
-        self.username = os.getenv("API_USERNAME", "woorao")
-    
-    async def fetch_inventory_data(self, inv_type_code: str, start_date: str, end_date: str, hotel_id: str):
-        params = {
-            "echo_token": self.echo_token,
-            "end_date": end_date,
-            "hotel_code": hotel_id,  # 使用動態的 hotel_id
-            "inv_type_code": inv_type_code,
-            "password": self.password,
-            "start_date": start_date,
-            "timestamp": datetime.now().strftime("%Y-%m-%d+%H%%3A%M%%3A%S"),
-            "username": self.username
-        }
-        
-        logger.info(f"Making API request to {self.base_url} with params: {params}")
-        
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(self.base_url, params=params) as response:
-                    logger.info(f"API response status: {response.status}")
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info(f"API response data: {data}")
-                        return data
-                    else:
-                        response_text = await response.text()
-                        logger.error(f"API request failed with status {response.status}, response: {response_text}")
-                        return None
-            except Exception as e:
-                logger.error(f"API request error: {str(e)}")
-                return None
+# 快照保留天數，超過的快照分區會被整個刪除；未設定時週更新不自動清理
+SNAPSHOT_RETENTION_DAYS = int(os.getenv("SNAPSHOT_RETENTION_DAYS")) if os.getenv("SNAPSHOT_RETENTION_DAYS") else None
+
+# 快照比較結果快取：前層在快照刪除（snapshot.deleted）時清除，結果另存於 snapshot_comparisons 表
+comparison_cache = SnapshotComparisonCache(ttl=int(os.getenv("SNAPSHOT_COMPARISON_CACHE_TTL", "86400")))
+event_hub.add_handler(comparison_cache.handle_event)
 
 hotel_api = HotelAPI()
 
@@ -157,80 +201,49 @@ hotel_api = HotelAPI()
 # 快照系統核心功能函數
 # ================================
 
+# 快照摘要（房型數、酒店數、週範圍、筆數、大小）在建立時寫入 data_snapshots
+COMPLETED_SNAPSHOTS_QUERY = """
+    SELECT * FROM data_snapshots 
+    WHERE status = 'completed' 
+    ORDER BY snapshot_date DESC 
+    LIMIT $1
+"""
+
 async def create_data_snapshot(description: str = None) -> int:
-    """創建數據快照"""
+    """創建（或加入）今天的數據快照，等到複製完成後返回快照ID"""
     pool = await db_manager.get_connection()
     today = datetime.now().date()
     
     async with pool.acquire() as conn:
-        # 檢查今天是否已經有快照
-        existing = await conn.fetchval(
-            "SELECT id FROM data_snapshots WHERE snapshot_date = $1", today
-        )
-        
-        if existing:
-            logger.info(f"今天已存在快照 ID: {existing}")
-            return existing
-        
-        async with conn.transaction():
-            # 創建快照元數據
-            snapshot_id = await conn.fetchval("""
-                INSERT INTO data_snapshots (snapshot_date, description, status)
-                VALUES ($1, $2, 'processing')
-                RETURNING id
-            """, today, description or f"自動快照 - {today}")
-            
-            # 複製當前庫存數據到快照表
-            inventory_count = await conn.fetchval("""
-                INSERT INTO inventory_snapshots 
-                (snapshot_id, inv_type_code, hotel_id, date, quantity, status)
-                SELECT $1, inv_type_code, hotel_id, date, quantity, status
-                FROM inventory_data
-                RETURNING (SELECT COUNT(*) FROM inventory_data)
-            """, snapshot_id)
-            
-            # 複製當前週統計數據到快照表
-            stats_count = await conn.fetchval("""
-                INSERT INTO weekly_statistics_snapshots 
-                (snapshot_id, inv_type_code, hotel_id, week_start_date, week_end_date,
-                 actual_occupancy_rate, actual_vacancy_rate, total_occupancy_rate, 
-                 total_vacancy_rate, total_rooms, total_available_days, total_days)
-                SELECT $1, inv_type_code, hotel_id, week_start_date, week_end_date,
-                       actual_occupancy_rate, actual_vacancy_rate, total_occupancy_rate,
-                       total_vacancy_rate, total_rooms, total_available_days, total_days
-                FROM weekly_statistics
-                RETURNING (SELECT COUNT(*) FROM weekly_statistics)
-            """, snapshot_id)
-            
-            total_records = (inventory_count or 0) + (stats_count or 0)
-            
-            # 更新快照狀態
-            await conn.execute("""
-                UPDATE data_snapshots 
-                SET status = 'completed', total_records = $2
-                WHERE id = $1
-            """, snapshot_id, total_records)
-            
-            logger.info(f"✅ 創建快照成功 ID: {snapshot_id}, 記錄數: {total_records}")
-            return snapshot_id
+        snapshot_id, status = await claim_snapshot(conn, today, description)
+    
+    if status == 'completed':
+        logger.info(f"今天已存在快照 ID: {snapshot_id}")
+    else:
+        # 其他請求正在建立同一個快照時等待其完成
+        await build_snapshot(pool, snapshot_id, today, wait=True)
+    return snapshot_id
+
+async def run_snapshot_build(snapshot_id: int, snapshot_date: date):
+    try:
+        pool = await db_manager.get_connection()
+        await build_snapshot(pool, snapshot_id, snapshot_date)
+    except Exception as e:
+        logger.error(f"創建快照失敗: {str(e)}")
 
 async def get_snapshots(limit: int = 10) -> List[dict]:
     """獲取快照列表"""
     pool = await db_manager.get_connection()
     async with pool.acquire() as conn:
-        rows = await conn.fetch("""
-            SELECT * FROM latest_snapshot_summary 
-            ORDER BY snapshot_date DESC 
-            LIMIT $1
-        """, limit)
+        rows = await conn.fetch(COMPLETED_SNAPSHOTS_QUERY, limit)
         return [dict(row) for row in rows]
 
 async def get_snapshot_by_id(snapshot_id: int) -> Optional[dict]:
-    """根據ID獲取快照詳情"""
+    """根據ID獲取快照詳情（包含建立中的快照，status 與已複製筆數即為進度）"""
     pool = await db_manager.get_connection()
     async with pool.acquire() as conn:
         snapshot = await conn.fetchrow("""
-            SELECT * FROM latest_snapshot_summary WHERE id = $1
+            SELECT * FROM data_snapshots WHERE id = $1
         """, snapshot_id)
         
         if not snapshot:
@@ -242,96 +255,119 @@ async def delete_snapshot(snapshot_id: int) -> bool:
     """刪除快照"""
     pool = await db_manager.get_connection()
     async with pool.acquire() as conn:
-        result = await conn.execute("""
-            DELETE FROM data_snapshots WHERE id = $1
-        """, snapshot_id)
+        async with conn.transaction():
+            result = await conn.execute("""
+                DELETE FROM data_snapshots WHERE id = $1
+            """, snapshot_id)
+            deleted = result.split()[-1] != '0'
+            if deleted:
+                await notify(conn, "snapshot.deleted", snapshot_id=snapshot_id)
         
         # 檢查是否有記錄被刪除
-        return result.split()[-1] != '0'
+        return deleted
 
-async def compare_snapshots(from_date: str, to_date: str) -> dict:
-    """比較兩個快照之間的變化"""
+async def _compute_snapshot_changes(conn, from_snapshot, to_snapshot,
+                                   hotel_id: Optional[str] = None,
+                                   inv_type_code: Optional[str] = None) -> dict:
+    """以 FULL OUTER JOIN 比較兩個快照的週統計，返回變化摘要與變化明細"""
+    changes = await conn.fetch("""
+        WITH from_stats AS (
+            SELECT inv_type_code, hotel_id, week_start_date, 
+                   actual_occupancy_rate, total_rooms
+            FROM weekly_statistics_snapshots 
+            WHERE snapshot_id = $1 AND snapshot_date = $3
+              AND ($5::varchar IS NULL OR hotel_id = $5)
+              AND ($6::varchar IS NULL OR inv_type_code = $6)
+        ),
+        to_stats AS (
+            SELECT inv_type_code, hotel_id, week_start_date,
+                   actual_occupancy_rate, total_rooms
+            FROM weekly_statistics_snapshots 
+            WHERE snapshot_id = $2 AND snapshot_date = $4
+              AND ($5::varchar IS NULL OR hotel_id = $5)
+              AND ($6::varchar IS NULL OR inv_type_code = $6)
+        )
+        SELECT 
+            COALESCE(f.inv_type_code, t.inv_type_code) as inv_type_code,
+            COALESCE(f.hotel_id, t.hotel_id) as hotel_id,
+            COALESCE(f.week_start_date, t.week_start_date) as week_start_date,
+            f.actual_occupancy_rate as from_occupancy,
+            t.actual_occupancy_rate as to_occupancy,
+            CASE 
+                WHEN f.actual_occupancy_rate IS NULL THEN 'new'
+                WHEN t.actual_occupancy_rate IS NULL THEN 'removed'
+                WHEN f.actual_occupancy_rate != t.actual_occupancy_rate THEN 'changed'
+                ELSE 'unchanged'
+            END as change_type,
+            (t.actual_occupancy_rate - f.actual_occupancy_rate) as occupancy_diff
+        FROM from_stats f
+        FULL OUTER JOIN to_stats t 
+            ON f.inv_type_code = t.inv_type_code 
+            AND f.hotel_id = t.hotel_id 
+            AND f.week_start_date = t.week_start_date
+        WHERE COALESCE(f.actual_occupancy_rate, 0) != COALESCE(t.actual_occupancy_rate, 0)
+        ORDER BY change_type, inv_type_code, week_start_date
+    """, from_snapshot['id'], to_snapshot['id'], from_snapshot['snapshot_date'], to_snapshot['snapshot_date'],
+        hotel_id, inv_type_code)
+    
+    changes_list = [dict(row) for row in changes]
+    
+    # 計算變化摘要
+    summary = {
+        "total_changes": len(changes_list),
+        "new_records": len([c for c in changes_list if c['change_type'] == 'new']),
+        "removed_records": len([c for c in changes_list if c['change_type'] == 'removed']),
+        "modified_records": len([c for c in changes_list if c['change_type'] == 'changed']),
+        "biggest_increase": None,
+        "biggest_decrease": None
+    }
+    
+    # 找出最大變化
+    occupancy_changes = [c for c in changes_list if c['change_type'] == 'changed' and c['occupancy_diff']]
+    if occupancy_changes:
+        biggest_increase = max(occupancy_changes, key=lambda x: x['occupancy_diff'] or 0)
+        biggest_decrease = min(occupancy_changes, key=lambda x: x['occupancy_diff'] or 0)
+        
+        summary["biggest_increase"] = biggest_increase if biggest_increase['occupancy_diff'] > 0 else None
+        summary["biggest_decrease"] = biggest_decrease if biggest_decrease['occupancy_diff'] < 0 else None
+    
+    return {"summary": summary, "changes": changes_list}
+
+async def _get_snapshot_pair(conn, from_date: str, to_date: str):
+    """依快照日期取得兩個已完成的快照，任一個不存在時返回 404"""
+    from_day = datetime.strptime(from_date, "%Y-%m-%d").date()
+    to_day = datetime.strptime(to_date, "%Y-%m-%d").date()
+    rows = await conn.fetch("""
+        SELECT * FROM data_snapshots 
+        WHERE snapshot_date = ANY($1::date[]) AND status = 'completed'
+    """, [from_day, to_day])
+    snapshots = {row['snapshot_date']: row for row in rows}
+    
+    if from_day not in snapshots or to_day not in snapshots:
+        raise HTTPException(status_code=404, detail="找不到指定日期的快照")
+    return snapshots[from_day], snapshots[to_day]
+
+async def compare_snapshots(from_date: str, to_date: str, hotel_id: Optional[str] = None,
+                            inv_type_code: Optional[str] = None) -> dict:
+    """比較兩個快照之間的變化（完成的快照不再變動，比較結果由 comparison_cache 保存）"""
     pool = await db_manager.get_connection()
     
     async with pool.acquire() as conn:
-        # 獲取快照ID
-        from_snapshot = await conn.fetchrow("""
-            SELECT * FROM data_snapshots 
-            WHERE snapshot_date = $1 AND status = 'completed'
-        """, datetime.strptime(from_date, "%Y-%m-%d").date())
-        
-        to_snapshot = await conn.fetchrow("""
-            SELECT * FROM data_snapshots 
-            WHERE snapshot_date = $1 AND status = 'completed'
-        """, datetime.strptime(to_date, "%Y-%m-%d").date())
-        
-        if not from_snapshot or not to_snapshot:
-            raise HTTPException(status_code=404, detail="找不到指定日期的快照")
-        
-        # 比較週統計變化
-        changes = await conn.fetch("""
-            WITH from_stats AS (
-                SELECT inv_type_code, hotel_id, week_start_date, 
-                       actual_occupancy_rate, total_rooms
-                FROM weekly_statistics_snapshots 
-                WHERE snapshot_id = $1
-            ),
-            to_stats AS (
-                SELECT inv_type_code, hotel_id, week_start_date,
-                       actual_occupancy_rate, total_rooms
-                FROM weekly_statistics_snapshots 
-                WHERE snapshot_id = $2
-            )
-            SELECT 
-                COALESCE(f.inv_type_code, t.inv_type_code) as inv_type_code,
-                COALESCE(f.hotel_id, t.hotel_id) as hotel_id,
-                COALESCE(f.week_start_date, t.week_start_date) as week_start_date,
-                f.actual_occupancy_rate as from_occupancy,
-                t.actual_occupancy_rate as to_occupancy,
-                CASE 
-                    WHEN f.actual_occupancy_rate IS NULL THEN 'new'
-                    WHEN t.actual_occupancy_rate IS NULL THEN 'removed'
-                    WHEN f.actual_occupancy_rate != t.actual_occupancy_rate THEN 'changed'
-                    ELSE 'unchanged'
-                END as change_type,
-                (t.actual_occupancy_rate - f.actual_occupancy_rate) as occupancy_diff
-            FROM from_stats f
-            FULL OUTER JOIN to_stats t 
-                ON f.inv_type_code = t.inv_type_code 
-                AND f.hotel_id = t.hotel_id 
-                AND f.week_start_date = t.week_start_date
-            WHERE COALESCE(f.actual_occupancy_rate, 0) != COALESCE(t.actual_occupancy_rate, 0)
-            ORDER BY change_type, inv_type_code, week_start_date
-        """, from_snapshot['id'], to_snapshot['id'])
+        from_snapshot, to_snapshot = await _get_snapshot_pair(conn, from_date, to_date)
         
-        changes_list = [dict(row) for row in changes]
-        
-        # 計算變化摘要
-        summary = {
-            "total_changes": len(changes_list),
-            "new_records": len([c for c in changes_list if c['change_type'] == 'new']),
-            "removed_records": len([c for c in changes_list if c['change_type'] == 'removed']),
-            "modified_records": len([c for c in changes_list if c['change_type'] == 'changed']),
-            "biggest_increase": None,
-            "biggest_decrease": None
-        }
-        
-        # 找出最大變化
-        occupancy_changes = [c for c in changes_list if c['change_type'] == 'changed' and c['occupancy_diff']]
-        if occupancy_changes:
-            biggest_increase = max(occupancy_changes, key=lambda x: x['occupancy_diff'] or 0)
-            biggest_decrease = min(occupancy_changes, key=lambda x: x['occupancy_diff'] or 0)
-            
-            summary["biggest_increase"] = biggest_increase if biggest_increase['occupancy_diff'] > 0 else None
-            summary["biggest_decrease"] = biggest_decrease if biggest_decrease['occupancy_diff'] < 0 else None
+        result = await comparison_cache.get_or_compute(
+            conn, from_snapshot['id'], to_snapshot['id'],
+            {"hotel_id": hotel_id, "inv_type_code": inv_type_code},
+            lambda: _compute_snapshot_changes(conn, from_snapshot, to_snapshot, hotel_id, inv_type_code)
+        )
         
         return {
             "comparison": {
                 "period": {"from": from_date, "to": to_date},
                 "from_snapshot": dict(from_snapshot),
                 "to_snapshot": dict(to_snapshot),
-                "summary": summary,
-                "changes": changes_list
+                "summary": result["summary"],
+                "changes": result["changes"]
             }
         }
 
@@ -345,6 +381,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """記錄每個路由的延遲與進行中的請求數"""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        # 使用路由模板而非實際路徑，避免 label 數量隨參數無限增長
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status_code)
+        )
+
 @app.get("/")
 async def root():
     return {"message": "Hotel Management API"}
@@ -378,6 +438,20 @@ async def init_database():
                 )
             """)
             
+            # 創建露營區表
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS hotels (
+                    hotel_id VARCHAR(10) PRIMARY KEY,
+                    name VARCHAR(100) NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            await conn.executemany(
+                "INSERT INTO hotels (hotel_id, name) VALUES ($1, $2) ON CONFLICT (hotel_id) DO NOTHING",
+                list(DEFAULT_HOTEL_NAMES.items())
+            )
+            
             # 創建庫存數據表
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS inventory_data (
@@ -423,11 +497,13 @@ async def init_database():
                 )
             """)
             
+            catalog.invalidate()
+            
             logger.info("✅ 數據庫表結構初始化完成")
             return {
                 "success": True,
                 "message": "數據庫表結構初始化成功",
-                "tables": ["room_types", "inventory_data", "weekly_statistics", "inventory_snapshots"]
+                "tables": ["room_types", "hotels", "inventory_data", "weekly_statistics", "inventory_snapshots"]
             }
             
     except Exception as e:
@@ -461,6 +537,74 @@ async def health_check():
         logger.error(f"Health check failed: {str(e)}")
         return {"status": "unhealthy", "error": str(e)}
 
+if QUERY_PROFILING_ENABLED:
+    @app.middleware("http")
+    async def query_profiling_middleware(request: Request, call_next):
+        """記錄請求內每個 SQL 的耗時，回傳 Server-Timing 標頭"""
+        profile = QueryProfile(request.method, request.url.path)
+        token = current_profile.set(profile)
+        try:
+            response = await call_next(request)
+        finally:
+            current_profile.reset(token)
+        
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        profile.route = getattr(request.scope.get("route"), "path", None)
+        response.headers["Server-Timing"] = profile.server_timing(total_ms)
+        
+        if total_ms >= QUERY_PROFILING_SLOW_MS:
+            summary = profile.summary(total_ms)
+            slow_requests.append({"timestamp": datetime.now().isoformat(), **summary})
+            log_event(logger, logging.WARNING, "db.slow_request",
+                      f"Slow request {request.method} {profile.route or request.url.path}: {total_ms:.0f}ms",
+                      **summary)
+        return response
+
+@app.get("/debug-queries")
+async def debug_queries():
+    """最近慢請求的 SQL 效能摘要（需設定 QUERY_PROFILING=true）"""
+    return {
+        "enabled": QUERY_PROFILING_ENABLED,
+        "slow_threshold_ms": QUERY_PROFILING_SLOW_MS,
+        "slow_requests": list(reversed(slow_requests))
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus 格式的效能指標"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+# SSE 心跳間隔（秒），需短於反向代理的 read timeout
+SSE_HEARTBEAT_SECONDS = 15
+
+@app.get("/events")
+async def stream_events(hotel_id: Optional[str] = Query(None, description="只接收此酒店的事件（全域事件一律送出）")):
+    """
+    資料更新事件（Server-Sent Events）
+    
+    抽取庫存、重算統計、建立快照完成後推送事件，客戶端收到後再重新查詢，
+    不需要定時輪詢。事件名稱：inventory.updated、statistics.updated、snapshot.created、
+    forecasts.updated、alerts.fired
+    """
+    async def event_stream():
+        with event_hub.subscribe() as queue:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if hotel_id and event.get("hotel_id") not in (None, hotel_id):
+                    continue
+                yield format_sse(event)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/debug-system")
 async def debug_system():
     """系統調試信息 - 檢查前端文件、權限、配置等"""
@@ -544,21 +688,8 @@ async def debug_system():
 
 @app.get("/room-types")
 async def get_room_types(hotel_id: Optional[str] = Query(None, description="酒店ID，不指定則返回所有酒店的房型")):
-    pool = await db_manager.get_connection()
-    async with pool.acquire() as conn:
-        if hotel_id:
-            rows = await conn.fetch("SELECT * FROM room_types WHERE hotel_id = $1 ORDER BY inv_type_code", hotel_id)
-        else:
-            rows = await conn.fetch("SELECT * FROM room_types ORDER BY hotel_id, inv_type_code")
-        
-        # 添加酒店名稱
-        result = []
-        for row in rows:
-            room_data = dict(row)
-            room_data['hotel_name'] = get_hotel_name(room_data['hotel_id'])
-            result.append(room_data)
-        
-        return result
+    # 目錄中的房型已包含酒店名稱
+    return (await get_catalog()).list_room_types(hotel_id)
 
 # ===================
 # 房間管理 API
@@ -591,6 +722,8 @@ async def update_room_type(room_id: int, room_update: RoomTypeUpdate):
                 SET name = $1, total_rooms = $2, updated_at = CURRENT_TIMESTAMP
                 WHERE id = $3
             """, room_update.name, room_update.total_rooms, room_id)
+            await notify(conn, "room_types.updated", hotel_id=existing_room['hotel_id'])
+            catalog.invalidate()
             
             # 返回更新後的數據
             updated_room = await conn.fetchrow("SELECT * FROM room_types WHERE id = $1", room_id)
@@ -624,6 +757,8 @@ async def create_room_type(room_create: RoomTypeCreate):
                 VALUES ($1, $2, $3, $4)
                 RETURNING *
             """, room_create.inv_type_code, room_create.name, room_create.total_rooms, room_create.hotel_id)
+            await notify(conn, "room_types.updated", hotel_id=room_create.hotel_id)
+            catalog.invalidate()
             
             room_data = dict(new_room)
             room_data['hotel_name'] = get_hotel_name(room_data['hotel_id'])
@@ -646,11 +781,11 @@ async def delete_room_type(room_id: int):
             if not existing_room:
                 raise HTTPException(status_code=404, detail="房間類型不存在")
             
-            # 檢查是否有相關的庫存數據
-            inventory_count = await conn.fetchval(
-                "SELECT COUNT(*) FROM inventory_data WHERE inv_type_code = $1 AND hotel_id = $2",
-                existing_room['inv_type_code'], existing_room['hotel_id']
-            )
+            # 檢查是否有相關的庫存或週統計數據（與批次刪除共用同一個查詢）
+            in_use = await find_room_types_in_use(
+                conn, [(existing_room['hotel_id'], existing_room['inv_type_code'])])
+            inventory_count = in_use[0]['inventory_count'] if in_use else 0
+            stats_count = in_use[0]['statistics_count'] if in_use else 0
             
             if inventory_count > 0:
                 raise HTTPException(
@@ -658,12 +793,6 @@ async def delete_room_type(room_id: int):
                     detail=f"無法刪除房間類型，存在 {inventory_count} 筆相關庫存數據。請先清理庫存數據。"
                 )
             
-            # 檢查是否有相關的週統計數據
-            stats_count = await conn.fetchval(
-                "SELECT COUNT(*) FROM weekly_statistics WHERE inv_type_code = $1 AND hotel_id = $2",
-                existing_room['inv_type_code'], existing_room['hotel_id']
-            )
-            
             if stats_count > 0:
                 raise HTTPException(
                     status_code=400,
@@ -672,6 +801,8 @@ async def delete_room_type(room_id: int):
             
             # 刪除房間類型
             await conn.execute("DELETE FROM room_types WHERE id = $1", room_id)
+            await notify(conn, "room_types.updated", hotel_id=existing_room['hotel_id'])
+            catalog.invalidate()
             
             logger.info(f"房間類型已刪除: ID={room_id}, 代碼={existing_room['inv_type_code']}")
             return {"success": True, "message": "房間類型已成功刪除"}
@@ -680,48 +811,268 @@ async def delete_room_type(room_id: int):
         logger.error(f"刪除房間類型失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"刪除房間類型失敗: {str(e)}")
 
-@app.post("/fetch-inventory/{inv_type_code}")
-async def fetch_inventory_for_room_type(inv_type_code: str, start_date: str, end_date: str, hotel_id: str = Query(..., description="酒店ID")):
+class RoomTypeSyncRequest(BaseModel):
+    room_types: List[RoomTypeCreate]
+    delete_missing: bool = False
+    dry_run: bool = False
+
+@app.post("/room-types/sync")
+async def sync_room_types_endpoint(request: RoomTypeSyncRequest):
+    """
+    以房型清單為準同步 room_types（新增、更新、刪除各一個批次語句，可重複執行）
+    
+    只影響清單中出現的酒店；delete_missing 時刪除這些酒店中不在清單內的房型。
+    dry_run 只返回比對結果，不寫入；仍有庫存或統計數據而無法刪除的房型列在 blocked_deletes
+    （實際同步時返回 400）。同時有其他請求新增相同房型時返回 409。
+    """
+    try:
+        desired = normalize_room_types(room.model_dump() for room in request.room_types)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     pool = await db_manager.get_connection()
+    async with pool.acquire() as conn:
+        try:
+            plan = await sync_room_types(conn, desired, request.delete_missing, request.dry_run)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except asyncpg.UniqueViolationError:
+            # 其他請求在比對後新增了相同的房型（FOR UPDATE 只鎖住既有的列）
+            raise HTTPException(status_code=409, detail="房型正在被其他請求同步，請重新執行")
+    if plan.changed and not request.dry_run:
+        catalog.invalidate()
+    
+    return {
+        "success": True,
+        "dry_run": request.dry_run,
+        **plan.summary(),
+        "inserts": [f"{s.hotel_id}-{s.inv_type_code}" for s in plan.inserts],
+        "updates": [f"{s.hotel_id}-{s.inv_type_code}" for s in plan.updates],
+        "deletes": [f"{hotel_id}-{code}" for hotel_id, code in plan.deletes],
+        "blocked_deletes": plan.blocked,
+    }
+
+class RoomTypeBatchUpdate(RoomTypeUpdate):
+    id: int
+
+class RoomTypeBatchRequest(BaseModel):
+    creates: List[RoomTypeCreate] = []
+    updates: List[RoomTypeBatchUpdate] = []
+    deletes: List[int] = []
+
+def _validate_room_type_batch(request: RoomTypeBatchRequest) -> List[str]:
+    """請求本身的檢查（不需查詢資料庫）"""
+    errors = []
+    
+    ids = [u.id for u in request.updates] + request.deletes
+    duplicated_ids = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicated_ids:
+        errors.append(f"同一房間類型在批次中出現多次: ID {', '.join(map(str, duplicated_ids))}")
+    
+    keys = [(c.hotel_id, c.inv_type_code) for c in request.creates]
+    duplicated_keys = sorted({k for k in keys if keys.count(k) > 1})
+    if duplicated_keys:
+        errors.append(f"新增的房型代碼重複: {', '.join(f'{h}-{c}' for h, c in duplicated_keys)}")
+    
+    for room in [*request.creates, *request.updates]:
+        if room.total_rooms < 0:
+            errors.append(f"房間總數不可為負數: {room.name}")
+    return errors
+
+@app.post("/room-types/batch")
+async def batch_room_types(request: RoomTypeBatchRequest):
+    """
+    批次新增、更新、刪除房間類型（單一交易，全部套用或全部不套用）
+    
+    存在性、房型代碼衝突、庫存與週統計相依檢查各以一個查詢完成；
+    任一筆不通過時不做任何變更，並一次返回所有問題。
+    """
+    errors = _validate_room_type_batch(request)
+    if errors:
+        raise HTTPException(status_code=400, detail="；".join(errors))
     
     try:
-        logger.info(f"Fetching inventory data for {inv_type_code} (Hotel {hotel_id}) from {start_date} to {end_date}")
-        data = await hotel_api.fetch_inventory_data(inv_type_code, start_date, end_date, hotel_id)
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                ids = [u.id for u in request.updates] + request.deletes
+                existing = {
+                    row['id']: row for row in await conn.fetch(
+                        "SELECT * FROM room_types WHERE id = ANY($1::int[]) FOR UPDATE", ids)
+                }
+                missing = [i for i in ids if i not in existing]
+                if missing:
+                    raise HTTPException(status_code=404, detail=f"房間類型不存在: ID {', '.join(map(str, missing))}")
+                
+                deleted = [existing[i] for i in request.deletes]
+                in_use = await find_room_types_in_use(
+                    conn, [(row['hotel_id'], row['inv_type_code']) for row in deleted])
+                for row in in_use:
+                    errors.append(
+                        f"無法刪除 {get_hotel_name(row['hotel_id'])} {row['inv_type_code']}，"
+                        f"存在 {row['inventory_count']} 筆庫存數據與 {row['statistics_count']} 筆統計數據"
+                    )
+                
+                # 同一批次中刪除的房型代碼可以重新新增
+                conflicts = await conn.fetch("""
+                    SELECT rt.hotel_id, rt.inv_type_code
+                    FROM room_types rt
+                    JOIN unnest($1::varchar[], $2::varchar[]) AS c(hotel_id, inv_type_code)
+                      ON rt.hotel_id = c.hotel_id AND rt.inv_type_code = c.inv_type_code
+                    WHERE NOT rt.id = ANY($3::int[])
+                """, [c.hotel_id for c in request.creates], [c.inv_type_code for c in request.creates],
+                    request.deletes)
+                for row in conflicts:
+                    errors.append(f"{get_hotel_name(row['hotel_id'])} 已存在房型代碼 {row['inv_type_code']}")
+                
+                if errors:
+                    raise HTTPException(status_code=400, detail="；".join(errors))
+                
+                if request.deletes:
+                    await conn.execute("DELETE FROM room_types WHERE id = ANY($1::int[])", request.deletes)
+                
+                updated = []
+                if request.updates:
+                    updated = await conn.fetch("""
+                        UPDATE room_types rt
+                        SET name = u.name, total_rooms = u.total_rooms, updated_at = CURRENT_TIMESTAMP
+                        FROM unnest($1::int[], $2::varchar[], $3::int[]) AS u(id, name, total_rooms)
+                        WHERE rt.id = u.id
+                        RETURNING rt.*
+                    """, [u.id for u in request.updates], [u.name for u in request.updates],
+                        [u.total_rooms for u in request.updates])
+                
+                created = []
+                if request.creates:
+                    created = await conn.fetch("""
+                        INSERT INTO room_types (inv_type_code, name, total_rooms, hotel_id)
+                        SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::int[], $4::varchar[])
+                        RETURNING *
+                    """, [c.inv_type_code for c in request.creates], [c.name for c in request.creates],
+                        [c.total_rooms for c in request.creates], [c.hotel_id for c in request.creates])
+                
+                hotel_ids = {row['hotel_id'] for row in [*deleted, *updated, *created]}
+                for hotel_id in sorted(hotel_ids):
+                    await notify(conn, "room_types.updated", hotel_id=hotel_id)
         
-        logger.info(f"API response type: {type(data)}, data: {data}")
+        if hotel_ids:
+            catalog.invalidate()
         
+        logger.info(f"房間類型批次更新: 新增 {len(created)}, 更新 {len(updated)}, 刪除 {len(deleted)}")
+        return {
+            "success": True,
+            "created": [{**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} for row in created],
+            "updated": [{**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} for row in updated],
+            "deleted": request.deletes,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批次更新房間類型失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"批次更新房間類型失敗: {str(e)}")
+
+async def upsert_inventory_batch(conn, inv_type_code: str, hotel_id: str, items: List[dict],
+                                 changes: Optional[IngestChanges] = None) -> int:
+    """
+    以單一語句批次寫入庫存數據，返回寫入筆數
+    
+    同一語句返回新增或數量、狀態有變動的列與變動前的值（previous 與 INSERT 看到的是同一個快照），
+    記錄到 changes 供告警規則評估。
+    """
+    # 同一批次內相同日期只保留最後一筆，避免 ON CONFLICT 重複更新同一列
+    by_date = {}
+    for item in items:
+        by_date[datetime.strptime(item["date"], "%Y-%m-%d").date()] = item
+    
+    if not by_date:
+        return 0
+    
+    changed_rows = await conn.fetch("""
+        WITH previous AS (
+            SELECT date, quantity, status FROM inventory_data
+            WHERE inv_type_code = $1 AND hotel_id = $5 AND date = ANY($2::date[])
+        ), upserted AS (
+            INSERT INTO inventory_data (inv_type_code, date, quantity, status, hotel_id)
+            SELECT $1, t.date, t.quantity, t.status, $5
+            FROM unnest($2::date[], $3::int[], $4::varchar[]) AS t(date, quantity, status)
+            ON CONFLICT (inv_type_code, date, hotel_id) 
+            DO UPDATE SET quantity = EXCLUDED.quantity, status = EXCLUDED.status
+            RETURNING date, quantity, status
+        )
+        SELECT u.date, u.quantity, u.status,
+               p.quantity AS previous_quantity, p.status AS previous_status
+        FROM upserted u
+        LEFT JOIN previous p ON p.date = u.date
+        WHERE p.date IS NULL OR p.quantity <> u.quantity OR p.status <> u.status
+    """, inv_type_code, list(by_date.keys()),
+        [item["quantity"] for item in by_date.values()],
+        [item["status"] for item in by_date.values()], hotel_id)
+    
+    if changes is not None:
+        changes.add(list(by_date.values()), changed_rows)
+    return len(by_date)
+
+@app.post("/fetch-inventory/{inv_type_code}")
+async def fetch_inventory_for_room_type(inv_type_code: str, start_date: str, end_date: str, hotel_id: str = Query(..., description="酒店ID")):
+    pool = await db_manager.get_connection()
+    
+    try:
+        # 邊讀取 PMS 回應邊批次寫入，記憶體用量只跟批次大小有關
+        stored_count = 0
+        api_success = True
+        changes = IngestChanges(hotel_id, inv_type_code)
         async with pool.acquire() as conn:
+            await ensure_partitions(
+                conn, INVENTORY_TABLE,
+                datetime.strptime(start_date, "%Y-%m-%d").date(),
+                datetime.strptime(end_date, "%Y-%m-%d").date()
+            )
+            # 整次抽取在同一個交易中寫入：PMS 回應中途失敗時全部回滾，保留原本的庫存，
+            # 不發出 inventory.updated 也不評估告警（與一次讀完再寫入時相同，不會留下部分資料）
+            try:
+                async with conn.transaction():
+                    async for batch in hotel_api.stream_inventory_data(inv_type_code, start_date, end_date, hotel_id):
+                        stored_count += await upsert_inventory_batch(conn, inv_type_code, hotel_id, batch, changes)
+            except PMSAPIError:
+                api_success = False
+                stored_count = 0
+            
             await conn.execute(
                 "INSERT INTO api_calls (start_date, end_date, inv_type_code, success) VALUES ($1, $2, $3, $4)",
                 datetime.strptime(start_date, "%Y-%m-%d").date(),
                 datetime.strptime(end_date, "%Y-%m-%d").date(),
                 f"{hotel_id}-{inv_type_code}",
-                data is not None
+                api_success
             )
+            if stored_count:
+                await notify(conn, "inventory.updated", hotel_id=hotel_id, inv_type_code=inv_type_code,
+                             start_date=start_date, end_date=end_date, rows=stored_count)
             
-            if data and isinstance(data, dict) and "data" in data:
-                logger.info(f"Processing data: {data}")
-                
-                if data["data"] and len(data["data"]) > 0 and "availability" in data["data"][0]:
-                    inventory_data = data["data"][0]["availability"]
-                    logger.info(f"Found {len(inventory_data)} inventory items")
-                    
-                    for item in inventory_data:
-                        await conn.execute("""
-                            INSERT INTO inventory_data (inv_type_code, date, quantity, status, hotel_id)
-                            VALUES ($1, $2, $3, $4, $5)
-                            ON CONFLICT (inv_type_code, date, hotel_id) 
-                            DO UPDATE SET quantity = $3, status = $4
-                        """, inv_type_code, datetime.strptime(item["date"], "%Y-%m-%d").date(), 
-                            item["quantity"], item["status"], hotel_id)
-                    
-                    return {"success": True, "message": f"Data fetched and stored for {inv_type_code}"}
-                else:
-                    logger.warning("No availability data found in API response")
-                    return {"success": False, "message": "No availability data found in API response"}
-            else:
-                logger.warning(f"Invalid or empty API response: {data}")
-                return {"success": False, "message": "Invalid or empty API response"}
+            # 只對這次變動的列評估告警規則，失敗不影響抽取結果
+            if api_success:
+                try:
+                    fired = await process_ingest(conn, changes)
+                    if fired:
+                        await notify(conn, "alerts.fired", hotel_id=hotel_id, inv_type_code=inv_type_code,
+                                     alert_ids=[alert["id"] for alert in fired],
+                                     rules=sorted({alert["rule"] for alert in fired}))
+                except Exception as e:
+                    logger.warning(f"⚠️ 告警規則評估失敗: {str(e)}")
+        
+        INVENTORY_ROWS_UPSERTED.inc(stored_count, hotel_id=hotel_id)
+        INVENTORY_ROWS_PER_INGEST.observe(stored_count)
+        
+        if not api_success:
+            logger.warning(f"Invalid or empty API response for {inv_type_code} (Hotel {hotel_id})")
+            return {"success": False, "message": "Invalid or empty API response"}
+        
+        if stored_count == 0:
+            logger.warning("No availability data found in API response")
+            return {"success": False, "message": "No availability data found in API response"}
+        
+        log_event(logger, logging.INFO, "inventory.stored", hotel_id=hotel_id, inv_type_code=inv_type_code,
+                  start_date=start_date, end_date=end_date, rows=stored_count)
+        return {"success": True, "message": f"Data fetched and stored for {inv_type_code}"}
                 
     except Exception as e:
         logger.error(f"Error in fetch_inventory_for_room_type: {str(e)}")
@@ -742,13 +1093,7 @@ async def fetch_inventory_for_room_type(inv_type_code: str, start_date: str, end
 
 async def _fetch_all_inventory_internal(start_date: str, end_date: str, hotel_id: Optional[str] = None):
     """內部函數：抽取所有酒店或特定酒店的庫存數據"""
-    pool = await db_manager.get_connection()
-    
-    async with pool.acquire() as conn:
-        if hotel_id:
-            room_types = await conn.fetch("SELECT inv_type_code, hotel_id FROM room_types WHERE hotel_id = $1", hotel_id)
-        else:
-            room_types = await conn.fetch("SELECT inv_type_code, hotel_id FROM room_types")
+    room_types = (await get_catalog()).list_room_types(hotel_id)
     
     results = []
     for room_type in room_types:
@@ -768,25 +1113,63 @@ async def fetch_all_inventory(start_date: str, end_date: str, hotel_id: Optional
     results = await _fetch_all_inventory_internal(start_date, end_date, hotel_id)
     return {"results": results}
 
+class BackfillRequest(BaseModel):
+    start_date: date
+    end_date: date
+    hotel_id: Optional[str] = None
+    chunk_days: int = PMS_CHUNK_DAYS
+
+async def run_pms_backfill(request: BackfillRequest):
+    """依房型與日期分段抽取 PMS 歷史庫存，COPY 進暫存表後一次合併並重算統計"""
+    pool = await db_manager.get_connection()
+    failed: List[str] = []
+    try:
+        room_types = (await get_catalog()).list_room_types(request.hotel_id)
+        async with pool.acquire() as conn:
+            result = await run_backfill(conn, lambda c: stage_pms(
+                c, hotel_api, room_types, request.start_date, request.end_date,
+                chunk_days=request.chunk_days, failed=failed))
+        
+        log_event(logger, logging.INFO, "backfill.completed", hotel_id=request.hotel_id,
+                  start_date=request.start_date, end_date=request.end_date,
+                  rows=result.merged_rows, weekly_rows=result.weekly_statistics_rows, failed=len(failed))
+        for message in failed:
+            logger.warning(f"⚠️ Backfill 分段失敗: {message}")
+    except Exception as e:
+        logger.error(f"❌ Backfill 失敗: {str(e)}")
+
+@app.post("/backfill-inventory")
+async def backfill_inventory(request: BackfillRequest, background_tasks: BackgroundTasks):
+    """
+    歷史庫存批次匯入（背景執行）
+    
+    PMS 依房型與 chunk_days 分段並行抽取，全部載入後一次合併並重算受影響的週統計。
+    檔案（CSV / Parquet）匯入請使用 scripts/backfill_inventory.py。
+    """
+    if request.end_date < request.start_date:
+        raise HTTPException(status_code=400, detail="結束日期不可早於開始日期")
+    if request.chunk_days < 1:
+        raise HTTPException(status_code=400, detail="chunk_days 必須大於 0")
+    
+    background_tasks.add_task(run_pms_backfill, request)
+    return {"success": True, "message": f"已開始匯入 {request.start_date} ~ {request.end_date} 的歷史庫存"}
+
 @app.post("/calculate-weekly-statistics/{inv_type_code}")
 async def calculate_weekly_statistics(inv_type_code: str, week_start_date: str, hotel_id: str):
     pool = await db_manager.get_connection()
+    recompute_start = time.perf_counter()
     
     try:
         week_start = datetime.strptime(week_start_date, "%Y-%m-%d").date()
         week_end = week_start + timedelta(days=6)
         
+        room_type_info = (await get_catalog()).room_type(hotel_id, inv_type_code)
+        if not room_type_info:
+            raise HTTPException(status_code=404, detail="Room type not found")
+        
+        total_rooms = room_type_info["total_rooms"]
+        
         async with pool.acquire() as conn:
-            room_type_info = await conn.fetchrow(
-                "SELECT total_rooms FROM room_types WHERE inv_type_code = $1 AND hotel_id = $2", 
-                inv_type_code, hotel_id
-            )
-            
-            if not room_type_info:
-                raise HTTPException(status_code=404, detail="Room type not found")
-            
-            total_rooms = room_type_info["total_rooms"]
-            
             inventory_data = await conn.fetch("""
                 SELECT date, quantity, status 
                 FROM inventory_data 
@@ -797,66 +1180,32 @@ async def calculate_weekly_statistics(inv_type_code: str, week_start_date: str,
             if not inventory_data:
                 raise HTTPException(status_code=404, detail=f"No inventory data found for {inv_type_code} (Hotel {hotel_id}) in period {week_start} to {week_end}")
             
-            total_available_rooms = 0
-            total_occupied_rooms = 0
-            available_days = 0
-            total_rooms_all_days = 0
-            
-            for day_data in inventory_data:
-                remaining_rooms = day_data["quantity"]
-                status = day_data["status"]
-                
-                occupied_rooms = total_rooms - remaining_rooms
-                total_occupied_rooms += occupied_rooms
-                total_rooms_all_days += total_rooms
-                
-                if status == "OPEN":
-                    total_available_rooms += total_rooms
-                    available_days += 1
-            
-            actual_occupancy_rate = (total_occupied_rooms / total_available_rooms * 100) if total_available_rooms > 0 else 0
-            actual_vacancy_rate = 100 - actual_occupancy_rate
-            
-            total_occupancy_rate = (total_occupied_rooms / total_rooms_all_days * 100) if total_rooms_all_days > 0 else 0
-            total_vacancy_rate = 100 - total_occupancy_rate
-            
-            await conn.execute("""
-                INSERT INTO weekly_statistics 
-                (inv_type_code, week_start_date, week_end_date, actual_occupancy_rate, 
-                 actual_vacancy_rate, total_occupancy_rate, total_vacancy_rate, 
-                 total_rooms, total_available_days, total_days, hotel_id)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
-                ON CONFLICT (inv_type_code, week_start_date, hotel_id)
-                DO UPDATE SET 
-                    week_end_date = $3,
-                    actual_occupancy_rate = $4,
-                    actual_vacancy_rate = $5,
-                    total_occupancy_rate = $6,
-                    total_vacancy_rate = $7,
-                    total_rooms = $8,
-                    total_available_days = $9,
-                    total_days = $10
-            """, inv_type_code, week_start, week_end,
-                round(actual_occupancy_rate, 2), round(actual_vacancy_rate, 2),
-                round(total_occupancy_rate, 2), round(total_vacancy_rate, 2),
-                total_rooms, available_days, 7, hotel_id)
+            stats = OccupancyFrame.from_records(inventory_data, total_rooms=total_rooms).totals()
+            stats.update(inv_type_code=inv_type_code, hotel_id=hotel_id,
+                         week_start_date=week_start, total_rooms=total_rooms)
+            await upsert_weekly_statistics(conn, [stats])
+            await notify(conn, "statistics.updated", kind="weekly", hotel_id=hotel_id,
+                         inv_type_code=inv_type_code, start_date=week_start, end_date=week_end)
             
             return {
                 "inv_type_code": inv_type_code,
                 "hotel_id": hotel_id,
                 "week_start_date": week_start,
                 "week_end_date": week_end,
-                "actual_occupancy_rate": round(actual_occupancy_rate, 2),
-                "actual_vacancy_rate": round(actual_vacancy_rate, 2),
-                "total_occupancy_rate": round(total_occupancy_rate, 2),
-                "total_vacancy_rate": round(total_vacancy_rate, 2),
+                "actual_occupancy_rate": stats["actual_occupancy_rate"],
+                "actual_vacancy_rate": stats["actual_vacancy_rate"],
+                "total_occupancy_rate": stats["total_occupancy_rate"],
+                "total_vacancy_rate": stats["total_vacancy_rate"],
                 "total_rooms": total_rooms,
-                "total_available_days": available_days
+                "total_available_days": stats["open_days"]
             }
             
     except Exception as e:
-        logger.error(f"Error calculating weekly statistics: {str(e)}")
+        log_event(logger, logging.ERROR, "stats.calculate_failed", f"Error calculating weekly statistics: {str(e)}",
+                  hotel_id=hotel_id, inv_type_code=inv_type_code, week_start=week_start_date)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        STATISTICS_RECOMPUTE_DURATION.observe(time.perf_counter() - recompute_start, kind="weekly")
 
 @app.get("/weekly-statistics", 
          summary="獲取週統計數據",
@@ -874,6 +1223,8 @@ async def calculate_weekly_statistics(inv_type_code: str, week_start_date: str,
 - 指定房型+週數: 返回特定房型最近幾週的統計
 
 結果按週開始日期降序排列（最新在前）
+
+指定 **as_of**（日期或快照ID）時改讀該時點的快照
          """,
          response_description="週統計數據列表，包含房型資訊和各項統計指標")
 async def get_weekly_statistics(
@@ -893,69 +1244,71 @@ async def get_weekly_statistics(
         None,
         description="酒店ID，不指定則返回所有酒店的數據",
         examples={"example": {"value": "2436"}}
-    )
+    ),
+    as_of: Optional[str] = Query(None, description=AS_OF_DESCRIPTION)
 ):
     pool = await db_manager.get_connection()
+    snapshot = await get_catalog()
+    # 依酒店或週數查詢時附上房型名稱（由目錄補上，不再 JOIN room_types）
+    with_names = not inv_type_code
     
     async with pool.acquire() as conn:
+        weekly_statistics = (await get_data_source(conn, as_of)).weekly_statistics
         if inv_type_code and weeks and hotel_id:
             # 特定房型 + 週數限制 + 特定酒店
-            rows = await conn.fetch("""
-                SELECT * FROM weekly_statistics 
+            rows = await conn.fetch(f"""
+                SELECT * FROM {weekly_statistics} ws
                 WHERE inv_type_code = $1 AND hotel_id = $2
                 ORDER BY week_start_date DESC
                 LIMIT $3
             """, inv_type_code, hotel_id, weeks)
         elif inv_type_code and weeks:
             # 特定房型 + 週數限制
-            rows = await conn.fetch("""
-                SELECT * FROM weekly_statistics 
+            rows = await conn.fetch(f"""
+                SELECT * FROM {weekly_statistics} ws
                 WHERE inv_type_code = $1 
                 ORDER BY week_start_date DESC
                 LIMIT $2
             """, inv_type_code, weeks)
         elif inv_type_code and hotel_id:
             # 特定房型 + 特定酒店
-            rows = await conn.fetch("""
-                SELECT * FROM weekly_statistics 
+            rows = await conn.fetch(f"""
+                SELECT * FROM {weekly_statistics} ws
                 WHERE inv_type_code = $1 AND hotel_id = $2
                 ORDER BY week_start_date DESC
             """, inv_type_code, hotel_id)
         elif inv_type_code:
             # 只有特定房型 - 返回該房型的所有週統計
-            rows = await conn.fetch("""
-                SELECT * FROM weekly_statistics 
+            rows = await conn.fetch(f"""
+                SELECT * FROM {weekly_statistics} ws
                 WHERE inv_type_code = $1 
                 ORDER BY week_start_date DESC
             """, inv_type_code)
         elif hotel_id and weeks:
             # 特定酒店 + 週數限制
-            rows = await conn.fetch("""
-                SELECT ws.*, rt.name as room_type_name
-                FROM weekly_statistics ws
-                JOIN room_types rt ON ws.inv_type_code = rt.inv_type_code AND ws.hotel_id = rt.hotel_id
+            rows = await conn.fetch(f"""
+                SELECT ws.*
+                FROM {weekly_statistics} ws
                 WHERE ws.hotel_id = $1
                 ORDER BY ws.week_start_date DESC
                 LIMIT $2
             """, hotel_id, weeks)
         elif hotel_id:
             # 只有特定酒店
-            rows = await conn.fetch("""
-                SELECT ws.*, rt.name as room_type_name
-                FROM weekly_statistics ws
-                JOIN room_types rt ON ws.inv_type_code = rt.inv_type_code AND ws.hotel_id = rt.hotel_id
+            rows = await conn.fetch(f"""
+                SELECT ws.*
+                FROM {weekly_statistics} ws
                 WHERE ws.hotel_id = $1
                 ORDER BY ws.week_start_date DESC
             """, hotel_id)
         elif weeks:
             # 只有週數限制 - 返回所有房型最近幾週的統計
-            rows = await conn.fetch("""
-                SELECT ws.*, rt.name as room_type_name
-                FROM weekly_statistics ws
-                JOIN room_types rt ON ws.inv_type_code = rt.inv_type_code AND ws.hotel_id = rt.hotel_id
+            rows = await conn.fetch(f"""
+                SELECT ws.*
+                FROM {weekly_statistics} ws
                 WHERE ws.week_start_date >= (
                     SELECT week_start_date 
-                    FROM weekly_statistics 
+                    FROM {weekly_statistics} latest
                     ORDER BY week_start_date DESC 
                     OFFSET $1 - 1 
                     LIMIT 1
@@ -964,18 +1317,16 @@ async def get_weekly_statistics(
             """, weeks)
         else:
             # 沒有篩選條件 - 返回所有房型的最新週統計
-            rows = await conn.fetch("""
-                SELECT * FROM latest_weekly_statistics 
+            rows = await conn.fetch(f"""
+                {latest_weekly_statistics_query(weekly_statistics)}
                 ORDER BY week_start_date DESC
             """)
         
+        if with_names:
+            return snapshot.with_room_type_names(rows)
+        
         # 添加酒店名稱
-        result = []
-        for row in rows:
-            data = dict(row)
-            data['hotel_name'] = get_hotel_name(data['hotel_id'])
-            result.append(data)
-        return result
+        return [{**dict(row), "hotel_name": snapshot.hotel_name(row['hotel_id'])} for row in rows]
 
 @app.post("/weekly-update")
 async def weekly_update(background_tasks: BackgroundTasks):
@@ -983,73 +1334,697 @@ async def weekly_update(background_tasks: BackgroundTasks):
     return {"message": "Weekly update started in background"}
 
 # ================================
-# 快照管理 API 端點
+# 期間統計 API 端點（月、季、自訂季節）
 # ================================
 
-@app.post("/create-snapshot")
-async def create_snapshot_endpoint(description: str = Query(None, description="快照描述")):
-    """手動創建數據快照"""
-    try:
-        snapshot_id = await create_data_snapshot(description)
-        return {
-            "success": True,
-            "message": "快照創建成功",
-            "snapshot_id": snapshot_id
-        }
-    except Exception as e:
-        logger.error(f"創建快照失敗: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"創建快照失敗: {str(e)}")
+class SeasonCreate(BaseModel):
+    code: str
+    name: str
+    start_date: date
+    end_date: date
 
-@app.get("/snapshots")
-async def get_snapshots_endpoint(limit: int = Query(10, description="返回快照數量", ge=1, le=100)):
-    """獲取快照列表"""
+@app.get("/period-statistics")
+async def get_period_statistics(
+    period_type: str = Query("month", description="期間類型: month / quarter / season"),
+    hotel_id: Optional[str] = Query(None, description="酒店ID"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼"),
+    start_date: Optional[str] = Query(None, description="期間起始日下限 (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="期間起始日上限 (YYYY-MM-DD)")
+):
+    """獲取月、季或季節統計"""
+    if period_type not in PERIOD_TYPES:
+        raise HTTPException(status_code=400, detail=f"period_type 必須是 {', '.join(PERIOD_TYPES)} 之一")
+    
     try:
-        snapshots = await get_snapshots(limit)
+        conditions = ["period_type = $1"]
+        params = [period_type]
+        for column, op, value in (
+            ("hotel_id", "=", hotel_id),
+            ("inv_type_code", "=", inv_type_code),
+            ("period_start", ">=", datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None),
+            ("period_start", "<=", datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None),
+        ):
+            if value is not None:
+                params.append(value)
+                conditions.append(f"{column} {op} ${len(params)}")
+        
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(f"""
+                SELECT * FROM period_statistics
+                WHERE {" AND ".join(conditions)}
+                ORDER BY period_start DESC, hotel_id, inv_type_code
+            """, *params)
+        
         return {
             "success": True,
-            "count": len(snapshots),
-            "snapshots": snapshots
+            "period_type": period_type,
+            "count": len(rows),
+            "statistics": [{**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} for row in rows]
         }
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式不正確，請使用 YYYY-MM-DD 格式")
     except Exception as e:
-        logger.error(f"獲取快照列表失敗: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"獲取快照列表失敗: {str(e)}")
+        logger.error(f"獲取期間統計失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取期間統計失敗: {str(e)}")
 
-@app.get("/snapshots/{snapshot_id}")
-async def get_snapshot_detail(snapshot_id: int):
-    """獲取快照詳情"""
+@app.get("/period-statistics/season-comparison")
+async def get_season_comparison(
+    season_code: str = Query(..., description="季節代碼"),
+    hotel_id: Optional[str] = Query(None, description="酒店ID"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼")
+):
+    """同一季節跨年度比較"""
     try:
-        snapshot = await get_snapshot_by_id(snapshot_id)
-        if not snapshot:
-            raise HTTPException(status_code=404, detail="找不到指定的快照")
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(f"""
+                SELECT * FROM period_statistics
+                WHERE period_type = 'season' AND period_key = $1
+                {"AND hotel_id = $2" if hotel_id else ""}
+                {f"AND inv_type_code = ${3 if hotel_id else 2}" if inv_type_code else ""}
+                ORDER BY hotel_id, inv_type_code, period_start
+            """, season_code, *[v for v in (hotel_id, inv_type_code) if v])
         
         return {
             "success": True,
-            "snapshot": snapshot
+            "season_code": season_code,
+            "comparison": [
+                {**row, "hotel_name": get_hotel_name(row['hotel_id'])}
+                for row in compare_periods([dict(r) for r in rows])
+            ]
         }
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"獲取快照詳情失敗: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"獲取快照詳情失敗: {str(e)}")
+        logger.error(f"獲取季節比較失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取季節比較失敗: {str(e)}")
 
-@app.delete("/snapshots/{snapshot_id}")
-async def delete_snapshot_endpoint(snapshot_id: int):
-    """刪除快照"""
+@app.post("/period-statistics/refresh")
+async def refresh_period_statistics_endpoint(
+    start_date: str = Query(..., description="開始日期 (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="結束日期 (YYYY-MM-DD)"),
+    hotel_id: Optional[str] = Query(None, description="酒店ID")
+):
+    """重算與指定區間重疊的期間統計"""
     try:
-        success = await delete_snapshot(snapshot_id)
-        if not success:
-            raise HTTPException(status_code=404, detail="找不到指定的快照或快照已被刪除")
-        
-        return {
-            "success": True,
-            "message": f"快照 {snapshot_id} 已成功刪除"
-        }
-    except HTTPException:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式不正確，請使用 YYYY-MM-DD 格式")
+    
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            with STATISTICS_RECOMPUTE_DURATION.time(kind="period"):
+                async with conn.transaction():
+                    written = await refresh_period_statistics(conn, start, end, hotel_id)
+                    await notify(conn, "statistics.updated", kind="period", hotel_id=hotel_id,
+                                 start_date=start, end_date=end)
+        return {"success": True, "rows_written": written}
+    except Exception as e:
+        logger.error(f"重算期間統計失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"重算期間統計失敗: {str(e)}")
+
+@app.get("/seasons")
+async def get_seasons():
+    """獲取自訂季節列表"""
+    pool = await db_manager.get_connection()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT * FROM seasons ORDER BY start_date DESC")
+    return [dict(row) for row in rows]
+
+@app.post("/seasons")
+async def create_season(season: SeasonCreate):
+    """新增自訂季節並立即計算其統計"""
+    if season.end_date < season.start_date:
+        raise HTTPException(status_code=400, detail="結束日期不可早於開始日期")
+    
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                row = await conn.fetchrow("""
+                    INSERT INTO seasons (code, name, start_date, end_date)
+                    VALUES ($1, $2, $3, $4)
+                    RETURNING *
+                """, season.code, season.name, season.start_date, season.end_date)
+                written = await refresh_season(conn, season.code, season.start_date, season.end_date)
+                await notify(conn, "statistics.updated", kind="season", season=season.code,
+                             start_date=season.start_date, end_date=season.end_date)
+        
+        logger.info(f"新季節已創建: {season.code} ({season.start_date} ~ {season.end_date}), 統計 {written} 筆")
+        return {**dict(row), "rows_written": written}
+    except asyncpg.UniqueViolationError:
+        raise HTTPException(status_code=400, detail="相同代碼與開始日期的季節已存在")
+    except Exception as e:
+        logger.error(f"創建季節失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"創建季節失敗: {str(e)}")
+
+@app.delete("/seasons/{season_id}")
+async def delete_season(season_id: int):
+    """刪除自訂季節及其統計"""
+    pool = await db_manager.get_connection()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            season = await conn.fetchrow("DELETE FROM seasons WHERE id = $1 RETURNING code, start_date", season_id)
+            if not season:
+                raise HTTPException(status_code=404, detail="季節不存在")
+            await conn.execute("""
+                DELETE FROM period_statistics
+                WHERE period_type = 'season' AND period_key = $1 AND period_start = $2
+            """, season['code'], season['start_date'])
+    
+    return {"success": True, "message": "季節已成功刪除"}
+
+# ================================
+# 訂房進度 API 端點（pace / pickup）
+# ================================
+
+def _parse_stay_range(start_date: str, end_date: str):
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    if end < start:
+        raise HTTPException(status_code=400, detail="結束日期不可早於開始日期")
+    if (end - start).days > MAX_PACE_DAYS:
+        raise HTTPException(status_code=400, detail=f"入住日區間不可超過 {MAX_PACE_DAYS} 天")
+    return start, end
+
+@app.get("/booking-pace")
+async def get_booking_pace(
+    start_date: str = Query(..., description="入住日起 (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="入住日迄 (YYYY-MM-DD)"),
+    hotel_id: Optional[str] = Query(None, description="酒店ID"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼"),
+    max_days: int = Query(90, description="顯示入住前幾天內的進度", ge=0, le=MAX_PACE_DAYS),
+    compare_last_year: bool = Query(True, description="附上去年同期（平移 364 天）"),
+    as_of: Optional[str] = Query(None, description="截至日期 (YYYY-MM-DD)，預設為最新快照日")
+):
+    """
+    入住日區間的訂房進度曲線
+    
+    pace 為入住前每一天的累計已售房數（區間內各入住日加總），數據來自每日快照的增量結果。
+    """
+    try:
+        start, end = _parse_stay_range(start_date, end_date)
+        as_of_day = datetime.strptime(as_of, "%Y-%m-%d").date() if as_of else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式不正確，請使用 YYYY-MM-DD 格式")
+    
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            as_of_day = as_of_day or await latest_snapshot_date(conn)
+            if as_of_day is None:
+                raise HTTPException(status_code=404, detail="尚無快照，無法計算訂房進度")
+            pace = await booking_pace(conn, start, end, as_of_day, max_days, hotel_id, inv_type_code,
+                                      compare_last_year)
+        
+        return {
+            "success": True,
+            "start_date": start,
+            "end_date": end,
+            "as_of": as_of_day,
+            "hotel_id": hotel_id,
+            "inv_type_code": inv_type_code,
+            **pace
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"獲取訂房進度失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取訂房進度失敗: {str(e)}")
+
+@app.get("/booking-pace/pickup")
+async def get_booking_pickup(
+    start_date: str = Query(..., description="入住日起 (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="入住日迄 (YYYY-MM-DD)"),
+    hotel_id: Optional[str] = Query(None, description="酒店ID"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼"),
+    days: int = Query(7, description="pickup 計算天數", ge=1, le=90),
+    as_of: Optional[str] = Query(None, description="截至日期 (YYYY-MM-DD)，預設為最新快照日")
+):
+    """每個入住日的已售房數（on the books）、最近 days 天的 pickup 與去年同期"""
+    try:
+        start, end = _parse_stay_range(start_date, end_date)
+        as_of_day = datetime.strptime(as_of, "%Y-%m-%d").date() if as_of else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式不正確，請使用 YYYY-MM-DD 格式")
+    
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            as_of_day = as_of_day or await latest_snapshot_date(conn)
+            if as_of_day is None:
+                raise HTTPException(status_code=404, detail="尚無快照，無法計算 pickup")
+            rows = await booking_pickup(conn, start, end, as_of_day, days, hotel_id, inv_type_code)
+        
+        return {
+            "success": True,
+            "as_of": as_of_day,
+            "days": days,
+            "hotel_id": hotel_id,
+            "inv_type_code": inv_type_code,
+            "count": len(rows),
+            "pickup": rows
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"獲取 pickup 失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取 pickup 失敗: {str(e)}")
+
+@app.post("/booking-pace/rebuild")
+async def rebuild_booking_pace_endpoint():
+    """以所有已完成的快照重新寫入訂房進度（首次建立 booking_pace 表後執行）"""
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                snapshots = await rebuild_booking_pace(conn)
+        return {"success": True, "snapshots_processed": snapshots}
+    except Exception as e:
+        logger.error(f"重建訂房進度失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"重建訂房進度失敗: {str(e)}")
+
+# ================================
+# 入住率預測 API 端點（每晚預先計算）
+# ================================
+
+async def run_forecast_refresh(hotel_id: Optional[str] = None):
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            result = await run_forecast(conn, hotel_id=hotel_id)
+        log_event(logger, logging.INFO, "forecast.completed",
+                  f"入住率預測完成: {result.hotels} 家酒店 {result.rows} 筆",
+                  hotel_id=hotel_id, rows=result.rows, duration_s=result.duration_s)
+    except Exception as e:
+        logger.error(f"❌ 入住率預測失敗: {str(e)}")
+
+@app.post("/forecasts/refresh")
+async def refresh_forecasts(background_tasks: BackgroundTasks, hotel_id: Optional[str] = None):
+    """重新計算未來各週的入住率預測（背景執行，平時由 scripts/run_forecast.py 每晚執行）"""
+    background_tasks.add_task(run_forecast_refresh, hotel_id)
+    return {"success": True, "message": "已開始計算入住率預測"}
+
+@app.get("/forecasts")
+async def get_forecasts(
+    hotel_id: Optional[str] = Query(None, description="酒店ID"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼"),
+    weeks: int = Query(FORECAST_WEEKS, description="從本週起顯示幾週", ge=1, le=FORECAST_WEEKS)
+):
+    """
+    未來各週的入住率預測（讀取預先計算的結果）
+
+    forecast_occupancy_rate 為預測的實際入住率；on_the_books_rate 為目前已訂入住率，
+    baseline_rate 為季節基準，pickup_rate 為預期還會增加的入住率。
+    """
+    today = datetime.now().date()
+    current_monday = today - timedelta(days=today.weekday())
+    conditions, args = [], [current_monday, current_monday + timedelta(weeks=weeks)]
+    for column, value in (("hotel_id", hotel_id), ("inv_type_code", inv_type_code)):
+        if value is not None:
+            args.append(value)
+            conditions.append(f"AND {column} = ${len(args)}")
+
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            try:
+                rows = await conn.fetch(f"""
+                    SELECT hotel_id, inv_type_code, week_start_date, week_start_date + 6 AS week_end_date,
+                           forecast_occupancy_rate, on_the_books_rate, baseline_rate, pickup_rate,
+                           lead_days, model, generated_at
+                    FROM occupancy_forecasts
+                    WHERE week_start_date >= $1 AND week_start_date < $2 {" ".join(conditions)}
+                    ORDER BY hotel_id, inv_type_code, week_start_date
+                """, *args)
+            except asyncpg.UndefinedTableError:
+                logger.warning("⚠️ occupancy_forecasts 表不存在，請先執行 forecast_schema.sql")
+                rows = []
+
+        forecasts = (await get_catalog()).with_room_type_names(rows)
+        return {
+            "success": True,
+            "hotel_id": hotel_id,
+            "inv_type_code": inv_type_code,
+            "generated_at": max((row["generated_at"] for row in forecasts), default=None),
+            "count": len(forecasts),
+            "forecasts": forecasts
+        }
+    except Exception as e:
+        logger.error(f"獲取入住率預測失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取入住率預測失敗: {str(e)}")
+
+# ================================
+# 空房搜尋 API 端點
+# ================================
+
+@app.get("/availability/search")
+async def search_availability(
+    start_date: str = Query(..., description="開始日期 (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="結束日期 (YYYY-MM-DD)，包含當天"),
+    min_units: int = Query(1, description="至少可售幾間", ge=1),
+    hotel_id: Optional[str] = Query(None, description="露營區ID"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼"),
+    require_all_dates: bool = Query(True, description="只返回每一天都符合的房型")
+):
+    """
+    搜尋區間內還有 min_units 間以上可售（OPEN）的營區與房型
+
+    由記憶體中的空房索引回答，不查詢庫存表；庫存寫入後下次搜尋時自動重新載入。
+    """
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式不正確，請使用 YYYY-MM-DD 格式")
+    if end < start:
+        raise HTTPException(status_code=400, detail="結束日期不可早於開始日期")
+
+    try:
+        pool = await db_manager.get_connection()
+        cube = await availability_index.get(pool, await get_catalog())
+        if not cube.covers(start, end):
+            raise HTTPException(status_code=400,
+                                detail=f"只能搜尋 {cube.start_date} ~ {cube.end_date} 之間的日期")
+
+        results = cube.search(start, end, min_units, hotel_id, inv_type_code, require_all_dates)
+        hotels = {}
+        for row in results:
+            hotel = hotels.setdefault(row["hotel_id"], {
+                "hotel_id": row["hotel_id"], "hotel_name": row["hotel_name"], "room_types": 0})
+            hotel["room_types"] += 1
+
+        return {
+            "success": True,
+            "start_date": start,
+            "end_date": end,
+            "min_units": min_units,
+            "require_all_dates": require_all_dates,
+            "index_loaded_at": cube.loaded_at,
+            "hotels": list(hotels.values()),
+            "count": len(results),
+            "results": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"空房搜尋失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"空房搜尋失敗: {str(e)}")
+
+# ================================
+# 庫存告警 API 端點
+# ================================
+
+@app.get("/alerts")
+async def get_alerts(
+    hotel_id: Optional[str] = Query(None, description="酒店ID"),
+    rule: Optional[str] = Query(None, description="規則：low_availability、occupancy_jump、status_closed、suspicious_response"),
+    include_acknowledged: bool = Query(False, description="包含已確認的告警"),
+    limit: int = Query(100, description="返回筆數", ge=1, le=1000)
+):
+    """抽取庫存時觸發的告警（最新的在前）；新告警另以 /events 的 alerts.fired 事件推送"""
+    conditions, args = [], []
+    for column, value in (("hotel_id", hotel_id), ("rule", rule)):
+        if value is not None:
+            args.append(value)
+            conditions.append(f"{column} = ${len(args)}")
+    if not include_acknowledged:
+        conditions.append("acknowledged_at IS NULL")
+    args.append(limit)
+
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            try:
+                rows = await conn.fetch(f"""
+                    SELECT id, rule, severity, hotel_id, inv_type_code, target_date, message,
+                           details, fired_at, acknowledged_at
+                    FROM inventory_alerts
+                    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+                    ORDER BY fired_at DESC, id DESC
+                    LIMIT ${len(args)}
+                """, *args)
+            except asyncpg.UndefinedTableError:
+                logger.warning("⚠️ inventory_alerts 表不存在，請先執行 alerts_schema.sql")
+                rows = []
+
+        alerts = [{**dict(row), "details": json.loads(row["details"]),
+                   "hotel_name": get_hotel_name(row["hotel_id"])} for row in rows]
+        return {"success": True, "count": len(alerts), "alerts": alerts}
+    except Exception as e:
+        logger.error(f"獲取告警失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取告警失敗: {str(e)}")
+
+@app.post("/alerts/{alert_id}/acknowledge")
+async def acknowledge_alert(alert_id: int):
+    """確認告警；確認後相同條件再次發生時會重新觸發"""
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow("""
+                UPDATE inventory_alerts
+                SET acknowledged_at = COALESCE(acknowledged_at, CURRENT_TIMESTAMP)
+                WHERE id = $1
+                RETURNING id, acknowledged_at
+            """, alert_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="告警不存在")
+        return {"success": True, **dict(row)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"確認告警失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"確認告警失敗: {str(e)}")
+
+# ================================
+# 資料匯出 API 端點
+# ================================
+
+@app.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("csv", description="匯出格式：csv 或 parquet", pattern="^(csv|parquet)$"),
+    hotel_id: Optional[str] = Query(None, description="酒店ID"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼"),
+    start_date: Optional[str] = Query(None, description="開始日期 (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)")
+):
+    """
+    串流匯出 inventory、weekly_statistics、inventory_snapshots、weekly_statistics_snapshots
+    
+    日期範圍套用在庫存日期、週開始日或快照日期；檔案邊查詢邊送出，可匯出多年資料。
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail=f"不支援的資料集，可用: {', '.join(EXPORT_DATASETS)}")
+    
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式不正確，請使用 YYYY-MM-DD 格式")
+    
+    query, args = build_export_query(dataset, hotel_id, inv_type_code, start, end)
+    
+    if format == "parquet":
+        try:
+            require_pyarrow()
+        except RuntimeError as e:
+            raise HTTPException(status_code=501, detail=str(e))
+    
+    # 先取得第一個區塊：送出回應標頭前的錯誤仍可返回 500
+    pool = await db_manager.get_connection()
+    conn = await pool.acquire()
+    chunks = stream_export(conn, format, query, args)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception as e:
+        await chunks.aclose()
+        await pool.release(conn)
+        logger.error(f"匯出 {dataset} 失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"匯出失敗: {str(e)}")
+    
+    released = False
+    
+    async def release():
+        # body 結束時釋放；客戶端在 body 開始前斷線時由回應的背景工作釋放
+        nonlocal released
+        if not released:
+            released = True
+            await chunks.aclose()
+            await pool.release(conn)
+    
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # 標頭已送出，無法改為錯誤狀態碼；拋出讓伺服器中斷連線（不送出 chunked 結尾），
+            # 客戶端因此會看到回應不完整，而不是把截斷的檔案當成完整匯出
+            log_event(logger, logging.ERROR, "export.failed", dataset=dataset, format=format, error=str(e))
+            raise
+        finally:
+            await release()
+        log_event(logger, logging.INFO, "export.completed", dataset=dataset, format=format,
+                  hotel_id=hotel_id, inv_type_code=inv_type_code, start_date=start_date, end_date=end_date)
+    
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[format],
+        background=BackgroundTask(release),
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(dataset, format, start, end)}"'},
+    )
+
+# ================================
+# 快照管理 API 端點
+# ================================
+
+@app.post("/create-snapshot")
+async def create_snapshot_endpoint(
+    background_tasks: BackgroundTasks,
+    description: str = Query(None, description="快照描述")
+):
+    """
+    手動創建今天的數據快照（背景分段複製）
+
+    今天的快照已存在或正在建立時返回同一個快照；以 GET /snapshots/{snapshot_id} 查詢進度
+    （status 由 processing 變為 completed，inventory_records、weekly_statistics_records 為已複製筆數）。
+    """
+    try:
+        pool = await db_manager.get_connection()
+        today = datetime.now().date()
+        async with pool.acquire() as conn:
+            snapshot_id, status = await claim_snapshot(conn, today, description)
+        
+        if status != 'completed':
+            background_tasks.add_task(run_snapshot_build, snapshot_id, today)
+        return {
+            "success": True,
+            "message": "今天的快照已存在" if status == 'completed' else "快照建立中",
+            "snapshot_id": snapshot_id,
+            "status": status
+        }
+    except Exception as e:
+        logger.error(f"創建快照失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"創建快照失敗: {str(e)}")
+
+@app.get("/snapshots")
+async def get_snapshots_endpoint(limit: int = Query(10, description="返回快照數量", ge=1, le=100)):
+    """獲取快照列表"""
+    try:
+        snapshots = await get_snapshots(limit)
+        return {
+            "success": True,
+            "count": len(snapshots),
+            "snapshots": snapshots
+        }
+    except Exception as e:
+        logger.error(f"獲取快照列表失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取快照列表失敗: {str(e)}")
+
+@app.post("/snapshots/cleanup")
+async def cleanup_snapshots_endpoint(
+    keep_days: Optional[int] = Query(None, description="保留天數（預設 SNAPSHOT_RETENTION_DAYS）", ge=1)
+):
+    """刪除超過保留天數的快照（以月分區為單位）"""
+    keep_days = keep_days or SNAPSHOT_RETENTION_DAYS
+    if keep_days is None:
+        raise HTTPException(status_code=400, detail="未設定 SNAPSHOT_RETENTION_DAYS，請指定 keep_days")
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            deleted = await cleanup_old_snapshots(conn, keep_days)
+        return {
+            "success": True,
+            "message": f"已刪除 {deleted} 個過期快照",
+            "deleted_snapshots": deleted
+        }
+    except Exception as e:
+        logger.error(f"清理快照失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"清理快照失敗: {str(e)}")
+
+@app.get("/snapshots/{snapshot_id}")
+async def get_snapshot_detail(snapshot_id: int):
+    """獲取快照詳情"""
+    try:
+        snapshot = await get_snapshot_by_id(snapshot_id)
+        if not snapshot:
+            raise HTTPException(status_code=404, detail="找不到指定的快照")
+        
+        return {
+            "success": True,
+            "snapshot": snapshot
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"獲取快照詳情失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取快照詳情失敗: {str(e)}")
+
+@app.delete("/snapshots/{snapshot_id}")
+async def delete_snapshot_endpoint(snapshot_id: int):
+    """刪除快照"""
+    try:
+        success = await delete_snapshot(snapshot_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="找不到指定的快照或快照已被刪除")
+        
+        return {
+            "success": True,
+            "message": f"快照 {snapshot_id} 已成功刪除"
+        }
+    except HTTPException:
         raise
     except Exception as e:
         logger.error(f"刪除快照失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"刪除快照失敗: {str(e)}")
 
+@app.post("/snapshots/{snapshot_id}/restore")
+async def restore_snapshot_endpoint(
+    snapshot_id: int,
+    hotel_id: Optional[str] = Query(None, description="只還原指定酒店，不指定則還原全部"),
+    dry_run: bool = Query(True, description="只列出還原會造成的變動，不寫入")
+):
+    """
+    把快照的庫存與週統計寫回即時資料（PMS 抽取異常時回復）
+
+    預設為 dry_run：返回新增、更新、刪除的筆數與前幾筆逐日明細；確認後以 dry_run=false 執行。
+    快照在範圍內沒有庫存或週統計時返回 400（避免清空即時資料）。
+    """
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            snapshot = await conn.fetchrow(
+                "SELECT id, snapshot_date FROM data_snapshots WHERE id = $1 AND status = 'completed'",
+                snapshot_id)
+            if not snapshot:
+                raise HTTPException(status_code=404, detail="找不到指定的快照")
+            result = await restore_snapshot(conn, snapshot, hotel_id, dry_run)
+
+        return {
+            "success": True,
+            "dry_run": result.dry_run,
+            "snapshot": {"snapshot_id": result.snapshot_id, "snapshot_date": result.snapshot_date},
+            "hotel_id": result.hotel_id,
+            "inventory": result.inventory,
+            "weekly_statistics": result.weekly_statistics,
+            "date_range": {"start_date": result.start_date, "end_date": result.end_date},
+            "period_statistics_rows": result.period_statistics_rows,
+            "preview": result.preview
+        }
+    except HTTPException:
+        raise
+    except EmptySnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncpg.LockNotAvailableError:
+        raise HTTPException(status_code=409, detail="庫存正在寫入中，請稍後再試")
+    except Exception as e:
+        logger.error(f"還原快照失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"還原快照失敗: {str(e)}")
+
 # ================================
 # 比較分析 API 端點
 # ================================
@@ -1057,7 +2032,9 @@ async def delete_snapshot_endpoint(snapshot_id: int):
 @app.get("/compare-snapshots")
 async def compare_snapshots_endpoint(
     from_date: str = Query(..., description="起始日期 (YYYY-MM-DD)"),
-    to_date: str = Query(..., description="結束日期 (YYYY-MM-DD)")
+    to_date: str = Query(..., description="結束日期 (YYYY-MM-DD)"),
+    hotel_id: Optional[str] = Query(None, description="酒店ID，不指定則比較所有酒店"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼")
 ):
     """比較兩個快照之間的變化"""
     try:
@@ -1065,7 +2042,7 @@ async def compare_snapshots_endpoint(
         datetime.strptime(from_date, "%Y-%m-%d")
         datetime.strptime(to_date, "%Y-%m-%d")
         
-        comparison = await compare_snapshots(from_date, to_date)
+        comparison = await compare_snapshots(from_date, to_date, hotel_id, inv_type_code)
         return {
             "success": True,
             **comparison
@@ -1078,6 +2055,55 @@ async def compare_snapshots_endpoint(
         logger.error(f"比較快照失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"比較快照失敗: {str(e)}")
 
+@app.get("/compare-snapshots/inventory")
+async def compare_snapshot_inventory(
+    from_date: str = Query(..., description="起始快照日期 (YYYY-MM-DD)"),
+    to_date: str = Query(..., description="結束快照日期 (YYYY-MM-DD)"),
+    hotel_id: Optional[str] = Query(None, description="酒店ID"),
+    inv_type_code: Optional[str] = Query(None, description="房型代碼"),
+    start_date: Optional[str] = Query(None, description="庫存開始日期 (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="庫存結束日期 (YYYY-MM-DD)"),
+    limit: int = Query(DIFF_PAGE_SIZE, description="每頁筆數", ge=1, le=MAX_DIFF_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor")
+):
+    """
+    逐日比較兩個快照的庫存數量與狀態
+    
+    只返回有變化的日期（new、removed、changed），依房型、酒店、日期排序；
+    還有下一頁時 next_cursor 不為 null，帶入 cursor 參數取得下一頁。
+    """
+    try:
+        datetime.strptime(from_date, "%Y-%m-%d")
+        datetime.strptime(to_date, "%Y-%m-%d")
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式不正確，請使用 YYYY-MM-DD 格式")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        pool = await db_manager.get_connection()
+        async with pool.acquire() as conn:
+            from_snapshot, to_snapshot = await _get_snapshot_pair(conn, from_date, to_date)
+            page = await fetch_inventory_diff(conn, from_snapshot, to_snapshot, hotel_id, inv_type_code,
+                                              start, end, after, limit)
+        
+        return {
+            "success": True,
+            "from_snapshot": {"id": from_snapshot['id'], "snapshot_date": from_snapshot['snapshot_date']},
+            "to_snapshot": {"id": to_snapshot['id'], "snapshot_date": to_snapshot['snapshot_date']},
+            "count": len(page["changes"]),
+            **page
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"比較快照庫存失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"比較快照庫存失敗: {str(e)}")
+
 @app.get("/weekly-changes")
 async def get_weekly_changes(
     weeks: int = Query(4, description="查看最近幾週的變化", ge=1, le=12),
@@ -1102,7 +2128,8 @@ async def get_weekly_changes(
             try:
                 comparison = await compare_snapshots(
                     from_snapshot['snapshot_date'].strftime('%Y-%m-%d'),
-                    to_snapshot['snapshot_date'].strftime('%Y-%m-%d')
+                    to_snapshot['snapshot_date'].strftime('%Y-%m-%d'),
+                    hotel_id
                 )
                 changes.append({
                     "period": f"{from_snapshot['snapshot_date']} → {to_snapshot['snapshot_date']}",
@@ -1127,84 +2154,122 @@ async def get_weekly_changes(
 # Dashboard 專用 API 端點
 # ================================
 
+# 圖表數據快取：週統計寫入（statistics.updated）時由資料更新事件清除
+charts_cache = TTLCache("dashboard_charts", ttl=int(os.getenv("DASHBOARD_CACHE_TTL", "600")))
+
+def _invalidate_dashboard_cache(event: dict):
+    if event.get("event") in ("statistics.updated", "listener.connected"):
+        charts_cache.clear()
+
+event_hub.add_handler(_invalidate_dashboard_cache)
+
+# 各房型最新一週的統計（取代 latest_weekly_statistics 視圖，房型名稱由目錄補上）
+def latest_weekly_statistics_query(weekly_statistics: str = LIVE.weekly_statistics) -> str:
+    return f"""
+        SELECT * FROM (
+            SELECT DISTINCT ON (hotel_id, inv_type_code) *
+            FROM {weekly_statistics} ws
+            ORDER BY hotel_id, inv_type_code, week_start_date DESC
+        ) latest
+    """
+
+LATEST_SNAPSHOT_QUERY = """
+    SELECT * FROM data_snapshots 
+    WHERE status = 'completed' 
+    ORDER BY snapshot_date DESC 
+    LIMIT 1
+"""
+
+
+def _build_dashboard_summary(hotel_id: Optional[str], room_types_count: int, hotels_count: int,
+                             latest_snapshot, weekly_rows, current_monday: date) -> dict:
+    """由本週起的週統計記錄組出 Dashboard 摘要"""
+    weekly_stats = [
+        {"inv_type_code": g["inv_type_code"], "hotel_id": g["hotel_id"],
+         "avg_occupancy": g["avg_occupancy"], "weeks_count": g["count"]}
+        for g in mean_by(
+            [row['actual_occupancy_rate'] for row in weekly_rows],
+            {"inv_type_code": [row['inv_type_code'] for row in weekly_rows],
+             "hotel_id": [row['hotel_id'] for row in weekly_rows]}
+        )
+    ]
+    weekly_stats.sort(key=lambda row: row['avg_occupancy'], reverse=True)
+    
+    # 計算平均入住率
+    avg_occupancy = summarize_rates(row['avg_occupancy'] for row in weekly_stats)["average"]
+    
+    # 找出表現最好和最差的房型
+    best_performer = weekly_stats[0] if weekly_stats else None
+    worst_performer = weekly_stats[-1] if weekly_stats else None
+    
+    return {
+        "success": True,
+        "summary": {
+            "total_hotels": hotels_count,
+            "total_room_types": room_types_count,
+            "avg_occupancy_rate": round(avg_occupancy, 2),
+            "data_period": f"本週起 ({current_monday})",
+            "best_performer": {
+                "room_type": best_performer['inv_type_code'] if best_performer else None,
+                "hotel_id": best_performer['hotel_id'] if best_performer else None,
+                "hotel_name": get_hotel_name(best_performer['hotel_id']) if best_performer else None,
+                "occupancy_rate": round(best_performer['avg_occupancy'] or 0, 2) if best_performer else 0
+            } if best_performer else None,
+            "worst_performer": {
+                "room_type": worst_performer['inv_type_code'] if worst_performer else None,
+                "hotel_id": worst_performer['hotel_id'] if worst_performer else None,
+                "hotel_name": get_hotel_name(worst_performer['hotel_id']) if worst_performer else None,
+                "occupancy_rate": round(worst_performer['avg_occupancy'] or 0, 2) if worst_performer else 0
+            } if worst_performer else None,
+        },
+        "latest_snapshot": dict(latest_snapshot) if latest_snapshot else None,
+        "room_types_overview": [
+            {**row, "hotel_name": get_hotel_name(row['hotel_id'])} 
+            for row in weekly_stats[:10]
+        ]  # 前10個房型
+    }
+
 @app.get("/dashboard-summary")
-async def get_dashboard_summary(hotel_id: Optional[str] = Query(None, description="酒店ID，不指定則返回所有酒店摘要")):
-    """獲取Dashboard主頁摘要數據"""
+async def get_dashboard_summary(
+    hotel_id: Optional[str] = Query(None, description="酒店ID，不指定則返回所有酒店摘要"),
+    as_of: Optional[str] = Query(None, description=AS_OF_DESCRIPTION)
+):
+    """獲取Dashboard主頁摘要數據（指定 as_of 時以快照日期為本週）"""
     try:
         pool = await db_manager.get_connection()
+        snapshot = await get_catalog()
+        
+        # 房型總數與酒店總數（如果不指定hotel_id）
+        room_types_count = len(snapshot.list_room_types(hotel_id))
+        hotels_count = 1 if hotel_id else len(snapshot.hotels)
+        
         async with pool.acquire() as conn:
-            # 基本統計
-            hotel_filter = "WHERE hotel_id = $1" if hotel_id else ""
             params = [hotel_id] if hotel_id else []
+            source = await get_data_source(conn, as_of)
             
-            # 房型總數
-            room_types_count = await conn.fetchval(f"""
-                SELECT COUNT(*) FROM room_types {hotel_filter}
-            """, *params)
-            
-            # 酒店總數（如果不指定hotel_id）
-            hotels_count = 1 if hotel_id else await conn.fetchval("SELECT COUNT(DISTINCT hotel_id) FROM room_types")
-            
-            # 最新快照資訊
-            latest_snapshot = await conn.fetchrow("""
-                SELECT * FROM data_snapshots 
-                WHERE status = 'completed' 
-                ORDER BY snapshot_date DESC 
-                LIMIT 1
-            """)
+            # 最新快照資訊（歷史時點為該快照）
+            if source.is_live:
+                latest_snapshot = await conn.fetchrow(LATEST_SNAPSHOT_QUERY)
+            else:
+                latest_snapshot = await conn.fetchrow(
+                    "SELECT * FROM data_snapshots WHERE id = $1", source.snapshot_id)
             
             # 本週統計概覽
-            today = datetime.now().date()
+            today = source.today
             current_monday = today - timedelta(days=today.weekday())
             
-            weekly_stats = await conn.fetch(f"""
-                SELECT 
-                    inv_type_code,
-                    hotel_id,
-                    AVG(actual_occupancy_rate) as avg_occupancy,
-                    COUNT(*) as weeks_count
-                FROM weekly_statistics 
+            weekly_rows = await conn.fetch(f"""
+                SELECT inv_type_code, hotel_id, actual_occupancy_rate
+                FROM {source.weekly_statistics} ws
                 WHERE week_start_date >= $1
                 {" AND hotel_id = $2" if hotel_id else ""}
-                GROUP BY inv_type_code, hotel_id
-                ORDER BY avg_occupancy DESC
             """, current_monday, *(params if hotel_id else []))
             
-            # 計算平均入住率
-            avg_occupancy = 0
-            if weekly_stats:
-                avg_occupancy = sum(row['avg_occupancy'] or 0 for row in weekly_stats) / len(weekly_stats)
-            
-            # 找出表現最好和最差的房型
-            best_performer = weekly_stats[0] if weekly_stats else None
-            worst_performer = weekly_stats[-1] if weekly_stats else None
-            
-            return {
-                "success": True,
-                "summary": {
-                    "total_hotels": hotels_count,
-                    "total_room_types": room_types_count,
-                    "avg_occupancy_rate": round(avg_occupancy, 2),
-                    "data_period": f"本週起 ({current_monday})",
-                    "best_performer": {
-                        "room_type": best_performer['inv_type_code'] if best_performer else None,
-                        "hotel_id": best_performer['hotel_id'] if best_performer else None,
-                        "hotel_name": get_hotel_name(best_performer['hotel_id']) if best_performer else None,
-                        "occupancy_rate": round(best_performer['avg_occupancy'] or 0, 2) if best_performer else 0
-                    } if best_performer else None,
-                    "worst_performer": {
-                        "room_type": worst_performer['inv_type_code'] if worst_performer else None,
-                        "hotel_id": worst_performer['hotel_id'] if worst_performer else None,
-                        "hotel_name": get_hotel_name(worst_performer['hotel_id']) if worst_performer else None,
-                        "occupancy_rate": round(worst_performer['avg_occupancy'] or 0, 2) if worst_performer else 0
-                    } if worst_performer else None,
-                },
-                "latest_snapshot": dict(latest_snapshot) if latest_snapshot else None,
-                "room_types_overview": [
-                    {**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} 
-                    for row in weekly_stats[:10]
-                ]  # 前10個房型
-            }
+            summary = _build_dashboard_summary(hotel_id, room_types_count, hotels_count,
+                                               latest_snapshot, weekly_rows, current_monday)
+            return {**summary, "as_of": source.describe()}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"獲取Dashboard摘要失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"獲取Dashboard摘要失敗: {str(e)}")
@@ -1213,23 +2278,23 @@ async def get_dashboard_summary(hotel_id: Optional[str] = Query(None, descriptio
 async def get_room_type_trends(
     inv_type_code: str, 
     hotel_id: str = Query(..., description="酒店ID"),
-    weeks: int = Query(12, description="查看週數", ge=4, le=26)
+    weeks: int = Query(12, description="查看週數", ge=4, le=26),
+    as_of: Optional[str] = Query(None, description=AS_OF_DESCRIPTION)
 ):
     """獲取特定房型的趨勢分析"""
     try:
         pool = await db_manager.get_connection()
+        
+        # 檢查房型是否存在
+        room_type = (await get_catalog()).room_type(hotel_id, inv_type_code)
+        if not room_type:
+            raise HTTPException(status_code=404, detail="找不到指定的房型")
+        
         async with pool.acquire() as conn:
-            # 檢查房型是否存在
-            room_type = await conn.fetchrow("""
-                SELECT * FROM room_types 
-                WHERE inv_type_code = $1 AND hotel_id = $2
-            """, inv_type_code, hotel_id)
-            
-            if not room_type:
-                raise HTTPException(status_code=404, detail="找不到指定的房型")
+            source = await get_data_source(conn, as_of)
             
             # 獲取趨勢數據
-            trends = await conn.fetch("""
+            trends = await conn.fetch(f"""
                 SELECT 
                     week_start_date,
                     week_end_date,
@@ -1239,7 +2304,7 @@ async def get_room_type_trends(
                     total_vacancy_rate,
                     total_rooms,
                     total_available_days
-                FROM weekly_statistics 
+                FROM {source.weekly_statistics} ws
                 WHERE inv_type_code = $1 AND hotel_id = $2
                 ORDER BY week_start_date DESC
                 LIMIT $3
@@ -1256,22 +2321,22 @@ async def get_room_type_trends(
                 trend_direction = "上升" if occupancy_change > 0 else "下降" if occupancy_change < 0 else "穩定"
                 
                 # 找出最高和最低週
-                occupancy_rates = [(t['actual_occupancy_rate'] or 0, t['week_start_date']) for t in trends_data]
-                peak_week = max(occupancy_rates, key=lambda x: x[0]) if occupancy_rates else (0, None)
-                lowest_week = min(occupancy_rates, key=lambda x: x[0]) if occupancy_rates else (0, None)
+                rates = summarize_rates(t['actual_occupancy_rate'] for t in trends_data)
+                peak = trends_data[rates["max_index"]]
+                lowest = trends_data[rates["min_index"]]
                 
                 insights = {
                     "trend_direction": trend_direction,
                     "occupancy_change": round(occupancy_change, 2),
                     "peak_week": {
-                        "date": peak_week[1],
-                        "occupancy_rate": round(peak_week[0], 2)
+                        "date": peak['week_start_date'],
+                        "occupancy_rate": round(peak['actual_occupancy_rate'] or 0, 2)
                     },
                     "lowest_week": {
-                        "date": lowest_week[1],
-                        "occupancy_rate": round(lowest_week[0], 2)
+                        "date": lowest['week_start_date'],
+                        "occupancy_rate": round(lowest['actual_occupancy_rate'] or 0, 2)
                     },
-                    "average_occupancy": round(sum(t['actual_occupancy_rate'] or 0 for t in trends_data) / len(trends_data), 2)
+                    "average_occupancy": rates["average"]
                 }
             else:
                 insights = {
@@ -1284,7 +2349,8 @@ async def get_room_type_trends(
             
             return {
                 "success": True,
-                "room_type": {**dict(room_type), "hotel_name": get_hotel_name(room_type['hotel_id'])},
+                "room_type": room_type,
+                "as_of": source.describe(),
                 "period": f"過去 {weeks} 週",
                 "data_points": trends_data,
                 "insights": insights
@@ -1300,12 +2366,16 @@ async def get_sales_status(
     hotel_id: Optional[str] = Query(None, description="露營區ID"),
     inv_type_code: Optional[str] = Query(None, description="房型代碼"),
     start_date: str = Query(..., description="開始日期 (YYYY-MM-DD)"),
-    end_date: str = Query(..., description="結束日期 (YYYY-MM-DD)")
+    end_date: str = Query(..., description="結束日期 (YYYY-MM-DD)"),
+    as_of: Optional[str] = Query(None, description=AS_OF_DESCRIPTION)
 ):
-    """獲取房間銷售狀況詳細數據"""
+    """獲取房間銷售狀況詳細數據（指定 as_of 時讀取該時點快照中的庫存，總房數為目前的設定）"""
     try:
         pool = await db_manager.get_connection()
+        snapshot = await get_catalog()
         async with pool.acquire() as conn:
+            source = await get_data_source(conn, as_of)
+            
             # 構建查詢條件
             where_conditions = ["id.date BETWEEN $1 AND $2"]
             params = [start_date, end_date]
@@ -1333,211 +2403,282 @@ async def get_sales_status(
             params[1] = end_date_obj
             
             # 獲取詳細銷售數據
-            sales_data = await conn.fetch(f"""
+            # 房型名稱與總房數由目錄補上
+            sales_data = snapshot.with_room_type_names(await conn.fetch(f"""
                 SELECT 
                     id.date,
                     id.inv_type_code,
                     id.hotel_id,
-                    rt.name as room_type_name,
-                    rt.total_rooms,
-                    id.quantity as available_rooms,
-                    id.status,
-                    (rt.total_rooms - id.quantity) as sold_rooms,
-                    CASE 
-                        WHEN rt.total_rooms > 0 THEN 
-                            ROUND(((rt.total_rooms - id.quantity)::decimal / rt.total_rooms * 100), 2)
-                        ELSE 0 
-                    END as occupancy_rate
-                FROM inventory_data id
-                JOIN room_types rt ON id.inv_type_code = rt.inv_type_code AND id.hotel_id = rt.hotel_id
+                    id.quantity,
+                    id.status
+                FROM {source.inventory} id
                 WHERE {where_clause}
                 ORDER BY id.date DESC, id.hotel_id, id.inv_type_code
-            """, *params)
-            
-            # 計算統計摘要
-            total_rooms = 0
-            total_sold = 0
-            total_available = 0
-            daily_stats = {}
-            
-            for row in sales_data:
-                date_key = row['date'].strftime('%Y-%m-%d')
-                if date_key not in daily_stats:
-                    daily_stats[date_key] = {
-                        'date': date_key,
-                        'total_rooms': 0,
-                        'sold_rooms': 0,
-                        'available_rooms': 0,
-                        'occupancy_rate': 0
-                    }
-                
-                daily_stats[date_key]['total_rooms'] += row['total_rooms']
-                daily_stats[date_key]['sold_rooms'] += row['sold_rooms']
-                daily_stats[date_key]['available_rooms'] += row['available_rooms']
-                
-                total_rooms += row['total_rooms']
-                total_sold += row['sold_rooms']
-                total_available += row['available_rooms']
-            
-            # 計算每日入住率
-            for date_key in daily_stats:
-                if daily_stats[date_key]['total_rooms'] > 0:
-                    daily_stats[date_key]['occupancy_rate'] = round(
-                        (daily_stats[date_key]['sold_rooms'] / daily_stats[date_key]['total_rooms']) * 100, 2
-                    )
-            
-            # 整體統計
-            avg_occupancy_rate = round((total_sold / total_rooms * 100), 2) if total_rooms > 0 else 0
-            
-            # 獲取房型表現排名
-            room_type_performance = await conn.fetch(f"""
-                SELECT 
-                    id.inv_type_code,
-                    id.hotel_id,
-                    rt.name as room_type_name,
-                    AVG(rt.total_rooms - id.quantity) as avg_sold_rooms,
-                    AVG(rt.total_rooms) as avg_total_rooms,
-                    ROUND(AVG((rt.total_rooms - id.quantity)::decimal / rt.total_rooms * 100), 2) as avg_occupancy_rate
-                FROM inventory_data id
-                JOIN room_types rt ON id.inv_type_code = rt.inv_type_code AND id.hotel_id = rt.hotel_id
-                WHERE {where_clause}
-                GROUP BY id.inv_type_code, id.hotel_id, rt.name
-                ORDER BY avg_occupancy_rate DESC
-            """, *params)
+            """, *params), include_total_rooms=True)
+            
+            # 以入住率引擎一次算出每列、每日、每房型與整體統計
+            frame = OccupancyFrame.from_records(sales_data)
+            sold_rooms = frame.sold_rooms.tolist()
+            occupancy_rates = frame.row_occupancy().tolist()
+            overall = frame.totals()
+            
+            daily_data = [
+                {
+                    'date': day['date'].strftime('%Y-%m-%d'),
+                    'total_rooms': day['total_room_days'],
+                    'sold_rooms': day['sold_rooms'],
+                    'available_rooms': day['available_rooms'],
+                    'occupancy_rate': day['total_occupancy_rate']
+                }
+                for day in frame.group(["day"])
+            ]
+            
+            # 房型表現排名
+            room_names = {(row['hotel_id'], row['inv_type_code']): row['room_type_name'] for row in sales_data}
+            room_type_performance = [
+                {
+                    'inv_type_code': group['inv_type_code'],
+                    'hotel_id': group['hotel_id'],
+                    'room_type_name': room_names[(group['hotel_id'], group['inv_type_code'])],
+                    'avg_sold_rooms': group['sold_rooms'] / group['days'],
+                    'avg_total_rooms': group['total_room_days'] / group['days'],
+                    'avg_occupancy_rate': group['total_occupancy_rate']
+                }
+                for group in frame.group(["hotel", "room_type"])
+            ]
+            room_type_performance.sort(key=lambda row: row['avg_occupancy_rate'], reverse=True)
             
             return {
                 "success": True,
+                "as_of": source.describe(),
                 "period": {
                     "start_date": start_date,
                     "end_date": end_date
                 },
                 "summary": {
-                    "total_rooms": total_rooms,
-                    "total_sold": total_sold,
-                    "total_available": total_available,
-                    "avg_occupancy_rate": avg_occupancy_rate,
-                    "total_days": len(daily_stats)
+                    "total_rooms": overall['total_room_days'],
+                    "total_sold": overall['sold_rooms'],
+                    "total_available": overall['available_rooms'],
+                    "avg_occupancy_rate": overall['total_occupancy_rate'],
+                    "total_days": len(daily_data)
                 },
-                "daily_data": sorted(daily_stats.values(), key=lambda x: x['date']),
+                "daily_data": daily_data,
                 "detailed_data": [
-                    {**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} 
-                    for row in sales_data
+                    {
+                        'date': row['date'],
+                        'inv_type_code': row['inv_type_code'],
+                        'hotel_id': row['hotel_id'],
+                        'room_type_name': row['room_type_name'],
+                        'total_rooms': row['total_rooms'],
+                        'available_rooms': row['quantity'],
+                        'status': row['status'],
+                        'sold_rooms': sold,
+                        'occupancy_rate': rate,
+                        'hotel_name': row['hotel_name']
+                    }
+                    for row, sold, rate in zip(sales_data, sold_rooms, occupancy_rates)
                 ],
                 "room_type_performance": [
-                    {**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} 
+                    {**row, "hotel_name": get_hotel_name(row['hotel_id'])} 
                     for row in room_type_performance
                 ]
             }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"獲取銷售狀況失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"獲取銷售狀況失敗: {str(e)}")
 
+def _build_heatmap_matrix(room_performance) -> dict:
+    """房型 × 週的入住率矩陣，沒有統計的週為 null"""
+    pivot = pivot_rates(
+        [row['actual_occupancy_rate'] for row in room_performance],
+        {"hotel_id": [row['hotel_id'] for row in room_performance],
+         "inv_type_code": [row['inv_type_code'] for row in room_performance]},
+        [row['week_start_date'] for row in room_performance],
+    )
+    return {
+        "weeks": pivot["columns"],
+        "room_types": [{**key, "hotel_name": get_hotel_name(key['hotel_id'])} for key in pivot["rows"]],
+        "occupancy": pivot["values"],
+    }
+
+def _build_dashboard_charts(hotel_id: Optional[str], weeks: int, room_performance, heatmap: str = "matrix") -> dict:
+    """由近幾週的週統計記錄組出 Dashboard 圖表數據"""
+    rates = [row['actual_occupancy_rate'] for row in room_performance]
+    hotel_ids = [row['hotel_id'] for row in room_performance]
+    
+    # 週入住率趨勢圖數據
+    occupancy_trends = [
+        {"week_start_date": g["week_start_date"], "avg_occupancy": g["avg_occupancy"],
+         "room_types_count": g["count"]}
+        for g in mean_by(rates, {"week_start_date": [row['week_start_date'] for row in room_performance]})
+    ]
+    
+    # 酒店對比數據（如果沒有指定hotel_id）
+    hotel_comparison = []
+    if not hotel_id:
+        room_types_per_hotel = {}
+        for g in mean_by(rates, {"hotel_id": hotel_ids,
+                                 "inv_type_code": [row['inv_type_code'] for row in room_performance]}):
+            room_types_per_hotel[g["hotel_id"]] = room_types_per_hotel.get(g["hotel_id"], 0) + 1
+        
+        hotel_comparison = [
+            {"hotel_id": g["hotel_id"], "avg_occupancy": g["avg_occupancy"], "total_weeks": g["count"],
+             "room_types_count": room_types_per_hotel[g["hotel_id"]]}
+            for g in mean_by(rates, {"hotel_id": hotel_ids})
+        ]
+        hotel_comparison.sort(key=lambda row: row["avg_occupancy"], reverse=True)
+    
+    charts = {
+        "occupancy_trends": occupancy_trends,
+        "room_performance_matrix": _build_heatmap_matrix(room_performance),
+        "hotel_comparison": [
+            {**row, "hotel_name": get_hotel_name(row['hotel_id'])} 
+            for row in hotel_comparison
+        ] if not hotel_id else [],
+    }
+    if heatmap == "rows":
+        # 舊版逐筆格式，供尚未改用矩陣的客戶端使用
+        charts["room_performance_heatmap"] = [
+            {**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} 
+            for row in room_performance
+        ]
+    
+    return {
+        "success": True,
+        "charts": charts,
+        "metadata": {
+            "period": f"過去 {weeks} 週",
+            "hotel_id": hotel_id,
+            "data_points": len(occupancy_trends)
+        }
+    }
+
+async def _fetch_room_performance(conn, weeks: int, hotel_id: Optional[str] = None,
+                                  source: DataSource = LIVE):
+    """近幾週的房型週入住率（圖表與摘要共用）"""
+    return await conn.fetch(f"""
+        SELECT 
+            inv_type_code,
+            hotel_id,
+            week_start_date,
+            actual_occupancy_rate
+        FROM {source.weekly_statistics} ws
+        WHERE week_start_date >= $2::date - INTERVAL '1 week' * $1
+        {"AND hotel_id = $3" if hotel_id else ""}
+        ORDER BY inv_type_code, week_start_date
+    """, weeks, source.today, *([hotel_id] if hotel_id else []))
+
 @app.get("/dashboard-charts")
 async def get_dashboard_charts(
     hotel_id: Optional[str] = Query(None, description="酒店ID"),
-    weeks: int = Query(8, description="查看週數", ge=4, le=26)
+    weeks: int = Query(8, description="查看週數", ge=4, le=26),
+    heatmap: str = Query("matrix", description="熱力圖格式：matrix（房型 × 週矩陣）或 rows（舊版逐筆）",
+                         pattern="^(matrix|rows)$"),
+    as_of: Optional[str] = Query(None, description=AS_OF_DESCRIPTION)
 ):
-    """獲取Dashboard圖表數據"""
+    """獲取Dashboard圖表數據（依酒店、週數與時點快取，週統計更新時清除）"""
+    # 查詢區間相對於今天（或快照日期），日期也納入快取鍵
+    def charts_cache_key(source: DataSource):
+        return (hotel_id, weeks, heatmap, source, source.today)
+
+    # 即時資料不需查詢快照，命中快取時不佔用連線
+    if not as_of:
+        cached = charts_cache.get(charts_cache_key(LIVE))
+        if cached is not None:
+            return cached
+
     try:
         pool = await db_manager.get_connection()
         async with pool.acquire() as conn:
-            hotel_filter = "AND hotel_id = $2" if hotel_id else ""
-            params = [weeks] + ([hotel_id] if hotel_id else [])
-            
-            # 週入住率趨勢圖數據
-            if hotel_id:
-                occupancy_trends = await conn.fetch("""
-                    SELECT 
-                        week_start_date,
-                        AVG(actual_occupancy_rate) as avg_occupancy,
-                        COUNT(*) as room_types_count
-                    FROM weekly_statistics 
-                    WHERE week_start_date >= CURRENT_DATE - INTERVAL '1 week' * $1
-                    AND hotel_id = $2
-                    GROUP BY week_start_date
-                    ORDER BY week_start_date
-                """, weeks, hotel_id)
-            else:
-                occupancy_trends = await conn.fetch("""
-                    SELECT 
-                        week_start_date,
-                        AVG(actual_occupancy_rate) as avg_occupancy,
-                        COUNT(*) as room_types_count
-                    FROM weekly_statistics 
-                    WHERE week_start_date >= CURRENT_DATE - INTERVAL '1 week' * $1
-                    GROUP BY week_start_date
-                    ORDER BY week_start_date
-                """, weeks)
-            
-            # 房型表現熱力圖數據
-            if hotel_id:
-                room_performance = await conn.fetch("""
-                    SELECT 
-                        inv_type_code,
-                        hotel_id,
-                        week_start_date,
-                        actual_occupancy_rate
-                    FROM weekly_statistics 
-                    WHERE week_start_date >= CURRENT_DATE - INTERVAL '1 week' * $1
-                    AND hotel_id = $2
-                    ORDER BY inv_type_code, week_start_date
-                """, weeks, hotel_id)
-            else:
-                room_performance = await conn.fetch("""
-                    SELECT 
-                        inv_type_code,
-                        hotel_id,
-                        week_start_date,
-                        actual_occupancy_rate
-                    FROM weekly_statistics 
-                    WHERE week_start_date >= CURRENT_DATE - INTERVAL '1 week' * $1
-                    ORDER BY inv_type_code, week_start_date
-                """, weeks)
-            
-            # 酒店對比數據（如果沒有指定hotel_id）
-            hotel_comparison = []
-            if not hotel_id:
-                hotel_comparison = await conn.fetch("""
-                    SELECT 
-                        hotel_id,
-                        AVG(actual_occupancy_rate) as avg_occupancy,
-                        COUNT(*) as total_weeks,
-                        COUNT(DISTINCT inv_type_code) as room_types_count
-                    FROM weekly_statistics 
-                    WHERE week_start_date >= CURRENT_DATE - INTERVAL '1 week' * $1
-                    GROUP BY hotel_id
-                    ORDER BY avg_occupancy DESC
-                """, weeks)
-            
-            return {
-                "success": True,
-                "charts": {
-                    "occupancy_trends": [dict(row) for row in occupancy_trends],
-                    "room_performance_heatmap": [
-                        {**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} 
-                        for row in room_performance
-                    ],
-                    "hotel_comparison": [
-                        {**dict(row), "hotel_name": get_hotel_name(row['hotel_id'])} 
-                        for row in hotel_comparison
-                    ] if not hotel_id else [],
-                },
-                "metadata": {
-                    "period": f"過去 {weeks} 週",
-                    "hotel_id": hotel_id,
-                    "data_points": len(occupancy_trends)
-                }
-            }
+            source = await get_data_source(conn, as_of)
+            cache_key = charts_cache_key(source)
+            if as_of:
+                cached = charts_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
+            # 房型表現熱力圖數據（趨勢圖與酒店對比都由這份數據計算）
+            room_performance = await _fetch_room_performance(conn, weeks, hotel_id, source)
+        result = _build_dashboard_charts(hotel_id, weeks, room_performance, heatmap)
+        result["metadata"]["as_of"] = source.describe()
+        charts_cache.set(cache_key, result)
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"獲取Dashboard圖表數據失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"獲取Dashboard圖表數據失敗: {str(e)}")
 
+@app.get("/dashboard-bundle")
+async def get_dashboard_bundle(
+    hotel_id: Optional[str] = Query(None, description="酒店ID，不指定則返回所有酒店"),
+    weeks: int = Query(8, description="圖表查看週數", ge=4, le=26),
+    snapshot_limit: int = Query(10, description="返回快照數量", ge=1, le=100)
+):
+    """
+    總覽頁一次載入：摘要、圖表、房型、最新週統計與快照列表
+    
+    各查詢在各自的連線上並行執行，回應時間約等於最慢的單一查詢。
+    摘要的本週統計取自圖表的近幾週資料，weekly_statistics 只掃描一次；
+    房型總數與酒店數也直接由房型列表計算。
+    """
+    try:
+        pool = await db_manager.get_connection()
+        hotel_filter = "WHERE hotel_id = $1" if hotel_id else ""
+        params = [hotel_id] if hotel_id else []
+        
+        async def fetch(query_fn):
+            async with pool.acquire() as conn:
+                return await query_fn(conn)
+        
+        async def fetch_snapshots(conn):
+            rows = await conn.fetch(COMPLETED_SNAPSHOTS_QUERY, snapshot_limit)
+            # 快照列表已依日期排序，第一筆即為最新快照
+            return rows, rows[0] if rows else None
+        
+        catalog_snapshot, room_performance, latest_weekly, (snapshots, latest_snapshot) = await asyncio.gather(
+            get_catalog(),
+            fetch(lambda conn: _fetch_room_performance(conn, weeks, hotel_id)),
+            fetch(lambda conn: conn.fetch(f"""
+                {latest_weekly_statistics_query()} {hotel_filter}
+                ORDER BY week_start_date DESC
+            """, *params)),
+            fetch(fetch_snapshots),
+        )
+        room_types = catalog_snapshot.list_room_types(hotel_id)
+        
+        today = datetime.now().date()
+        current_monday = today - timedelta(days=today.weekday())
+        summary = _build_dashboard_summary(
+            hotel_id,
+            room_types_count=len(room_types),
+            hotels_count=1 if hotel_id else len(catalog_snapshot.hotels),
+            latest_snapshot=latest_snapshot,
+            weekly_rows=[row for row in room_performance if row['week_start_date'] >= current_monday],
+            current_monday=current_monday,
+        )
+        
+        return {
+            "success": True,
+            "summary": summary,
+            "charts": _build_dashboard_charts(hotel_id, weeks, room_performance),
+            "room_types": room_types,
+            "weekly_statistics": catalog_snapshot.with_room_type_names(latest_weekly),
+            "snapshots": [dict(row) for row in snapshots],
+        }
+    except Exception as e:
+        logger.error(f"獲取Dashboard整合數據失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取Dashboard整合數據失敗: {str(e)}")
+
 async def run_weekly_update():
     today = datetime.now().date()
     start_date = today
     end_date = today + timedelta(days=180)  # 6個月
     
     logger.info(f"Starting weekly update for period: {start_date} to {end_date}")
+    update_start = time.perf_counter()
     
     # 🎯 第一步：創建數據快照（在更新前保存當前狀態）
     try:
@@ -1546,45 +2687,51 @@ async def run_weekly_update():
     except Exception as e:
         logger.error(f"⚠️ 快照創建失敗: {str(e)}, 繼續執行更新...")
     
+    # 刪除過期快照分區（需設定 SNAPSHOT_RETENTION_DAYS）
+    if SNAPSHOT_RETENTION_DAYS:
+        try:
+            pool = await db_manager.get_connection()
+            async with pool.acquire() as conn:
+                deleted = await cleanup_old_snapshots(conn, SNAPSHOT_RETENTION_DAYS)
+            if deleted:
+                logger.info(f"🗑️ 已刪除 {deleted} 個過期快照")
+        except Exception as e:
+            logger.warning(f"⚠️ 清理過期快照失敗: {str(e)}")
+    
     # 第二步：先抽取所有酒店的庫存數據
     await _fetch_all_inventory_internal(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
     
-    pool = await db_manager.get_connection()
-    async with pool.acquire() as conn:
-        # 只取有庫存數據的酒店和房型
-        room_types_with_data = await conn.fetch("""
-            SELECT DISTINCT rt.inv_type_code, rt.hotel_id 
-            FROM room_types rt
-            JOIN inventory_data id ON rt.inv_type_code = id.inv_type_code AND rt.hotel_id = id.hotel_id
-            ORDER BY rt.hotel_id, rt.inv_type_code
-        """)
-        
-        if not room_types_with_data:
-            logger.warning("No room types with inventory data found, skipping weekly statistics calculation")
-            return
-        
-        logger.info(f"Found {len(room_types_with_data)} room types with inventory data for statistics calculation")
-    
+    # 第三步：計算過去12週 + 未來14週，以當前週為中心，一次算完所有房型
     current_monday = today - timedelta(days=today.weekday())
-    success_count = 0
-    error_count = 0
+    pool = await db_manager.get_connection()
+    try:
+        async with pool.acquire() as conn:
+            with STATISTICS_RECOMPUTE_DURATION.time(kind="weekly_batch"):
+                async with conn.transaction():
+                    written = await recompute_weekly_statistics(
+                        conn, current_monday - timedelta(weeks=12), current_monday + timedelta(weeks=13, days=6)
+                    )
+                    await notify(conn, "statistics.updated", kind="weekly",
+                                 start_date=current_monday - timedelta(weeks=12),
+                                 end_date=current_monday + timedelta(weeks=13, days=6))
+            
+            # 同步更新與本次抽取區間重疊的月、季、季節統計
+            with STATISTICS_RECOMPUTE_DURATION.time(kind="period"):
+                async with conn.transaction():
+                    await refresh_period_statistics(conn, current_monday - timedelta(weeks=12), end_date)
+                    await notify(conn, "statistics.updated", kind="period",
+                                 start_date=current_monday - timedelta(weeks=12), end_date=end_date)
+    except Exception as e:
+        logger.error(f"❌ Error calculating weekly statistics: {str(e)}")
+        return
     
-    # 計算過去12週 + 未來14週，以當前週為中心
-    for i in range(-12, 14):  # 過去12週到未來14週
-        week_start = current_monday + timedelta(weeks=i)
-        
-        for room_type in room_types_with_data:
-            inv_type_code = room_type["inv_type_code"]
-            hotel_id = room_type["hotel_id"]
-            try:
-                await calculate_weekly_statistics(inv_type_code, week_start.strftime("%Y-%m-%d"), hotel_id)
-                logger.info(f"✅ Calculated statistics for {inv_type_code} (Hotel {hotel_id}), week {week_start}")
-                success_count += 1
-            except Exception as e:
-                logger.error(f"❌ Error calculating statistics for {inv_type_code} (Hotel {hotel_id}), week {week_start}: {str(e)}")
-                error_count += 1
+    if written == 0:
+        logger.warning("No room types with inventory data found, skipping weekly statistics calculation")
+        return
     
-    logger.info(f"Weekly update completed: {success_count} successful, {error_count} errors")
+    log_event(logger, logging.INFO, "weekly_update.completed",
+              f"Weekly update completed: {written} weekly statistics rows written",
+              rows=written, duration_s=round(time.perf_counter() - update_start, 2))
 
 if __name__ == "__main__":
     import uvicorn
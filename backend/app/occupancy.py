@@ -0,0 +1,259 @@
+"""
+入住率計算引擎
+
+所有端點共用的向量化入住率計算。輸入為欄位陣列（總房數、剩餘房數、狀態、日期、
+露營區、房型），依任意維度組合分組，一次計算：
+
+- 實際入住率: 已訂房數 / 營業日總房數（扣除壓房、公休日）
+- 入住率（含壓房＆公休）: 已訂房數 / 所有日期總房數
+- 對應的空房率 = 100 - 入住率
+"""
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# 分組維度對應的輸出欄位名稱
+GROUP_KEYS = {
+    "day": "date",
+    "week": "week_start_date",
+    "month": "month_start_date",
+    "quarter": "quarter_start_date",
+    "hotel": "hotel_id",
+    "room_type": "inv_type_code",
+}
+
+PERIODS = ("day", "week", "month", "quarter")
+
+
+def to_dates(values: Iterable) -> np.ndarray:
+    return np.asarray(values, dtype="datetime64[D]")
+
+
+def period_start(dates: np.ndarray, period: str) -> np.ndarray:
+    """把日期陣列換成所屬期間的起始日"""
+    dates = to_dates(dates)
+    if period == "day":
+        return dates
+    if period == "week":
+        # 1970-01-01 是星期四，往前推到星期一
+        days = dates.astype(np.int64)
+        return (days - (days + 3) % 7).astype("datetime64[D]")
+    if period == "month":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    if period == "quarter":
+        months = dates.astype("datetime64[M]").astype(np.int64)
+        return (months - months % 3).astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"不支援的期間: {period}")
+
+
+def _rate(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    out = np.zeros(len(numerator), dtype=np.float64)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return np.round(out * 100, 2)
+
+
+def _python_value(value):
+    if isinstance(value, np.datetime64):
+        return value.astype(date)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _group_codes(columns: Sequence[np.ndarray], size: int):
+    """把多個分組欄位合成單一分組代碼，返回 (各欄位唯一值, 分組鍵索引, 每列所屬分組)"""
+    if not columns:
+        return [], [], np.zeros(size, dtype=np.int64), 1 if size else 0
+
+    uniques, codes = [], []
+    for values in columns:
+        unique, inverse = np.unique(values, return_inverse=True)
+        uniques.append(unique)
+        codes.append(inverse.reshape(-1))
+
+    flat = np.ravel_multi_index(codes, [len(u) for u in uniques])
+    group_ids, inverse = np.unique(flat, return_inverse=True)
+    key_index = np.unravel_index(group_ids, [len(u) for u in uniques])
+    return uniques, key_index, inverse.reshape(-1), len(group_ids)
+
+
+class OccupancyFrame:
+    """以欄位陣列表示的庫存資料"""
+
+    def __init__(self, total_rooms, quantity, status, dates=None, hotel_ids=None, inv_type_codes=None):
+        self.total_rooms = np.asarray(total_rooms, dtype=np.int64)
+        self.quantity = np.asarray(quantity, dtype=np.int64)
+        status = np.asarray(status)
+        self.is_open = status if status.dtype == bool else status == "OPEN"
+        self.dates = None if dates is None else to_dates(dates)
+        self.hotel_ids = None if hotel_ids is None else np.asarray(hotel_ids, dtype=object)
+        self.inv_type_codes = None if inv_type_codes is None else np.asarray(inv_type_codes, dtype=object)
+
+    @classmethod
+    def from_records(cls, rows: Sequence, total_rooms: Optional[int] = None) -> "OccupancyFrame":
+        """由資料庫記錄建立；若記錄中沒有 total_rooms，使用固定的總房數"""
+        keys = set(rows[0].keys()) if rows else set()
+
+        def column(name):
+            return [row[name] for row in rows] if name in keys or not rows else None
+
+        return cls(
+            total_rooms=column("total_rooms") if "total_rooms" in keys else [total_rooms or 0] * len(rows),
+            quantity=[row["quantity"] for row in rows],
+            status=[row["status"] for row in rows],
+            dates=column("date"),
+            hotel_ids=column("hotel_id"),
+            inv_type_codes=column("inv_type_code"),
+        )
+
+    def __len__(self) -> int:
+        return len(self.quantity)
+
+    def take(self, mask: np.ndarray) -> "OccupancyFrame":
+        """取出符合條件的列"""
+        def pick(values):
+            return None if values is None else values[mask]
+
+        return OccupancyFrame(
+            self.total_rooms[mask], self.quantity[mask], self.is_open[mask],
+            pick(self.dates), pick(self.hotel_ids), pick(self.inv_type_codes),
+        )
+
+    @property
+    def sold_rooms(self) -> np.ndarray:
+        return self.total_rooms - self.quantity
+
+    def row_occupancy(self) -> np.ndarray:
+        """每列的入住率（已訂房數 / 總房數）"""
+        return _rate(self.sold_rooms, self.total_rooms)
+
+    def _dimension(self, name: str) -> np.ndarray:
+        if name in PERIODS:
+            if self.dates is None:
+                raise ValueError("缺少日期欄位，無法依期間分組")
+            return period_start(self.dates, name)
+        if name == "hotel":
+            values = self.hotel_ids
+        elif name == "room_type":
+            values = self.inv_type_codes
+        else:
+            raise ValueError(f"不支援的分組維度: {name}")
+        if values is None:
+            raise ValueError(f"缺少 {GROUP_KEYS[name]} 欄位")
+        return values
+
+    def group(self, by: Sequence[str] = ()) -> List[dict]:
+        """依指定維度分組計算入住率，結果按分組鍵排序"""
+        uniques, key_index, inverse, n_groups = _group_codes([self._dimension(d) for d in by], len(self))
+        if n_groups == 0:
+            return []
+
+        def total(weights=None):
+            return np.bincount(inverse, weights=weights, minlength=n_groups)
+
+        sold = total(self.sold_rooms)
+        room_days = total(self.total_rooms)
+        open_room_days = total(self.total_rooms * self.is_open)
+        actual = _rate(sold, open_room_days)
+        overall = _rate(sold, room_days)
+
+        metrics = {
+            "days": total().tolist(),
+            "open_days": total(self.is_open).astype(np.int64).tolist(),
+            "total_room_days": room_days.astype(np.int64).tolist(),
+            "open_room_days": open_room_days.astype(np.int64).tolist(),
+            "sold_rooms": sold.astype(np.int64).tolist(),
+            "available_rooms": total(self.quantity).astype(np.int64).tolist(),
+            "actual_occupancy_rate": actual.tolist(),
+            "actual_vacancy_rate": np.round(100 - actual, 2).tolist(),
+            "total_occupancy_rate": overall.tolist(),
+            "total_vacancy_rate": np.round(100 - overall, 2).tolist(),
+        }
+        keys = {
+            GROUP_KEYS[dim]: [_python_value(v) for v in uniques[i][key_index[i]]]
+            for i, dim in enumerate(by)
+        }
+
+        return [
+            {**{k: v[g] for k, v in keys.items()}, **{k: v[g] for k, v in metrics.items()}}
+            for g in range(n_groups)
+        ]
+
+    def totals(self) -> dict:
+        """不分組的整體統計"""
+        groups = self.group()
+        if groups:
+            return groups[0]
+        return {
+            "days": 0, "open_days": 0, "total_room_days": 0, "open_room_days": 0,
+            "sold_rooms": 0, "available_rooms": 0,
+            "actual_occupancy_rate": 0.0, "actual_vacancy_rate": 100.0,
+            "total_occupancy_rate": 0.0, "total_vacancy_rate": 100.0,
+        }
+
+
+def _rates_array(values: Iterable) -> np.ndarray:
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def mean_by(values: Iterable, keys: Dict[str, Iterable]) -> List[dict]:
+    """依分組鍵計算已算好的入住率平均（忽略 NULL，與 SQL AVG 相同）"""
+    rates = _rates_array(values)
+    columns = [np.asarray(list(v), dtype=object) for v in keys.values()]
+    uniques, key_index, inverse, n_groups = _group_codes(columns, len(rates))
+    if n_groups == 0:
+        return []
+
+    valid = ~np.isnan(rates)
+    sums = np.bincount(inverse, weights=np.where(valid, rates, 0), minlength=n_groups)
+    counts = np.bincount(inverse, weights=valid, minlength=n_groups)
+    rows = np.bincount(inverse, minlength=n_groups)
+    means = np.round(np.divide(sums, counts, out=np.zeros(n_groups), where=counts > 0), 2)
+
+    names = list(keys.keys())
+    return [
+        {
+            **{names[i]: _python_value(uniques[i][key_index[i][g]]) for i in range(len(names))},
+            "avg_occupancy": float(means[g]),
+            "count": int(rows[g]),
+        }
+        for g in range(n_groups)
+    ]
+
+
+def summarize_rates(values: Iterable) -> dict:
+    """入住率序列的平均、最高、最低位置（NULL 視為 0）"""
+    rates = np.nan_to_num(_rates_array(values))
+    if len(rates) == 0:
+        return {"average": 0.0, "max_index": None, "min_index": None}
+    return {
+        "average": round(float(rates.mean()), 2),
+        "max_index": int(rates.argmax()),
+        "min_index": int(rates.argmin()),
+    }
+
+
+def pivot_rates(values: Iterable, rows: Dict[str, Iterable], columns: Iterable) -> dict:
+    """
+    把逐筆的入住率轉為矩陣：rows 為列鍵（可多個欄位），columns 為欄鍵（例如週開始日）
+
+    返回 {"rows": [列鍵 dict], "columns": [欄鍵], "values": [[入住率或 None]]}，列與欄皆排序。
+    """
+    rates = _rates_array(values)
+    uniques, key_index, row_codes, n_rows = _group_codes(
+        [np.asarray(list(v), dtype=object) for v in rows.values()], len(rates))
+    col_values, col_codes = np.unique(np.asarray(list(columns)), return_inverse=True)
+
+    matrix = np.full((n_rows, len(col_values)), np.nan)
+    matrix[row_codes, col_codes.reshape(-1)] = rates
+
+    names = list(rows.keys())
+    return {
+        "rows": [
+            {names[i]: _python_value(uniques[i][key_index[i][g]]) for i in range(len(names))}
+            for g in range(n_rows)
+        ],
+        "columns": [_python_value(v) for v in col_values],
+        "values": [[None if np.isnan(v) else float(v) for v in row] for row in matrix],
+    }
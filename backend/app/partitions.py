@@ -0,0 +1,71 @@
+"""
+分區維護
+
+inventory_data 依日期、快照表依快照日期按月分區（見 database/partition_schema.sql）。
+寫入前呼叫 ensure_partitions 建立缺少的月分區；已確認存在的月份會記在記憶體中，
+之後不再查詢資料庫。資料庫尚未執行分區遷移時自動停用。
+"""
+import logging
+from datetime import date
+from typing import Set, Tuple
+
+import asyncpg
+
+from events import notify
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_TABLE = "inventory_data"
+SNAPSHOT_TABLES = ("inventory_snapshots", "weekly_statistics_snapshots")
+
+_known_partitions: Set[Tuple[str, date]] = set()
+_enabled = True
+
+
+def _months(start: date, end: date):
+    current = start.replace(day=1)
+    while current <= end:
+        yield current
+        current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+
+
+async def ensure_partitions(conn, table: str, start: date, end: date) -> int:
+    """確保 [start, end] 期間的月分區存在，返回新建的分區數"""
+    global _enabled
+    if not _enabled:
+        return 0
+
+    missing = [m for m in _months(start, end) if (table, m) not in _known_partitions]
+    if not missing:
+        return 0
+
+    try:
+        created = await conn.fetchval(
+            "SELECT ensure_monthly_partitions($1, $2, $3)", table, missing[0], missing[-1]
+        )
+    except asyncpg.UndefinedFunctionError:
+        logger.warning("⚠️ 資料庫尚未執行 partition_schema.sql，停用分區維護")
+        _enabled = False
+        return 0
+
+    # 交易中建立的分區可能隨交易回滾，只記錄交易外確認過的月份
+    if not conn.is_in_transaction():
+        _known_partitions.update((table, m) for m in missing)
+    if created:
+        logger.info(f"✅ 已建立 {table} 分區 {created} 個 ({missing[0]} ~ {missing[-1]})")
+    return created or 0
+
+
+async def cleanup_old_snapshots(conn, keep_days: int) -> int:
+    """
+    刪除超過保留天數的快照分區與快照記錄，返回刪除的快照數
+
+    以月為單位：整個月都早於保留期限且快照全部完成的月份才刪除（見 partition_schema.sql）。
+    """
+    async with conn.transaction():
+        deleted = await conn.fetchval("SELECT cleanup_old_snapshots($1)", keep_days)
+        if deleted:
+            await notify(conn, "snapshot.deleted", deleted=deleted, keep_days=keep_days)
+    # 被刪除的分區不再存在，清掉記憶體中的記錄讓之後需要時重新建立
+    _known_partitions.difference_update({key for key in _known_partitions if key[0] in SNAPSHOT_TABLES})
+    return deleted or 0
@@ -0,0 +1,160 @@
+"""
+月、季與自訂季節的期間統計
+
+與 calculate_weekly_statistics 使用相同的輸入（inventory_data + room_types.total_rooms），
+只重算與異動日期區間重疊的期間，結果存於 period_statistics 表。
+"""
+from datetime import date, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+from occupancy import GROUP_KEYS, OccupancyFrame
+
+PERIOD_TYPES = ("month", "quarter", "season")
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def month_end(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def quarter_start(d: date) -> date:
+    return date(d.year, d.month - (d.month - 1) % 3, 1)
+
+
+def quarter_end(d: date) -> date:
+    return month_end(date(d.year, quarter_start(d).month + 2, 1))
+
+
+def period_key(period_type: str, start: date, season_code: Optional[str] = None) -> str:
+    if period_type == "month":
+        return start.strftime("%Y-%m")
+    if period_type == "quarter":
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    return season_code
+
+
+def _stat_row(period_type: str, key: str, start: date, end: date, group: dict) -> dict:
+    return {
+        "period_type": period_type,
+        "period_key": key,
+        "period_start": start,
+        "period_end": end,
+        "hotel_id": group["hotel_id"],
+        "inv_type_code": group["inv_type_code"],
+        "actual_occupancy_rate": group["actual_occupancy_rate"],
+        "actual_vacancy_rate": group["actual_vacancy_rate"],
+        "total_occupancy_rate": group["total_occupancy_rate"],
+        "total_vacancy_rate": group["total_vacancy_rate"],
+        "total_rooms": group["total_room_days"] // group["days"] if group["days"] else 0,
+        "total_available_days": group["open_days"],
+        "total_days": group["days"],
+        "sold_rooms": group["sold_rooms"],
+    }
+
+
+async def upsert_period_statistics(conn, stats: List[dict]) -> int:
+    """批次寫入期間統計"""
+    if not stats:
+        return 0
+
+    columns = ["period_type", "period_key", "period_start", "period_end", "hotel_id", "inv_type_code",
+               "actual_occupancy_rate", "actual_vacancy_rate", "total_occupancy_rate", "total_vacancy_rate",
+               "total_rooms", "total_available_days", "total_days", "sold_rooms"]
+    types = ["varchar", "varchar", "date", "date", "varchar", "varchar",
+             "numeric", "numeric", "numeric", "numeric", "int", "int", "int", "int"]
+
+    await conn.execute(f"""
+        INSERT INTO period_statistics ({", ".join(columns)})
+        SELECT * FROM unnest({", ".join(f"${i + 1}::{t}[]" for i, t in enumerate(types))})
+        ON CONFLICT (period_type, period_key, hotel_id, inv_type_code, period_start)
+        DO UPDATE SET
+            period_end = EXCLUDED.period_end,
+            actual_occupancy_rate = EXCLUDED.actual_occupancy_rate,
+            actual_vacancy_rate = EXCLUDED.actual_vacancy_rate,
+            total_occupancy_rate = EXCLUDED.total_occupancy_rate,
+            total_vacancy_rate = EXCLUDED.total_vacancy_rate,
+            total_rooms = EXCLUDED.total_rooms,
+            total_available_days = EXCLUDED.total_available_days,
+            total_days = EXCLUDED.total_days,
+            sold_rooms = EXCLUDED.sold_rooms,
+            updated_at = CURRENT_TIMESTAMP
+    """, *[[row[c] for row in stats] for c in columns])
+
+    return len(stats)
+
+
+async def refresh_period_statistics(conn, start_date: date, end_date: date,
+                                    hotel_id: Optional[str] = None) -> int:
+    """重算與 [start_date, end_date] 重疊的所有月、季與季節統計，返回寫入筆數"""
+    seasons = await conn.fetch("""
+        SELECT code, start_date, end_date FROM seasons
+        WHERE start_date <= $2 AND end_date >= $1
+    """, start_date, end_date)
+
+    # 讀取範圍擴大到完整期間，重疊的期間都能整段重算
+    range_start = min([quarter_start(start_date)] + [s["start_date"] for s in seasons])
+    range_end = max([quarter_end(end_date)] + [s["end_date"] for s in seasons])
+
+    rows = await conn.fetch(f"""
+        SELECT i.inv_type_code, i.hotel_id, i.date, i.quantity, i.status, rt.total_rooms
+        FROM inventory_data i
+        JOIN room_types rt ON i.inv_type_code = rt.inv_type_code AND i.hotel_id = rt.hotel_id
+        WHERE i.date BETWEEN $1 AND $2
+        {"AND i.hotel_id = $3" if hotel_id else ""}
+    """, range_start, range_end, *([hotel_id] if hotel_id else []))
+
+    frame = OccupancyFrame.from_records(rows)
+    stats = []
+
+    for period_type, end_of in (("month", month_end), ("quarter", quarter_end)):
+        for group in frame.group(["hotel", "room_type", period_type]):
+            start = group[GROUP_KEYS[period_type]]
+            # 只寫入與異動區間重疊的期間
+            if end_of(start) < start_date or start > end_date:
+                continue
+            stats.append(_stat_row(period_type, period_key(period_type, start), start, end_of(start), group))
+
+    for season in seasons:
+        mask = (frame.dates >= np.datetime64(season["start_date"])) & (frame.dates <= np.datetime64(season["end_date"]))
+        for group in frame.take(mask).group(["hotel", "room_type"]):
+            stats.append(_stat_row("season", season["code"], season["start_date"], season["end_date"], group))
+
+    return await upsert_period_statistics(conn, stats)
+
+
+async def refresh_season(conn, code: str, start_date: date, end_date: date) -> int:
+    """重算單一季節（季節新增或修改後使用）"""
+    rows = await conn.fetch("""
+        SELECT i.inv_type_code, i.hotel_id, i.date, i.quantity, i.status, rt.total_rooms
+        FROM inventory_data i
+        JOIN room_types rt ON i.inv_type_code = rt.inv_type_code AND i.hotel_id = rt.hotel_id
+        WHERE i.date BETWEEN $1 AND $2
+    """, start_date, end_date)
+
+    frame = OccupancyFrame.from_records(rows)
+    stats = [
+        _stat_row("season", code, start_date, end_date, group)
+        for group in frame.group(["hotel", "room_type"])
+    ]
+    return await upsert_period_statistics(conn, stats)
+
+
+def compare_periods(rows: List[dict]) -> List[dict]:
+    """依時間排序的同一期間序列，加上與前一期的入住率差異"""
+    previous = {}
+    result = []
+    for row in rows:
+        key = (row["hotel_id"], row["inv_type_code"])
+        prev = previous.get(key)
+        diff = None
+        if prev is not None and row["actual_occupancy_rate"] is not None and prev["actual_occupancy_rate"] is not None:
+            diff = round(float(row["actual_occupancy_rate"]) - float(prev["actual_occupancy_rate"]), 2)
+        result.append({**row, "occupancy_change": diff})
+        previous[key] = row
+    return result
+
@@ -0,0 +1,78 @@
+"""
+PMS 庫存 API 用戶端
+
+API 端點的逐房型抽取與 backfill 共用。回應以串流方式讀取（見 pms_stream.py），
+每批 availability 項目讀到就交給呼叫端寫入。
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+
+import aiohttp
+
+from log_config import log_event, truncate
+from metrics import PMS_REQUEST_DURATION, PMS_REQUEST_ERRORS
+from pms_stream import iter_availability_batches
+
+logger = logging.getLogger(__name__)
+
+# PMS 串流讀取設定：每批寫入的筆數與每次讀取的位元組數
+PMS_STREAM_BATCH_SIZE = int(os.getenv("PMS_STREAM_BATCH_SIZE", "100"))
+PMS_STREAM_CHUNK_SIZE = 16 * 1024
+
+
+class PMSAPIError(Exception):
+    """PMS API 請求失敗或回應內容不完整"""
+
+
+class HotelAPI:
+    def __init__(self):
+        self.base_url = "https://pms.shalom.com.tw/api/cm/channel/inventory/"
+        self.echo_token = os.getenv("API_ECHO_TOKEN", "GD837Fjk3")
+        self.password = os.getenv("API_PASSWORD", "mz9k8czQHqnFt8Q")
+        self.username = os.getenv("API_USERNAME", "woorao")
+    
+    async def stream_inventory_data(self, inv_type_code: str, start_date: str, end_date: str, hotel_id: str,
+                                    batch_size: int = PMS_STREAM_BATCH_SIZE):
+        """串流讀取 PMS 庫存回應，逐批產出 availability 項目"""
+        params = {
+            "echo_token": self.echo_token,
+            "end_date": end_date,
+            "hotel_code": hotel_id,  # 使用動態的 hotel_id
+            "inv_type_code": inv_type_code,
+            "password": self.password,
+            "start_date": start_date,
+            "timestamp": datetime.now().strftime("%Y-%m-%d+%H%%3A%M%%3A%S"),
+            "username": self.username
+        }
+        
+        log_event(logger, logging.DEBUG, "pms.request", hotel_id=hotel_id, inv_type_code=inv_type_code,
+                  start_date=start_date, end_date=end_date)
+        
+        async with aiohttp.ClientSession() as session:
+            request_start = time.perf_counter()
+            try:
+                async with session.get(self.base_url, params=params) as response:
+                    PMS_REQUEST_DURATION.observe(time.perf_counter() - request_start, hotel_id=hotel_id)
+                    
+                    if response.status != 200:
+                        response_text = await response.text()
+                        log_event(logger, logging.ERROR, "pms.request_failed",
+                                  f"API request failed with status {response.status}",
+                                  hotel_id=hotel_id, inv_type_code=inv_type_code,
+                                  status=response.status, response=truncate(response_text))
+                        raise PMSAPIError(f"API request failed with status {response.status}")
+                    
+                    async for batch in iter_availability_batches(
+                        response.content.iter_chunked(PMS_STREAM_CHUNK_SIZE), batch_size
+                    ):
+                        yield batch
+            except PMSAPIError:
+                PMS_REQUEST_ERRORS.inc(hotel_id=hotel_id)
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.error(f"API request error: {str(e)}")
+                PMS_REQUEST_ERRORS.inc(hotel_id=hotel_id)
+                raise PMSAPIError(str(e)) from e
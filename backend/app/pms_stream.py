@@ -0,0 +1,104 @@
+"""
+PMS 庫存回應的串流解析
+
+PMS 回傳格式為 {"data": [{"availability": [{"date", "quantity", "status"}, ...]}]}，
+這裡只在收到的位元組流中尋找第一個 availability 陣列，逐筆解析其中的物件，
+不需要把整份回應載入記憶體。
+"""
+import codecs
+import json
+import re
+from typing import AsyncIterator, List
+
+_KEY_SUFFIX = re.compile(r'\s*:\s*\[')
+_SEPARATORS = " \t\r\n,"
+
+
+class AvailabilityParser:
+    """增量解析器：每次 feed 一段位元組，回傳這段資料中已完整的 availability 項目"""
+
+    def __init__(self, key: str = "availability"):
+        self._key = f'"{key}"'
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._state = "seek"  # seek -> array -> done
+
+    @property
+    def found(self) -> bool:
+        """是否已找到 availability 陣列"""
+        return self._state != "seek"
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        if self._state == "done":
+            return []
+
+        self._buf += self._decoder.decode(chunk)
+        items = []
+
+        if self._state == "seek" and not self._seek_array():
+            return items
+
+        pos = 0
+        buf = self._buf
+        while True:
+            while pos < len(buf) and buf[pos] in _SEPARATORS:
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                self._state = "done"
+                pos += 1
+                break
+            try:
+                item, pos = self._json.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # 物件尚未完整，等待下一段資料
+                break
+            items.append(item)
+
+        self._buf = buf[pos:] if self._state != "done" else ""
+        return items
+
+    def close(self) -> None:
+        """串流結束時檢查陣列是否完整"""
+        if self._state == "array":
+            raise ValueError("PMS 回應在 availability 陣列中途中斷")
+
+    def _seek_array(self) -> bool:
+        idx = self._buf.find(self._key)
+        while idx >= 0:
+            rest_start = idx + len(self._key)
+            match = _KEY_SUFFIX.match(self._buf, rest_start)
+            if match:
+                self._buf = self._buf[match.end():]
+                self._state = "array"
+                return True
+            if self._buf[rest_start:].strip(" \t\r\n:") == "":
+                # key 後面的 ":[" 還沒收到
+                self._buf = self._buf[idx:]
+                return False
+            idx = self._buf.find(self._key, idx + 1)
+
+        # 保留尾端，避免 key 被切在兩段資料之間
+        self._buf = self._buf[-len(self._key):]
+        return False
+
+
+async def iter_availability_batches(
+    chunks: AsyncIterator[bytes], batch_size: int = 100
+) -> AsyncIterator[List[dict]]:
+    """把位元組串流轉成固定大小的 availability 批次"""
+    parser = AvailabilityParser()
+    batch: List[dict] = []
+
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+    parser.close()
+    if batch:
+        yield batch
@@ -0,0 +1,152 @@
+"""
+每個請求的 SQL 效能分析
+
+QUERY_PROFILING=true 時，中介層會為每個請求建立 QueryProfile，
+db_manager.get_connection() 回傳的連接池會被包一層，記錄每個 SQL 的耗時與筆數。
+未啟用時直接回傳原本的連接池，不產生額外開銷。
+"""
+import os
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import List, Optional
+
+QUERY_PROFILING_ENABLED = os.getenv("QUERY_PROFILING", "false").lower() in ("1", "true", "yes")
+QUERY_PROFILING_SLOW_MS = float(os.getenv("QUERY_PROFILING_SLOW_MS", "500"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+current_profile: ContextVar[Optional["QueryProfile"]] = ContextVar("current_profile", default=None)
+
+# 最近的慢請求摘要，供 /debug-queries 查看
+slow_requests = deque(maxlen=50)
+
+
+def _normalize_sql(query: str) -> str:
+    return _WHITESPACE.sub(" ", query).strip()[:300]
+
+
+def _status_row_count(status: str) -> int:
+    """從 'INSERT 0 5'、'UPDATE 3' 之類的狀態字串取出筆數"""
+    parts = status.split() if status else []
+    if parts and parts[-1].isdigit():
+        return int(parts[-1])
+    return 0
+
+
+class QueryProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.statements: List[dict] = []
+        self.started = time.perf_counter()
+
+    def record(self, query: str, duration: float, rows: int) -> None:
+        self.statements.append({
+            "sql": _normalize_sql(query),
+            "duration_ms": round(duration * 1000, 3),
+            "rows": rows,
+        })
+
+    @property
+    def db_ms(self) -> float:
+        return sum(s["duration_ms"] for s in self.statements)
+
+    def server_timing(self, total_ms: float) -> str:
+        return (f'db;dur={self.db_ms:.2f};desc="{len(self.statements)} queries", '
+                f'app;dur={max(total_ms - self.db_ms, 0):.2f}, total;dur={total_ms:.2f}')
+
+    def summary(self, total_ms: float, top: int = 10) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "total_ms": round(total_ms, 2),
+            "db_ms": round(self.db_ms, 2),
+            "query_count": len(self.statements),
+            "slowest_queries": sorted(self.statements, key=lambda s: s["duration_ms"], reverse=True)[:top],
+        }
+
+
+class ProfilingConnection:
+    """包裝 asyncpg 連接，記錄每個語句的耗時與筆數"""
+
+    def __init__(self, conn, profile: QueryProfile):
+        self._conn = conn
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    async def _timed(self, method, query, args, kwargs, count_rows):
+        start = time.perf_counter()
+        result = await method(query, *args, **kwargs)
+        self._profile.record(query, time.perf_counter() - start, count_rows(result))
+        return result
+
+    async def fetch(self, query, *args, **kwargs):
+        return await self._timed(self._conn.fetch, query, args, kwargs, len)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        return await self._timed(self._conn.fetchrow, query, args, kwargs, lambda r: 0 if r is None else 1)
+
+    async def fetchval(self, query, *args, **kwargs):
+        return await self._timed(self._conn.fetchval, query, args, kwargs, lambda r: 0 if r is None else 1)
+
+    async def execute(self, query, *args, **kwargs):
+        return await self._timed(self._conn.execute, query, args, kwargs, _status_row_count)
+
+    async def executemany(self, query, args, **kwargs):
+        start = time.perf_counter()
+        result = await self._conn.executemany(query, args, **kwargs)
+        self._profile.record(query, time.perf_counter() - start, len(args))
+        return result
+
+
+class _ProfilingAcquire:
+    def __init__(self, pool, profile: QueryProfile, kwargs):
+        self._pool = pool
+        self._profile = profile
+        self._kwargs = kwargs
+        self._conn = None
+
+    async def __aenter__(self):
+        self._conn = await self._pool.acquire(**self._kwargs)
+        return ProfilingConnection(self._conn, self._profile)
+
+    async def __aexit__(self, *exc):
+        await self._pool.release(self._conn)
+
+    def __await__(self):
+        async def _acquire():
+            return ProfilingConnection(await self._pool.acquire(**self._kwargs), self._profile)
+        return _acquire().__await__()
+
+
+class ProfilingPool:
+    """包裝 asyncpg 連接池，取得的連接都會被記錄"""
+
+    def __init__(self, pool, profile: QueryProfile):
+        self._pool = pool
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def acquire(self, **kwargs):
+        return _ProfilingAcquire(self._pool, self._profile, kwargs)
+
+    async def release(self, conn, **kwargs):
+        if isinstance(conn, ProfilingConnection):
+            conn = conn._conn
+        await self._pool.release(conn, **kwargs)
+
+
+def profiled(pool):
+    """若目前請求有啟用效能分析，回傳包裝過的連接池"""
+    profile = current_profile.get()
+    if profile is None or pool is None:
+        return pool
+    return ProfilingPool(pool, profile)
@@ -0,0 +1,250 @@
+"""
+房型同步
+
+以房間資訊表（房間資訊.xlsx 或同欄位的 CSV）為準，與 room_types 在記憶體中比對後，
+新增、更新、刪除各以一個批次語句完成。重複執行結果相同，新營區上線只需同步一次。
+
+API 端點（/room-types/sync）與 scripts/sync_room_types.py、scripts/update_database_final.py 共用此模組。
+"""
+import csv
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from events import notify
+
+logger = logging.getLogger(__name__)
+
+RoomTypeKey = Tuple[str, str]  # (hotel_id, inv_type_code)
+
+# 房間資訊.xlsx 的欄位名稱（舊版 Excel 匯出會截斷為 10 個字元）
+COLUMN_ALIASES = {
+    "inv_type_code": ("inv_type_code", "inv_type_c"),
+    "name": ("name",),
+    "total_rooms": ("total_rooms", "total_room"),
+    "hotel_id": ("hotel_id",),
+}
+
+
+@dataclass(frozen=True)
+class RoomTypeSpec:
+    hotel_id: str
+    inv_type_code: str
+    name: str
+    total_rooms: int
+
+    @property
+    def key(self) -> RoomTypeKey:
+        return (self.hotel_id, self.inv_type_code)
+
+
+@dataclass
+class RoomTypeSyncPlan:
+    inserts: List[RoomTypeSpec] = field(default_factory=list)
+    updates: List[RoomTypeSpec] = field(default_factory=list)
+    deletes: List[RoomTypeKey] = field(default_factory=list)
+    # deletes 中仍有庫存或週統計的房型（find_room_types_in_use 的結果），有任何一筆時不可套用
+    blocked: List[dict] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserts or self.updates or self.deletes)
+
+    def summary(self) -> dict:
+        return {
+            "inserted": len(self.inserts),
+            "updated": len(self.updates),
+            "deleted": len(self.deletes),
+            "blocked": len(self.blocked),
+            "unchanged": self.unchanged,
+        }
+
+
+def _cell_text(value) -> str:
+    # Excel 的數字欄位（例如 hotel_id 2436）會讀成 2436.0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "" if value is None else str(value).strip()
+
+
+def normalize_room_types(rows: Iterable[dict]) -> List[RoomTypeSpec]:
+    """把欄位名稱與型別統一成 RoomTypeSpec，同一酒店的房型代碼不可重複"""
+    specs: Dict[RoomTypeKey, RoomTypeSpec] = {}
+    for line, row in enumerate(rows, start=1):
+        values = {}
+        for column, aliases in COLUMN_ALIASES.items():
+            value = next((row[a] for a in aliases if a in row), None)
+            values[column] = _cell_text(value)
+        if not all(values.values()):
+            # Excel 尾端常有空白列
+            if not any(values.values()):
+                continue
+            missing = [k for k, v in values.items() if not v]
+            raise ValueError(f"第 {line} 筆房型缺少欄位: {', '.join(missing)}")
+        try:
+            total_rooms = int(float(values["total_rooms"]))
+        except ValueError:
+            raise ValueError(f"第 {line} 筆房型的房間數不是數字: {values['total_rooms']}")
+        if total_rooms < 0:
+            raise ValueError(f"第 {line} 筆房型的房間數不可為負數")
+
+        spec = RoomTypeSpec(values["hotel_id"], values["inv_type_code"], values["name"], total_rooms)
+        if spec.key in specs:
+            raise ValueError(f"房型重複: Hotel {spec.hotel_id} {spec.inv_type_code}")
+        specs[spec.key] = spec
+    return list(specs.values())
+
+
+def read_room_types_file(path: str) -> List[RoomTypeSpec]:
+    """讀取房間資訊檔案（.xlsx 需安裝 openpyxl，或使用 .csv）"""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return normalize_room_types(csv.DictReader(f))
+
+    if path.lower().endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError("讀取 .xlsx 需要安裝 openpyxl")
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_cell_text(h) for h in next(rows, ())]
+            return normalize_room_types(dict(zip(header, row)) for row in rows)
+        finally:
+            workbook.close()
+
+    raise ValueError(f"不支援的檔案格式: {path}（僅支援 .xlsx 與 .csv）")
+
+
+def plan_room_type_sync(existing: Iterable, desired: List[RoomTypeSpec],
+                        delete_missing: bool = False) -> RoomTypeSyncPlan:
+    """
+    比對資料庫現有房型與目標房型
+
+    只比對 desired 出現過的酒店；delete_missing 時，這些酒店中不在 desired 的房型會被刪除。
+    """
+    current = {(row["hotel_id"], row["inv_type_code"]): row for row in existing}
+    plan = RoomTypeSyncPlan()
+
+    for spec in desired:
+        row = current.get(spec.key)
+        if row is None:
+            plan.inserts.append(spec)
+        elif row["name"] != spec.name or row["total_rooms"] != spec.total_rooms:
+            plan.updates.append(spec)
+        else:
+            plan.unchanged += 1
+
+    if delete_missing:
+        hotels = {spec.hotel_id for spec in desired}
+        wanted = {spec.key for spec in desired}
+        plan.deletes = sorted(key for key in current if key[0] in hotels and key not in wanted)
+    return plan
+
+
+def _columns(specs: List[RoomTypeSpec]):
+    return ([s.inv_type_code for s in specs], [s.name for s in specs],
+            [s.total_rooms for s in specs], [s.hotel_id for s in specs])
+
+
+async def find_room_types_in_use(conn, keys: List[RoomTypeKey]) -> list:
+    """
+    一次查出仍有庫存或週統計數據的房型
+
+    返回 hotel_id、inv_type_code、inventory_count、statistics_count，沒有相依數據的房型不會出現。
+    """
+    return await conn.fetch("""
+        WITH targets AS (
+            SELECT * FROM unnest($1::varchar[], $2::varchar[]) AS t(hotel_id, inv_type_code)
+        ),
+        inventory AS (
+            SELECT hotel_id, inv_type_code, COUNT(*) AS inventory_count
+            FROM inventory_data
+            WHERE (hotel_id, inv_type_code) IN (SELECT hotel_id, inv_type_code FROM targets)
+            GROUP BY hotel_id, inv_type_code
+        ),
+        statistics AS (
+            SELECT hotel_id, inv_type_code, COUNT(*) AS statistics_count
+            FROM weekly_statistics
+            WHERE (hotel_id, inv_type_code) IN (SELECT hotel_id, inv_type_code FROM targets)
+            GROUP BY hotel_id, inv_type_code
+        )
+        SELECT t.hotel_id, t.inv_type_code,
+               COALESCE(i.inventory_count, 0) AS inventory_count,
+               COALESCE(s.statistics_count, 0) AS statistics_count
+        FROM targets t
+        LEFT JOIN inventory i USING (hotel_id, inv_type_code)
+        LEFT JOIN statistics s USING (hotel_id, inv_type_code)
+        WHERE i.inventory_count IS NOT NULL OR s.statistics_count IS NOT NULL
+        ORDER BY t.hotel_id, t.inv_type_code
+    """, [key[0] for key in keys], [key[1] for key in keys])
+
+
+def blocked_message(plan: RoomTypeSyncPlan) -> str:
+    names = ", ".join(f"{r['hotel_id']}-{r['inv_type_code']}" for r in plan.blocked)
+    return f"無法刪除仍有庫存或統計數據的房型: {names}"
+
+
+async def apply_room_type_sync(conn, plan: RoomTypeSyncPlan) -> None:
+    """套用比對結果（plan.blocked 需由呼叫端先確認為空）"""
+    if plan.inserts:
+        await conn.execute("""
+            INSERT INTO room_types (inv_type_code, name, total_rooms, hotel_id)
+            SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::int[], $4::varchar[])
+        """, *_columns(plan.inserts))
+
+    if plan.updates:
+        await conn.execute("""
+            UPDATE room_types rt
+            SET name = u.name, total_rooms = u.total_rooms, updated_at = CURRENT_TIMESTAMP
+            FROM unnest($1::varchar[], $2::varchar[], $3::int[], $4::varchar[])
+                 AS u(inv_type_code, name, total_rooms, hotel_id)
+            WHERE rt.inv_type_code = u.inv_type_code AND rt.hotel_id = u.hotel_id
+        """, *_columns(plan.updates))
+
+    if plan.deletes:
+        hotel_ids = [key[0] for key in plan.deletes]
+        codes = [key[1] for key in plan.deletes]
+        await conn.execute("""
+            DELETE FROM room_types rt
+            USING unnest($1::varchar[], $2::varchar[]) AS d(hotel_id, inv_type_code)
+            WHERE rt.hotel_id = d.hotel_id AND rt.inv_type_code = d.inv_type_code
+        """, hotel_ids, codes)
+
+
+async def sync_room_types(conn, desired: List[RoomTypeSpec], delete_missing: bool = False,
+                          dry_run: bool = False) -> RoomTypeSyncPlan:
+    """
+    在單一交易中比對並套用房型變更；dry_run 只返回比對結果
+
+    要刪除的房型仍有庫存或週統計時記在 plan.blocked：dry_run 照常返回，實際同步則拋出 ValueError。
+    """
+    hotel_ids = sorted({spec.hotel_id for spec in desired})
+    async with conn.transaction():
+        # 鎖住相關酒店的房型，避免同時同步時互相覆蓋
+        existing = await conn.fetch("""
+            SELECT hotel_id, inv_type_code, name, total_rooms
+            FROM room_types WHERE hotel_id = ANY($1::varchar[])
+            FOR UPDATE
+        """, hotel_ids)
+        plan = plan_room_type_sync(existing, desired, delete_missing)
+        if plan.deletes:
+            # 與單筆刪除相同：仍有庫存或週統計的房型不可刪除
+            plan.blocked = [dict(row) for row in await find_room_types_in_use(conn, plan.deletes)]
+
+        if dry_run or not plan.changed:
+            return plan
+        if plan.blocked:
+            raise ValueError(blocked_message(plan))
+
+        await apply_room_type_sync(conn, plan)
+        for hotel_id in hotel_ids:
+            await notify(conn, "room_types.updated", hotel_id=hotel_id)
+
+    logger.info(
+        f"✅ 房型同步完成: 新增 {len(plan.inserts)}, 更新 {len(plan.updates)}, "
+        f"刪除 {len(plan.deletes)}, 未變更 {plan.unchanged}"
+    )
+    return plan
@@ -0,0 +1,221 @@
+"""
+快照建立
+
+以前在單一交易中複製 inventory_data 與 weekly_statistics，資料量大時交易很長；
+先查詢再新增 data_snapshots 的做法在同時手動建立快照時也可能重複建立。現在分成兩步：
+
+1. claim_snapshot: INSERT ... ON CONFLICT (snapshot_date) DO NOTHING 建立當天的快照列
+   （status = 'processing'）；已存在時返回既有的快照，同時呼叫的人都加入同一個快照
+2. build_snapshot: 依日期分段複製（每段 SNAPSHOT_CHUNK_DAYS 天），每段是一個短交易，
+   完成後把筆數寫回 data_snapshots，最後改為 'completed'
+
+讀取連線開啟 REPEATABLE READ 唯讀交易並以 pg_export_snapshot() 匯出快照，每段複製的交易
+SET TRANSACTION SNAPSHOT 匯入同一個快照，所有分段看到的是同一時間點的資料。
+讀取連線本身不查詢任何表，不持有表鎖，抽取庫存可以照常寫入。
+
+同一快照由 advisory lock 保證只有一個行程複製；複製中的行程中斷（鎖隨連線釋放）或
+失敗（status = 'failed'）時，下一個呼叫者接手，先刪除先前寫入的部分資料再重新複製。
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+import asyncpg
+
+from booking_pace import record_snapshot_pace
+from events import notify
+from metrics import SNAPSHOT_DURATION, SNAPSHOT_ROWS
+from partitions import SNAPSHOT_TABLES, ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+# 每段複製的天數（週統計每段涵蓋同樣多週，每個房型的筆數相同）
+SNAPSHOT_CHUNK_DAYS = int(os.getenv("SNAPSHOT_CHUNK_DAYS", "31"))
+
+# pg_advisory_lock(SNAPSHOT_LOCK_CLASS, snapshot_id)
+SNAPSHOT_LOCK_CLASS = 7301
+
+INVENTORY_COPY = """
+    INSERT INTO inventory_snapshots
+    (snapshot_id, snapshot_date, inv_type_code, hotel_id, date, quantity, status)
+    SELECT $1, $2, inv_type_code, hotel_id, date, quantity, status
+    FROM inventory_data
+    WHERE date >= $3 AND date < $4
+    RETURNING inventory_snapshots.*
+"""
+
+WEEKLY_STATISTICS_COPY = """
+    INSERT INTO weekly_statistics_snapshots
+    (snapshot_id, snapshot_date, inv_type_code, hotel_id, week_start_date, week_end_date,
+     actual_occupancy_rate, actual_vacancy_rate, total_occupancy_rate,
+     total_vacancy_rate, total_rooms, total_available_days, total_days)
+    SELECT $1, $2, inv_type_code, hotel_id, week_start_date, week_end_date,
+           actual_occupancy_rate, actual_vacancy_rate, total_occupancy_rate,
+           total_vacancy_rate, total_rooms, total_available_days, total_days
+    FROM weekly_statistics
+    WHERE week_start_date >= $3 AND week_start_date < $4
+    RETURNING weekly_statistics_snapshots.*
+"""
+
+
+@dataclass
+class SnapshotCopy:
+    table: str
+    copy_query: str
+    date_column: str
+    source_table: str
+    chunk_days: int
+    progress_column: str
+    records: int = 0
+    size_bytes: int = 0
+
+
+def _copies():
+    return [
+        SnapshotCopy("inventory_snapshots", INVENTORY_COPY, "date", "inventory_data",
+                     SNAPSHOT_CHUNK_DAYS, "inventory_records"),
+        SnapshotCopy("weekly_statistics_snapshots", WEEKLY_STATISTICS_COPY, "week_start_date",
+                     "weekly_statistics", SNAPSHOT_CHUNK_DAYS * 7, "weekly_statistics_records"),
+    ]
+
+
+async def claim_snapshot(conn, snapshot_date: date, description: Optional[str] = None) -> Tuple[int, str]:
+    """建立（或加入）指定日期的快照，返回 (快照ID, 狀態)"""
+    row = await conn.fetchrow("""
+        INSERT INTO data_snapshots (snapshot_date, description, status)
+        VALUES ($1, $2, 'processing')
+        ON CONFLICT (snapshot_date) DO NOTHING
+        RETURNING id, status
+    """, snapshot_date, description or f"自動快照 - {snapshot_date}")
+    if row is None:
+        row = await conn.fetchrow("SELECT id, status FROM data_snapshots WHERE snapshot_date = $1",
+                                  snapshot_date)
+    return row["id"], row["status"]
+
+
+async def _use_snapshot(conn, exported: str) -> None:
+    # 必須是 REPEATABLE READ 交易中的第一個語句
+    await conn.execute(f"SET TRANSACTION SNAPSHOT '{exported}'")
+
+
+async def _copy_chunks(writer, exported: str, snapshot_id: int, snapshot_date: date, copy: SnapshotCopy) -> None:
+    async with writer.transaction(isolation="repeatable_read", readonly=True):
+        await _use_snapshot(writer, exported)
+        bounds = await writer.fetchrow(f"SELECT MIN({copy.date_column}) AS first, "
+                                       f"MAX({copy.date_column}) AS last FROM {copy.source_table}")
+    if bounds["first"] is None:
+        return
+
+    chunk_start = bounds["first"]
+    while chunk_start <= bounds["last"]:
+        chunk_end = chunk_start + timedelta(days=copy.chunk_days)
+        async with writer.transaction(isolation="repeatable_read"):
+            await _use_snapshot(writer, exported)
+            chunk = await writer.fetchrow(f"""
+                WITH inserted AS ({copy.copy_query})
+                SELECT COUNT(*) AS records, COALESCE(SUM(pg_column_size(inserted.*)), 0) AS size_bytes
+                FROM inserted
+            """, snapshot_id, snapshot_date, chunk_start, chunk_end)
+
+        copy.records += chunk["records"]
+        copy.size_bytes += chunk["size_bytes"]
+        # 進度在匯入的快照之外更新（data_snapshots 在匯出後已被修改，在快照交易中更新會衝突）
+        await writer.execute(f"UPDATE data_snapshots SET {copy.progress_column} = $2 WHERE id = $1",
+                             snapshot_id, copy.records)
+        chunk_start = chunk_end
+
+
+async def _copy_snapshot(pool, reader, snapshot_id: int, snapshot_date: date) -> None:
+    started = time.perf_counter()
+    copies = _copies()
+
+    async with pool.acquire() as writer:
+        for table in SNAPSHOT_TABLES:
+            await ensure_partitions(writer, table, snapshot_date, snapshot_date)
+
+        # 先前中斷或失敗留下的部分資料
+        async with writer.transaction():
+            for copy in copies:
+                await writer.execute(f"DELETE FROM {copy.table} WHERE snapshot_id = $1 AND snapshot_date = $2",
+                                     snapshot_id, snapshot_date)
+            await writer.execute("""
+                UPDATE data_snapshots
+                SET status = 'processing', snapshot_time = CURRENT_TIMESTAMP,
+                    total_records = 0, inventory_records = 0, weekly_statistics_records = 0
+                WHERE id = $1
+            """, snapshot_id)
+
+        async with reader.transaction(isolation="repeatable_read", readonly=True):
+            exported = await reader.fetchval("SELECT pg_export_snapshot()")
+            for copy in copies:
+                await _copy_chunks(writer, exported, snapshot_id, snapshot_date, copy)
+
+        inventory, stats = copies
+        async with writer.transaction():
+            summary = await writer.fetchrow("""
+                SELECT COUNT(DISTINCT (inv_type_code, hotel_id)) AS room_types_count,
+                       COUNT(DISTINCT hotel_id) AS hotels_count,
+                       MIN(week_start_date) AS earliest_week,
+                       MAX(week_start_date) AS latest_week
+                FROM weekly_statistics_snapshots
+                WHERE snapshot_id = $1 AND snapshot_date = $2
+            """, snapshot_id, snapshot_date)
+
+            total_records = inventory.records + stats.records
+            await writer.execute("""
+                UPDATE data_snapshots
+                SET status = 'completed', total_records = $2,
+                    inventory_records = $3, weekly_statistics_records = $4,
+                    room_types_count = $5, hotels_count = $6,
+                    earliest_week = $7, latest_week = $8, size_bytes = $9
+                WHERE id = $1
+            """, snapshot_id, total_records, inventory.records, stats.records,
+                summary["room_types_count"], summary["hotels_count"], summary["earliest_week"],
+                summary["latest_week"], inventory.size_bytes + stats.size_bytes)
+
+            # 增量更新訂房進度（只寫入本快照對應的入住前天數）
+            try:
+                async with writer.transaction():
+                    pace_rows = await record_snapshot_pace(writer, snapshot_id, snapshot_date)
+                logger.info(f"📈 訂房進度已更新: {pace_rows} 筆")
+            except asyncpg.UndefinedTableError:
+                logger.warning("⚠️ booking_pace 表不存在，略過訂房進度（請執行 database/booking_pace_schema.sql）")
+
+            await notify(writer, "snapshot.created", snapshot_id=snapshot_id, snapshot_date=snapshot_date,
+                         total_records=total_records)
+
+    SNAPSHOT_ROWS.set(inventory.records, table="inventory_snapshots")
+    SNAPSHOT_ROWS.set(stats.records, table="weekly_statistics_snapshots")
+    SNAPSHOT_DURATION.observe(time.perf_counter() - started)
+    logger.info(f"✅ 創建快照成功 ID: {snapshot_id}, 記錄數: {total_records}")
+
+
+async def build_snapshot(pool, snapshot_id: int, snapshot_date: date, wait: bool = False) -> bool:
+    """
+    複製快照資料，返回是否由本次呼叫完成複製
+
+    其他行程正在複製時：wait 為 False 直接返回（加入進行中的快照）；為 True 則等到對方完成。
+    """
+    async with pool.acquire() as reader:
+        if wait:
+            await reader.execute("SELECT pg_advisory_lock($1, $2)", SNAPSHOT_LOCK_CLASS, snapshot_id)
+        elif not await reader.fetchval("SELECT pg_try_advisory_lock($1, $2)", SNAPSHOT_LOCK_CLASS, snapshot_id):
+            logger.info(f"📸 快照 {snapshot_id} 正在其他行程建立中")
+            return False
+
+        try:
+            status = await reader.fetchval("SELECT status FROM data_snapshots WHERE id = $1", snapshot_id)
+            if status in (None, "completed"):
+                return False
+            try:
+                await _copy_snapshot(pool, reader, snapshot_id, snapshot_date)
+            except Exception as e:
+                logger.error(f"❌ 快照 {snapshot_id} 建立失敗: {str(e)}")
+                await reader.execute("UPDATE data_snapshots SET status = 'failed' WHERE id = $1", snapshot_id)
+                raise
+            return True
+        finally:
+            await reader.execute("SELECT pg_advisory_unlock($1, $2)", SNAPSHOT_LOCK_CLASS, snapshot_id)
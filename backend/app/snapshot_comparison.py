@@ -0,0 +1,84 @@
+"""
+快照比較結果快取
+
+完成的快照不再變動，同一組快照與篩選條件的比較結果永遠相同，只需計算一次。結果分兩層保存：
+行程內的 TTLCache（前層），以及 snapshot_comparisons 表（重啟後仍有效，多個實例共用）。
+
+快照 id 不會重複使用，刪除快照時 snapshot_comparisons 的記錄由外鍵 ON DELETE CASCADE 一併刪除，
+各實例的前層則由 snapshot.deleted 事件清除。snapshot_comparisons 表尚未建立時只使用前層。
+"""
+import json
+import logging
+from typing import Awaitable, Callable, Mapping, Optional, Tuple
+
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+
+from cache import TTLCache
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+COMPARISON_EVENTS = ("snapshot.deleted", "listener.connected")
+
+ComparisonKey = Tuple[int, int, str]  # (from_snapshot_id, to_snapshot_id, filters_key)
+
+
+def filters_key(filters: Mapping[str, Optional[str]]) -> str:
+    """篩選條件的固定字串表示（未指定的條件不列入）"""
+    return json.dumps({k: v for k, v in filters.items() if v is not None},
+                      sort_keys=True, ensure_ascii=False)
+
+
+class SnapshotComparisonCache:
+    def __init__(self, ttl: float, max_entries: int = 128):
+        self.memory = TTLCache("snapshot_comparisons", ttl=ttl, max_entries=max_entries)
+
+    def handle_event(self, event: dict) -> None:
+        if event.get("event") in COMPARISON_EVENTS:
+            self.memory.clear()
+
+    async def _load(self, conn, key: ComparisonKey) -> Optional[dict]:
+        try:
+            result = await conn.fetchval("""
+                SELECT result FROM snapshot_comparisons
+                WHERE from_snapshot_id = $1 AND to_snapshot_id = $2 AND filters_key = $3
+            """, *key)
+        except asyncpg.UndefinedTableError:
+            return None
+        CACHE_REQUESTS.inc(cache="snapshot_comparisons_db", result="hit" if result is not None else "miss")
+        return json.loads(result) if result is not None else None
+
+    async def _store(self, conn, key: ComparisonKey, result: dict) -> None:
+        try:
+            await conn.execute("""
+                INSERT INTO snapshot_comparisons (from_snapshot_id, to_snapshot_id, filters_key, result)
+                VALUES ($1, $2, $3, $4::json)
+                ON CONFLICT DO NOTHING
+            """, *key, json.dumps(result, ensure_ascii=False))
+        except asyncpg.UndefinedTableError:
+            pass
+        except asyncpg.ForeignKeyViolationError:
+            # 計算期間快照已被刪除
+            logger.info(f"快照 {key[0]} 或 {key[1]} 已刪除，不保存比較結果")
+
+    async def get_or_compute(self, conn, from_snapshot_id: int, to_snapshot_id: int,
+                             filters: Mapping[str, Optional[str]],
+                             compute: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        依序查詢前層、snapshot_comparisons，都沒有時呼叫 compute() 計算並保存
+
+        結果以 JSON 相容的型別保存（Decimal 轉為數字、日期轉為 ISO 字串），與 API 輸出一致；
+        返回的物件由快取共用，呼叫端不可修改。
+        """
+        key = (from_snapshot_id, to_snapshot_id, filters_key(filters))
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+
+        result = await self._load(conn, key)
+        if result is None:
+            result = jsonable_encoder(await compute())
+            await self._store(conn, key, result)
+        self.memory.set(key, result)
+        return result
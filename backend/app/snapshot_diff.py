@@ -0,0 +1,107 @@
+"""
+快照庫存逐日比較
+
+比較兩個快照中每個房型每一天的庫存數量與狀態，依 (inv_type_code, hotel_id, date) 以游標分頁。
+
+兩個快照各自沿 idx_inventory_snapshots_lookup 依鍵順序讀取，以 Merge Append 合併成一條有序的
+資料流，再由 GroupAggregate 逐鍵比對（等同 merge join），湊滿一頁即停止，不需讀完整個快照。
+FULL OUTER JOIN 的結果在 Postgres 中視為無序，加上 ORDER BY 就得讀完兩邊再排序，
+快照有數十萬筆時每一頁都要整份比較一次。
+游標條件寫成 (snapshot_id, inv_type_code, hotel_id, date) > (...)，可直接作為索引的起點。
+"""
+import base64
+import json
+from datetime import date
+from typing import List, Optional, Tuple
+
+DIFF_PAGE_SIZE = 200
+MAX_DIFF_PAGE_SIZE = 2000
+
+DiffCursor = Tuple[str, str, date]  # (inv_type_code, hotel_id, date)
+
+
+def encode_cursor(row) -> str:
+    key = [row["inv_type_code"], row["hotel_id"], row["date"].isoformat()]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> DiffCursor:
+    try:
+        inv_type_code, hotel_id, day = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(inv_type_code), str(hotel_id), date.fromisoformat(day)
+    except (ValueError, TypeError):
+        raise ValueError("無效的分頁游標")
+
+
+def build_inventory_diff_query(from_snapshot, to_snapshot, hotel_id: Optional[str] = None,
+                               inv_type_code: Optional[str] = None, start_date: Optional[date] = None,
+                               end_date: Optional[date] = None, after: Optional[DiffCursor] = None,
+                               limit: int = DIFF_PAGE_SIZE) -> Tuple[str, list]:
+    """
+    組出逐日比較查詢（多取一筆用來判斷是否還有下一頁）
+
+    $1/$2 為舊快照的 id 與快照日期，$3/$4 為新快照；快照日期讓查詢只讀取該月分區。
+    """
+    args = [from_snapshot["id"], from_snapshot["snapshot_date"],
+            to_snapshot["id"], to_snapshot["snapshot_date"], limit + 1]
+    conditions = []
+    for condition, value in (
+        ("{a}.hotel_id = {}", hotel_id),
+        ("{a}.inv_type_code = {}", inv_type_code),
+        ("{a}.date >= {}", start_date),
+        ("{a}.date <= {}", end_date),
+    ):
+        if value is not None:
+            args.append(value)
+            conditions.append(condition.replace("{}", f"${len(args)}"))
+    if after is not None:
+        args.extend(after)
+        n = len(args)
+        conditions.append(f"({{a}}.snapshot_id, {{a}}.inv_type_code, {{a}}.hotel_id, {{a}}.date) "
+                          f"> ({{sid}}, ${n - 2}, ${n - 1}, ${n})")
+
+    def where(alias: str, snapshot_id: str) -> str:
+        return "".join(f" AND {c.replace('{a}', alias).replace('{sid}', snapshot_id)}" for c in conditions)
+
+    query = f"""
+        SELECT inv_type_code, hotel_id, date,
+               MIN(quantity) FILTER (WHERE side = 0) AS from_quantity,
+               MIN(quantity) FILTER (WHERE side = 1) AS to_quantity,
+               MIN(status) FILTER (WHERE side = 0) AS from_status,
+               MIN(status) FILTER (WHERE side = 1) AS to_status,
+               CASE
+                   WHEN COUNT(*) FILTER (WHERE side = 0) = 0 THEN 'new'
+                   WHEN COUNT(*) FILTER (WHERE side = 1) = 0 THEN 'removed'
+                   ELSE 'changed'
+               END AS change_type,
+               MIN(quantity) FILTER (WHERE side = 1) - MIN(quantity) FILTER (WHERE side = 0) AS quantity_diff
+        FROM (
+            (SELECT 0 AS side, inv_type_code, hotel_id, date, quantity, status
+             FROM inventory_snapshots f
+             WHERE f.snapshot_id = $1 AND f.snapshot_date = $2{where("f", "$1")}
+             ORDER BY inv_type_code, hotel_id, date)
+            UNION ALL
+            (SELECT 1 AS side, inv_type_code, hotel_id, date, quantity, status
+             FROM inventory_snapshots t
+             WHERE t.snapshot_id = $3 AND t.snapshot_date = $4{where("t", "$3")}
+             ORDER BY inv_type_code, hotel_id, date)
+        ) merged
+        GROUP BY inv_type_code, hotel_id, date
+        HAVING COUNT(*) = 1 OR MIN(quantity) <> MAX(quantity) OR MIN(status) <> MAX(status)
+        ORDER BY inv_type_code, hotel_id, date
+        LIMIT $5
+    """
+    return query, args
+
+
+async def fetch_inventory_diff(conn, from_snapshot, to_snapshot, hotel_id: Optional[str] = None,
+                               inv_type_code: Optional[str] = None, start_date: Optional[date] = None,
+                               end_date: Optional[date] = None, after: Optional[DiffCursor] = None,
+                               limit: int = DIFF_PAGE_SIZE) -> dict:
+    """返回 after 之後的一頁逐日變化與下一頁的游標（沒有下一頁時為 None）"""
+    query, args = build_inventory_diff_query(from_snapshot, to_snapshot, hotel_id, inv_type_code,
+                                             start_date, end_date, after, limit)
+    rows = await conn.fetch(query, *args)
+    changes: List[dict] = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(changes[-1]) if len(rows) > limit else None
+    return {"changes": changes, "next_cursor": next_cursor}
@@ -0,0 +1,274 @@
+"""
+快照還原
+
+PMS 抽取異常寫壞 inventory_data 時，把某個快照的庫存與週統計寫回即時資料表（可限定酒店）。
+兩張表各以兩個集合操作完成，全部在同一個交易中：
+
+- DELETE 快照中沒有的列
+- INSERT ... SELECT 快照 ON CONFLICT DO UPDATE 寫回缺少的列與數值不同的列；
+  與快照相同的列不更新，不產生新版本也不被鎖定
+  （同一語句中的查詢看到的是寫入前的表，以此區分新增與更新的筆數）
+
+快照查詢只讀取該快照所在的月分區（見 time_travel.DataSource），交易開始時設定 lock_timeout，
+遇到長時間持有鎖的交易時直接失敗，不會排隊阻塞其他寫入。期間統計在提交後另外重算，
+不延長持有列鎖的時間。
+
+dry_run 只計算差異（各動作的筆數、日期範圍與前幾筆逐日明細），不寫入。
+
+快照在範圍內（可限定酒店）沒有庫存或週統計時拋出 EmptySnapshotError，不做任何刪除：
+DELETE 會移除快照中沒有的列，來源為空時等於清空即時資料。
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import date
+from typing import List, Optional, Tuple
+
+from events import notify
+from partitions import INVENTORY_TABLE, ensure_partitions
+from period_statistics import refresh_period_statistics
+from time_travel import DataSource
+
+logger = logging.getLogger(__name__)
+
+# 等待其他交易釋放鎖的上限，超過即放棄還原
+RESTORE_LOCK_TIMEOUT = "5s"
+
+# dry_run 返回的逐日明細筆數
+RESTORE_PREVIEW_ROWS = 200
+
+INVENTORY_KEY = ("inv_type_code", "hotel_id", "date")
+WEEKLY_KEY = ("inv_type_code", "hotel_id", "week_start_date")
+WEEKLY_VALUES = ("week_end_date", "actual_occupancy_rate", "actual_vacancy_rate", "total_occupancy_rate",
+                 "total_vacancy_rate", "total_rooms", "total_available_days", "total_days")
+
+
+class EmptySnapshotError(LookupError):
+    pass
+
+
+@dataclass
+class RestoreResult:
+    snapshot_id: int
+    snapshot_date: date
+    hotel_id: Optional[str] = None
+    dry_run: bool = True
+    inventory: dict = field(default_factory=dict)          # insert / update / delete 筆數
+    weekly_statistics: dict = field(default_factory=dict)
+    start_date: Optional[date] = None                      # 有變動的庫存日期範圍
+    end_date: Optional[date] = None
+    preview: List[dict] = field(default_factory=list)
+    period_statistics_rows: int = 0
+
+
+def _scope(alias: str, hotel_id: Optional[str], args: list) -> str:
+    if not hotel_id:
+        return "TRUE"
+    args.append(hotel_id)
+    return f"{alias}.hotel_id = ${len(args)}"
+
+
+def _join(key: Tuple[str, ...]) -> str:
+    return " AND ".join(f"l.{k} = s.{k}" for k in key)
+
+
+def _inventory_diff_query(source: DataSource, hotel_id: Optional[str], args: list) -> str:
+    """即時庫存與快照的逐日差異（action 為還原時要做的動作）"""
+    return f"""
+        SELECT CASE WHEN l.date IS NULL THEN 'insert'
+                    WHEN s.date IS NULL THEN 'delete'
+                    ELSE 'update' END AS action,
+               COALESCE(s.inv_type_code, l.inv_type_code) AS inv_type_code,
+               COALESCE(s.hotel_id, l.hotel_id) AS hotel_id,
+               COALESCE(s.date, l.date) AS date,
+               l.quantity AS current_quantity, s.quantity AS snapshot_quantity,
+               l.status AS current_status, s.status AS snapshot_status
+        FROM (SELECT * FROM {source.inventory} s WHERE {_scope("s", hotel_id, args)}) s
+        FULL JOIN (SELECT * FROM inventory_data l WHERE {_scope("l", hotel_id, args)}) l
+            ON {_join(INVENTORY_KEY)}
+        WHERE s.date IS NULL OR l.date IS NULL
+           OR l.quantity IS DISTINCT FROM s.quantity OR l.status IS DISTINCT FROM s.status
+    """
+
+
+def _weekly_diff_query(source: DataSource, hotel_id: Optional[str], args: list) -> str:
+    return f"""
+        SELECT CASE WHEN l.week_start_date IS NULL THEN 'insert'
+                    WHEN s.week_start_date IS NULL THEN 'delete'
+                    ELSE 'update' END AS action
+        FROM (SELECT * FROM {source.weekly_statistics} s WHERE {_scope("s", hotel_id, args)}) s
+        FULL JOIN (SELECT * FROM weekly_statistics l WHERE {_scope("l", hotel_id, args)}) l
+            ON {_join(WEEKLY_KEY)}
+        WHERE s.week_start_date IS NULL OR l.week_start_date IS NULL
+           OR ({", ".join(f"l.{v}" for v in WEEKLY_VALUES)}) IS DISTINCT FROM
+              ({", ".join(f"s.{v}" for v in WEEKLY_VALUES)})
+    """
+
+
+def _counts(rows) -> dict:
+    counts = {"insert": 0, "update": 0, "delete": 0}
+    counts.update({row["action"]: row["count"] for row in rows})
+    return counts
+
+
+async def diff_snapshot_restore(conn, result: RestoreResult, source: DataSource,
+                                preview_rows: int = RESTORE_PREVIEW_ROWS) -> None:
+    """計算還原會造成的變動，寫入 result"""
+    args: list = []
+    diff = _inventory_diff_query(source, result.hotel_id, args)
+    rows = await conn.fetch(f"""
+        SELECT action, COUNT(*) AS count, MIN(date) AS start_date, MAX(date) AS end_date
+        FROM ({diff}) diff
+        GROUP BY action
+    """, *args)
+    result.inventory = _counts(rows)
+    if rows:
+        result.start_date = min(row["start_date"] for row in rows)
+        result.end_date = max(row["end_date"] for row in rows)
+
+    args = [preview_rows]
+    diff = _inventory_diff_query(source, result.hotel_id, args)
+    preview = await conn.fetch(f"""
+        SELECT * FROM ({diff}) diff
+        ORDER BY date, hotel_id, inv_type_code
+        LIMIT $1
+    """, *args)
+    result.preview = [dict(row) for row in preview]
+
+    args = []
+    diff = _weekly_diff_query(source, result.hotel_id, args)
+    rows = await conn.fetch(f"SELECT action, COUNT(*) AS count FROM ({diff}) diff GROUP BY action", *args)
+    result.weekly_statistics = _counts(rows)
+
+
+async def _check_source(conn, source: DataSource, hotel_id: Optional[str]) -> None:
+    """快照在範圍內的兩張表都必須有資料"""
+    for table, name in ((source.inventory, "庫存"), (source.weekly_statistics, "週統計")):
+        args: list = []
+        exists = await conn.fetchval(
+            f"SELECT EXISTS (SELECT 1 FROM {table} s WHERE {_scope('s', hotel_id, args)})", *args)
+        if not exists:
+            scope = f"酒店 {hotel_id} 的" if hotel_id else ""
+            raise EmptySnapshotError(f"快照 {source.snapshot_id} 沒有{scope}{name}資料，無法還原")
+
+
+async def _restore_inventory(conn, source: DataSource, hotel_id: Optional[str]) -> dict:
+    args: list = []
+    deleted = await conn.fetchrow(f"""
+        WITH deleted AS (
+            DELETE FROM inventory_data l
+            WHERE {_scope("l", hotel_id, args)}
+              AND NOT EXISTS (SELECT 1 FROM {source.inventory} s WHERE {_join(INVENTORY_KEY)})
+            RETURNING l.date
+        )
+        SELECT COUNT(*) AS count, MIN(date) AS start_date, MAX(date) AS end_date FROM deleted
+    """, *args)
+
+    args = []
+    written = await conn.fetchrow(f"""
+        WITH written AS (
+            INSERT INTO inventory_data (inv_type_code, hotel_id, date, quantity, status)
+            SELECT s.inv_type_code, s.hotel_id, s.date, s.quantity, s.status
+            FROM {source.inventory} s
+            WHERE {_scope("s", hotel_id, args)}
+            ON CONFLICT (inv_type_code, date, hotel_id)
+            DO UPDATE SET
+                quantity = EXCLUDED.quantity,
+                status = EXCLUDED.status
+            WHERE (inventory_data.quantity, inventory_data.status)
+                  IS DISTINCT FROM (EXCLUDED.quantity, EXCLUDED.status)
+            RETURNING inv_type_code, hotel_id, date
+        )
+        SELECT COUNT(*) FILTER (WHERE l.date IS NULL) AS inserted,
+               COUNT(l.date) AS updated,
+               MIN(s.date) AS start_date, MAX(s.date) AS end_date
+        FROM written s
+        LEFT JOIN inventory_data l ON {_join(INVENTORY_KEY)}
+    """, *args)
+
+    dates = [d for d in (deleted["start_date"], deleted["end_date"],
+                         written["start_date"], written["end_date"]) if d is not None]
+    return {
+        "counts": {"insert": written["inserted"], "update": written["updated"], "delete": deleted["count"]},
+        "start_date": min(dates) if dates else None,
+        "end_date": max(dates) if dates else None,
+    }
+
+
+async def _restore_weekly_statistics(conn, source: DataSource, hotel_id: Optional[str]) -> dict:
+    args: list = []
+    deleted = await conn.execute(f"""
+        DELETE FROM weekly_statistics l
+        WHERE {_scope("l", hotel_id, args)}
+          AND NOT EXISTS (SELECT 1 FROM {source.weekly_statistics} s WHERE {_join(WEEKLY_KEY)})
+    """, *args)
+
+    args = []
+    columns = ", ".join(WEEKLY_KEY + WEEKLY_VALUES)
+    written = await conn.fetchrow(f"""
+        WITH written AS (
+            INSERT INTO weekly_statistics ({columns})
+            SELECT {", ".join(f"s.{c}" for c in WEEKLY_KEY + WEEKLY_VALUES)}
+            FROM {source.weekly_statistics} s
+            WHERE {_scope("s", hotel_id, args)}
+            ON CONFLICT (inv_type_code, week_start_date, hotel_id)
+            DO UPDATE SET {", ".join(f"{v} = EXCLUDED.{v}" for v in WEEKLY_VALUES)}
+            WHERE ({", ".join(f"weekly_statistics.{v}" for v in WEEKLY_VALUES)})
+                  IS DISTINCT FROM ({", ".join(f"EXCLUDED.{v}" for v in WEEKLY_VALUES)})
+            RETURNING inv_type_code, hotel_id, week_start_date
+        )
+        SELECT COUNT(*) FILTER (WHERE l.week_start_date IS NULL) AS inserted,
+               COUNT(l.week_start_date) AS updated
+        FROM written s
+        LEFT JOIN weekly_statistics l ON {_join(WEEKLY_KEY)}
+    """, *args)
+    return {"insert": written["inserted"], "update": written["updated"], "delete": int(deleted.split()[-1])}
+
+
+async def restore_snapshot(conn, snapshot, hotel_id: Optional[str] = None,
+                           dry_run: bool = True) -> RestoreResult:
+    """
+    把快照（data_snapshots 的列）寫回 inventory_data 與 weekly_statistics
+
+    dry_run 為 True 時只計算差異。實際還原後發出 inventory.updated 與 statistics.updated，
+    並重算變動日期的期間統計。
+    """
+    source = DataSource(snapshot["id"], snapshot["snapshot_date"])
+    result = RestoreResult(snapshot["id"], snapshot["snapshot_date"], hotel_id, dry_run)
+
+    if dry_run:
+        await _check_source(conn, source, hotel_id)
+        await diff_snapshot_restore(conn, result, source)
+        return result
+
+    args: list = []
+    date_range = await conn.fetchrow(f"SELECT MIN(date) AS start_date, MAX(date) AS end_date "
+                                     f"FROM {source.inventory} s WHERE {_scope('s', hotel_id, args)}", *args)
+    if date_range["start_date"] is not None:
+        await ensure_partitions(conn, INVENTORY_TABLE, date_range["start_date"], date_range["end_date"])
+
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL lock_timeout = '{RESTORE_LOCK_TIMEOUT}'")
+        await _check_source(conn, source, hotel_id)
+        inventory = await _restore_inventory(conn, source, hotel_id)
+        result.inventory = inventory["counts"]
+        result.start_date, result.end_date = inventory["start_date"], inventory["end_date"]
+        result.weekly_statistics = await _restore_weekly_statistics(conn, source, hotel_id)
+
+        if result.start_date is not None:
+            await notify(conn, "inventory.updated", hotel_id=hotel_id, start_date=result.start_date,
+                         end_date=result.end_date, rows=sum(result.inventory.values()),
+                         source="snapshot_restore", snapshot_id=result.snapshot_id)
+        if any(result.weekly_statistics.values()):
+            await notify(conn, "statistics.updated", kind="weekly", hotel_id=hotel_id,
+                         source="snapshot_restore", snapshot_id=result.snapshot_id)
+
+    logger.info(f"⏪ 已還原快照 {result.snapshot_id} ({result.snapshot_date}): "
+                f"庫存 {result.inventory}, 週統計 {result.weekly_statistics}")
+
+    if result.start_date is not None:
+        async with conn.transaction():
+            result.period_statistics_rows = await refresh_period_statistics(
+                conn, result.start_date, result.end_date, hotel_id)
+            await notify(conn, "statistics.updated", kind="period", hotel_id=hotel_id,
+                         start_date=result.start_date, end_date=result.end_date)
+    return result
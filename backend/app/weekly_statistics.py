@@ -0,0 +1,74 @@
+"""
+週統計寫入
+
+由 inventory_data + room_types.total_rooms 重算週統計並批次寫入 weekly_statistics。
+週更新、backfill 與快照還原共用。
+"""
+from datetime import date, timedelta
+from typing import List, Optional
+
+from occupancy import OccupancyFrame
+
+
+async def upsert_weekly_statistics(conn, stats: List[dict]) -> int:
+    """批次寫入週統計（stats 為入住率引擎的分組結果），返回寫入筆數"""
+    if not stats:
+        return 0
+    
+    await conn.execute("""
+        INSERT INTO weekly_statistics 
+        (inv_type_code, week_start_date, week_end_date, actual_occupancy_rate, 
+         actual_vacancy_rate, total_occupancy_rate, total_vacancy_rate, 
+         total_rooms, total_available_days, total_days, hotel_id)
+        SELECT t.inv_type_code, t.week_start_date, t.week_start_date + 6, t.actual_occupancy_rate,
+               t.actual_vacancy_rate, t.total_occupancy_rate, t.total_vacancy_rate,
+               t.total_rooms, t.total_available_days, 7, t.hotel_id
+        FROM unnest($1::varchar[], $2::date[], $3::numeric[], $4::numeric[], $5::numeric[],
+                    $6::numeric[], $7::int[], $8::int[], $9::varchar[])
+            AS t(inv_type_code, week_start_date, actual_occupancy_rate, actual_vacancy_rate,
+                 total_occupancy_rate, total_vacancy_rate, total_rooms, total_available_days, hotel_id)
+        ON CONFLICT (inv_type_code, week_start_date, hotel_id)
+        DO UPDATE SET 
+            week_end_date = EXCLUDED.week_end_date,
+            actual_occupancy_rate = EXCLUDED.actual_occupancy_rate,
+            actual_vacancy_rate = EXCLUDED.actual_vacancy_rate,
+            total_occupancy_rate = EXCLUDED.total_occupancy_rate,
+            total_vacancy_rate = EXCLUDED.total_vacancy_rate,
+            total_rooms = EXCLUDED.total_rooms,
+            total_available_days = EXCLUDED.total_available_days,
+            total_days = EXCLUDED.total_days
+    """,
+        [s["inv_type_code"] for s in stats],
+        [s["week_start_date"] for s in stats],
+        [s["actual_occupancy_rate"] for s in stats],
+        [s["actual_vacancy_rate"] for s in stats],
+        [s["total_occupancy_rate"] for s in stats],
+        [s["total_vacancy_rate"] for s in stats],
+        [s["total_rooms"] for s in stats],
+        [s["open_days"] for s in stats],
+        [s["hotel_id"] for s in stats])
+    
+    return len(stats)
+
+
+async def recompute_weekly_statistics(conn, start_date: date, end_date: date, hotel_id: Optional[str] = None) -> int:
+    """一次查詢並向量化計算區間內所有房型的週統計，返回寫入筆數"""
+    week_start = start_date - timedelta(days=start_date.weekday())
+    week_end = end_date + timedelta(days=6 - end_date.weekday())
+    
+    rows = await conn.fetch(f"""
+        SELECT i.inv_type_code, i.hotel_id, i.date, i.quantity, i.status, rt.total_rooms
+        FROM inventory_data i
+        JOIN room_types rt ON i.inv_type_code = rt.inv_type_code AND i.hotel_id = rt.hotel_id
+        WHERE i.date BETWEEN $1 AND $2
+        {"AND i.hotel_id = $3" if hotel_id else ""}
+    """, week_start, week_end, *([hotel_id] if hotel_id else []))
+    
+    frame = OccupancyFrame.from_records(rows)
+    stats = frame.group(["hotel", "room_type", "week"])
+    
+    # 同一房型的總房數固定，取分組內的平均即為總房數
+    for s in stats:
+        s["total_rooms"] = s["total_room_days"] // s["days"] if s["days"] else 0
+    
+    return await upsert_weekly_statistics(conn, stats)
@@ -0,0 +1,28 @@
+-- ================================
+-- 庫存告警
+-- ================================
+-- 抽取庫存時依變動的列評估規則（即將售完、入住率跳動、改為 CLOSE、疑似異常回應），
+-- 觸發的告警寫入此表，GET /alerts 查詢、/events 以 alerts.fired 推送。
+-- dedupe_key 為 規則:酒店:房型:日期，同一告警在確認（acknowledged_at）前不會重複寫入。
+
+CREATE TABLE IF NOT EXISTS inventory_alerts (
+    id SERIAL PRIMARY KEY,
+    rule VARCHAR(30) NOT NULL,
+    severity VARCHAR(10) NOT NULL CHECK (severity IN ('info', 'warning', 'critical')),
+    hotel_id VARCHAR(10) NOT NULL,
+    inv_type_code VARCHAR(10),
+    target_date DATE,
+    message TEXT NOT NULL,
+    details JSONB NOT NULL DEFAULT '{}',
+    dedupe_key VARCHAR(100) NOT NULL,
+    fired_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    acknowledged_at TIMESTAMP
+);
+
+-- 未確認的告警不重複
+CREATE UNIQUE INDEX IF NOT EXISTS uq_inventory_alerts_open
+ON inventory_alerts(dedupe_key) WHERE acknowledged_at IS NULL;
+
+-- 依觸發時間查詢最新告警
+CREATE INDEX IF NOT EXISTS idx_inventory_alerts_fired_at
+ON inventory_alerts(fired_at DESC);
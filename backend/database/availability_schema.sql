@@ -0,0 +1,10 @@
+-- ================================
+-- 空房搜尋索引
+-- ================================
+-- 空房索引（GET /availability/search）只讀取 OPEN 且有剩餘房數的庫存，
+-- 部分索引只收錄這些列並附帶所需欄位，載入時以 index-only scan 取得。
+-- 可重複執行；partition_schema.sql 轉換分區後需再執行一次。
+
+CREATE INDEX IF NOT EXISTS idx_inventory_data_open
+ON inventory_data(date) INCLUDE (hotel_id, inv_type_code, quantity)
+WHERE status = 'OPEN' AND quantity > 0;
@@ -0,0 +1,19 @@
+-- ================================
+-- 訂房進度（pace / pickup）
+-- ================================
+-- 每個房型每個入住日一列：sold_by_dba[d + 1] 為入住前 d 天的快照中已售出的房間數，
+-- 沒有快照的日子為 NULL（只佔 NULL bitmap 的一個位元）。
+-- 每建立一個快照只寫入對應的那一格；既有快照執行 POST /booking-pace/rebuild 補算。
+
+CREATE TABLE IF NOT EXISTS booking_pace (
+    hotel_id VARCHAR(10) NOT NULL,
+    inv_type_code VARCHAR(10) NOT NULL,
+    stay_date DATE NOT NULL,
+    sold_by_dba SMALLINT[] NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (hotel_id, inv_type_code, stay_date)
+);
+
+-- 不指定酒店時依入住日區間查詢
+CREATE INDEX IF NOT EXISTS idx_booking_pace_stay_date
+ON booking_pace(stay_date);
@@ -0,0 +1,25 @@
+-- ================================
+-- 入住率預測（批次預先計算）
+-- ================================
+-- 每個房型未來 26 週（含本週）一列，由 scripts/run_forecast.py（每晚）或
+-- POST /forecasts/refresh 整批重寫；GET /forecasts 只讀取此表。
+-- model: seasonal（季節基準）、pickup（已訂 + 平均 pickup）、blend（兩者加權）、
+--        on_the_books（沒有歷史，只有已訂入住率）
+
+CREATE TABLE IF NOT EXISTS occupancy_forecasts (
+    hotel_id VARCHAR(10) NOT NULL,
+    inv_type_code VARCHAR(10) NOT NULL,
+    week_start_date DATE NOT NULL,
+    forecast_occupancy_rate DECIMAL(5,2) NOT NULL,
+    on_the_books_rate DECIMAL(5,2),
+    baseline_rate DECIMAL(5,2),
+    pickup_rate DECIMAL(5,2),
+    lead_days INTEGER NOT NULL,
+    model VARCHAR(20) NOT NULL,
+    generated_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (hotel_id, inv_type_code, week_start_date)
+);
+
+-- 不指定酒店時依週查詢
+CREATE INDEX IF NOT EXISTS idx_occupancy_forecasts_week
+ON occupancy_forecasts(week_start_date);
@@ -0,0 +1,21 @@
+-- ================================
+-- 露營區（酒店）資料
+-- ================================
+-- 後端啟動時與房型一起載入記憶體目錄，異動後發送 hotels.updated 事件讓各實例重新載入。
+
+CREATE TABLE IF NOT EXISTS hotels (
+    hotel_id VARCHAR(10) PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO hotels (hotel_id, name) VALUES
+    ('2436', '霧繞'),
+    ('2799', '霧語'),
+    ('2155', '山中靜靜'),
+    ('2656', '暖硫')
+ON CONFLICT (hotel_id) DO NOTHING;
+
+-- 通知後端重新載入目錄
+SELECT pg_notify('data_updates', '{"event": "hotels.updated"}');
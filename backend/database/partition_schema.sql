@@ -0,0 +1,229 @@
+-- ================================
+-- 時間分區：inventory_data 依日期按月分區，快照表依快照日期按月分區
+-- 在 schema.sql 與 snapshot_schema.sql 之後執行；可重複執行
+-- ================================
+
+-- 1. 建立（或補齊）月分區的函數，分區命名為 <表名>_YYYYMM
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent TEXT, from_date DATE, to_date DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_date)::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= to_date LOOP
+        partition_name := format('%s_%s', parent, to_char(month_start, 'YYYYMM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            BEGIN
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, parent, month_start,
+                               (month_start + INTERVAL '1 month')::date);
+                created := created + 1;
+            EXCEPTION WHEN duplicate_table THEN
+                -- 其他連線同時建立了相同分區
+                NULL;
+            END;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 2. 刪除指定月份的分區（不存在時略過），返回是否刪除
+DROP FUNCTION IF EXISTS drop_monthly_partitions_before(TEXT, DATE);
+
+CREATE OR REPLACE FUNCTION drop_monthly_partition(parent TEXT, month_start DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    partition_name TEXT := format('%s_%s', parent, to_char(month_start, 'YYYYMM'));
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('DROP TABLE %I', partition_name);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 3. 將既有的一般表轉為分區表（已是分區表則跳過）
+DO $$
+DECLARE
+    min_date DATE;
+    max_date DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE relname = 'inventory_data') = 'r' THEN
+        ALTER TABLE inventory_data RENAME TO inventory_data_legacy;
+        ALTER SEQUENCE inventory_data_id_seq OWNED BY NONE;
+
+        CREATE TABLE inventory_data (
+            id INTEGER NOT NULL DEFAULT nextval('inventory_data_id_seq'),
+            inv_type_code VARCHAR(10) NOT NULL,
+            hotel_id VARCHAR(10) NOT NULL,
+            date DATE NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            status VARCHAR(10) NOT NULL CHECK (status IN ('OPEN', 'CLOSE')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, date),
+            UNIQUE (inv_type_code, date, hotel_id)
+        ) PARTITION BY RANGE (date);
+        ALTER SEQUENCE inventory_data_id_seq OWNED BY inventory_data.id;
+
+        SELECT MIN(date), MAX(date) INTO min_date, max_date FROM inventory_data_legacy;
+        PERFORM ensure_monthly_partitions('inventory_data',
+                                          COALESCE(min_date, CURRENT_DATE),
+                                          GREATEST(COALESCE(max_date, CURRENT_DATE), CURRENT_DATE + 365));
+
+        INSERT INTO inventory_data (id, inv_type_code, hotel_id, date, quantity, status, created_at)
+        SELECT id, inv_type_code, hotel_id, date, quantity, status, created_at FROM inventory_data_legacy;
+
+        DROP TABLE inventory_data_legacy;
+    END IF;
+
+    IF (SELECT relkind FROM pg_class WHERE relname = 'inventory_snapshots') = 'r' THEN
+        -- 依賴快照表的視圖需先移除，轉換後重建
+        DROP VIEW IF EXISTS latest_snapshot_summary;
+
+        ALTER TABLE inventory_snapshots RENAME TO inventory_snapshots_legacy;
+        ALTER SEQUENCE inventory_snapshots_id_seq OWNED BY NONE;
+
+        CREATE TABLE inventory_snapshots (
+            id INTEGER NOT NULL DEFAULT nextval('inventory_snapshots_id_seq'),
+            snapshot_id INTEGER REFERENCES data_snapshots(id) ON DELETE CASCADE,
+            snapshot_date DATE NOT NULL,
+            inv_type_code VARCHAR(10) NOT NULL,
+            hotel_id VARCHAR(10) NOT NULL,
+            date DATE NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            status VARCHAR(10) NOT NULL CHECK (status IN ('OPEN', 'CLOSE')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, snapshot_date)
+        ) PARTITION BY RANGE (snapshot_date);
+        ALTER SEQUENCE inventory_snapshots_id_seq OWNED BY inventory_snapshots.id;
+
+        SELECT MIN(snapshot_date), MAX(snapshot_date) INTO min_date, max_date FROM data_snapshots;
+        PERFORM ensure_monthly_partitions('inventory_snapshots',
+                                          COALESCE(min_date, CURRENT_DATE),
+                                          GREATEST(COALESCE(max_date, CURRENT_DATE), CURRENT_DATE + 31));
+
+        INSERT INTO inventory_snapshots
+            (id, snapshot_id, snapshot_date, inv_type_code, hotel_id, date, quantity, status, created_at)
+        SELECT s.id, s.snapshot_id, ds.snapshot_date, s.inv_type_code, s.hotel_id, s.date, s.quantity, s.status, s.created_at
+        FROM inventory_snapshots_legacy s
+        JOIN data_snapshots ds ON ds.id = s.snapshot_id;
+
+        DROP TABLE inventory_snapshots_legacy;
+        CREATE INDEX IF NOT EXISTS idx_inventory_snapshots_lookup
+        ON inventory_snapshots(snapshot_id, inv_type_code, hotel_id, date);
+        CREATE INDEX IF NOT EXISTS idx_inventory_snapshots_date
+        ON inventory_snapshots(snapshot_id, date);
+    END IF;
+
+    IF (SELECT relkind FROM pg_class WHERE relname = 'weekly_statistics_snapshots') = 'r' THEN
+        DROP VIEW IF EXISTS latest_snapshot_summary;
+
+        ALTER TABLE weekly_statistics_snapshots RENAME TO weekly_statistics_snapshots_legacy;
+        ALTER SEQUENCE weekly_statistics_snapshots_id_seq OWNED BY NONE;
+
+        CREATE TABLE weekly_statistics_snapshots (
+            id INTEGER NOT NULL DEFAULT nextval('weekly_statistics_snapshots_id_seq'),
+            snapshot_id INTEGER REFERENCES data_snapshots(id) ON DELETE CASCADE,
+            snapshot_date DATE NOT NULL,
+            inv_type_code VARCHAR(10) NOT NULL,
+            hotel_id VARCHAR(10) NOT NULL,
+            week_start_date DATE NOT NULL,
+            week_end_date DATE NOT NULL,
+            actual_occupancy_rate DECIMAL(5,2),
+            actual_vacancy_rate DECIMAL(5,2),
+            total_occupancy_rate DECIMAL(5,2),
+            total_vacancy_rate DECIMAL(5,2),
+            total_rooms INTEGER NOT NULL,
+            total_available_days INTEGER NOT NULL,
+            total_days INTEGER NOT NULL DEFAULT 7,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, snapshot_date)
+        ) PARTITION BY RANGE (snapshot_date);
+        ALTER SEQUENCE weekly_statistics_snapshots_id_seq OWNED BY weekly_statistics_snapshots.id;
+
+        SELECT MIN(snapshot_date), MAX(snapshot_date) INTO min_date, max_date FROM data_snapshots;
+        PERFORM ensure_monthly_partitions('weekly_statistics_snapshots',
+                                          COALESCE(min_date, CURRENT_DATE),
+                                          GREATEST(COALESCE(max_date, CURRENT_DATE), CURRENT_DATE + 31));
+
+        INSERT INTO weekly_statistics_snapshots
+            (id, snapshot_id, snapshot_date, inv_type_code, hotel_id, week_start_date, week_end_date,
+             actual_occupancy_rate, actual_vacancy_rate, total_occupancy_rate, total_vacancy_rate,
+             total_rooms, total_available_days, total_days, created_at)
+        SELECT s.id, s.snapshot_id, ds.snapshot_date, s.inv_type_code, s.hotel_id, s.week_start_date, s.week_end_date,
+               s.actual_occupancy_rate, s.actual_vacancy_rate, s.total_occupancy_rate, s.total_vacancy_rate,
+               s.total_rooms, s.total_available_days, s.total_days, s.created_at
+        FROM weekly_statistics_snapshots_legacy s
+        JOIN data_snapshots ds ON ds.id = s.snapshot_id;
+
+        DROP TABLE weekly_statistics_snapshots_legacy;
+        CREATE INDEX IF NOT EXISTS idx_weekly_snapshots_lookup
+        ON weekly_statistics_snapshots(snapshot_id, inv_type_code, hotel_id, week_start_date);
+        CREATE INDEX IF NOT EXISTS idx_weekly_snapshots_week
+        ON weekly_statistics_snapshots(snapshot_id, week_start_date);
+    END IF;
+END $$;
+
+-- inventory_data 的索引（轉換時隨舊表刪除；已轉換的資料庫重新執行也會補建）
+CREATE INDEX IF NOT EXISTS idx_inventory_data_date ON inventory_data(date);
+CREATE INDEX IF NOT EXISTS idx_inventory_data_inv_type ON inventory_data(inv_type_code);
+CREATE INDEX IF NOT EXISTS idx_inventory_data_hotel_date ON inventory_data(hotel_id, date);
+
+-- 4. 重建快照摘要視圖（與 snapshot_schema.sql 相同，摘要已存於 data_snapshots）
+DROP VIEW IF EXISTS latest_snapshot_summary;
+CREATE VIEW latest_snapshot_summary AS
+SELECT
+    id,
+    snapshot_date,
+    snapshot_time,
+    description,
+    status,
+    total_records,
+    room_types_count,
+    hotels_count,
+    earliest_week,
+    latest_week,
+    inventory_records,
+    weekly_statistics_records,
+    size_bytes
+FROM data_snapshots
+WHERE status = 'completed'
+ORDER BY snapshot_date DESC;
+
+-- 5. 快照保留改為直接刪除整個分區
+CREATE OR REPLACE FUNCTION cleanup_old_snapshots(keep_days INTEGER DEFAULT 90)
+RETURNS INTEGER AS $$
+DECLARE
+    cutoff DATE := CURRENT_DATE - keep_days;
+    month_start DATE;
+    month_deleted INTEGER;
+    deleted_count INTEGER := 0;
+BEGIN
+    -- 只刪除整個月都早於保留期限、且快照全部完成的月份；
+    -- 含建立中或失敗快照的月份保留，以免刪掉正在寫入或待重試的資料
+    FOR month_start IN
+        SELECT date_trunc('month', snapshot_date)::date AS month
+        FROM data_snapshots
+        GROUP BY 1
+        HAVING bool_and(status = 'completed')
+           AND (date_trunc('month', MIN(snapshot_date)) + INTERVAL '1 month')::date <= cutoff
+        ORDER BY 1
+    LOOP
+        PERFORM drop_monthly_partition('inventory_snapshots', month_start);
+        PERFORM drop_monthly_partition('weekly_statistics_snapshots', month_start);
+
+        -- 分區與快照記錄在同一個交易中刪除
+        DELETE FROM data_snapshots
+        WHERE snapshot_date >= month_start
+          AND snapshot_date < (month_start + INTERVAL '1 month')::date;
+
+        GET DIAGNOSTICS month_deleted = ROW_COUNT;
+        deleted_count := deleted_count + month_deleted;
+    END LOOP;
+    RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,43 @@
+-- ================================
+-- 期間統計（月、季、自訂季節）資料庫結構
+-- ================================
+
+-- 1. 自訂季節定義（例如 summer 2025: 2025-07-01 ~ 2025-08-31）
+CREATE TABLE IF NOT EXISTS seasons (
+    id SERIAL PRIMARY KEY,
+    code VARCHAR(40) NOT NULL,          -- 季節代碼，跨年度相同（例如 summer）
+    name VARCHAR(100) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CHECK (end_date >= start_date),
+    UNIQUE(code, start_date)
+);
+
+-- 2. 期間統計表
+CREATE TABLE IF NOT EXISTS period_statistics (
+    id SERIAL PRIMARY KEY,
+    period_type VARCHAR(20) NOT NULL CHECK (period_type IN ('month', 'quarter', 'season')),
+    period_key VARCHAR(40) NOT NULL,    -- 2025-03 / 2025-Q1 / 季節代碼
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    inv_type_code VARCHAR(10) NOT NULL,
+    hotel_id VARCHAR(10) NOT NULL,
+    actual_occupancy_rate DECIMAL(5,2),
+    actual_vacancy_rate DECIMAL(5,2),
+    total_occupancy_rate DECIMAL(5,2),
+    total_vacancy_rate DECIMAL(5,2),
+    total_rooms INTEGER NOT NULL,
+    total_available_days INTEGER NOT NULL,
+    total_days INTEGER NOT NULL,
+    sold_rooms INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(period_type, period_key, hotel_id, inv_type_code, period_start)
+);
+
+-- 3. 創建索引：唯一鍵已涵蓋季節跨年度比較，另外加上依期間起始日查詢
+CREATE INDEX IF NOT EXISTS idx_period_statistics_range
+ON period_statistics(period_type, period_start, hotel_id);
+
+CREATE INDEX IF NOT EXISTS idx_seasons_range
+ON seasons(start_date, end_date);
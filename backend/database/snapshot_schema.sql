@@ -11,6 +11,14 @@ CREATE TABLE IF NOT EXISTS data_snapshots (
     status VARCHAR(20) DEFAULT 'completed' CHECK (status IN ('pending', 'processing', 'completed', 'failed')),
     total_records INTEGER DEFAULT 0,
     created_by VARCHAR(50) DEFAULT 'system',
+    -- 快照摘要：建立快照時一併寫入，列表與詳情不需彙總快照表
+    inventory_records INTEGER,
+    weekly_statistics_records INTEGER,
+    room_types_count INTEGER,
+    hotels_count INTEGER,
+    earliest_week DATE,
+    latest_week DATE,
+    size_bytes BIGINT,
     UNIQUE(snapshot_date)
 );
 
@@ -18,6 +26,7 @@ CREATE TABLE IF NOT EXISTS data_snapshots (
 CREATE TABLE IF NOT EXISTS inventory_snapshots (
     id SERIAL PRIMARY KEY,
     snapshot_id INTEGER REFERENCES data_snapshots(id) ON DELETE CASCADE,
+    snapshot_date DATE NOT NULL,        -- 分區鍵，見 partition_schema.sql
     inv_type_code VARCHAR(10) NOT NULL,
     hotel_id VARCHAR(10) NOT NULL,
     date DATE NOT NULL,
@@ -30,6 +39,7 @@ CREATE TABLE IF NOT EXISTS inventory_snapshots (
 CREATE TABLE IF NOT EXISTS weekly_statistics_snapshots (
     id SERIAL PRIMARY KEY,
     snapshot_id INTEGER REFERENCES data_snapshots(id) ON DELETE CASCADE,
+    snapshot_date DATE NOT NULL,        -- 分區鍵，見 partition_schema.sql
     inv_type_code VARCHAR(10) NOT NULL,
     hotel_id VARCHAR(10) NOT NULL,
     week_start_date DATE NOT NULL,
@@ -44,24 +54,84 @@ CREATE TABLE IF NOT EXISTS weekly_statistics_snapshots (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- 4. 創建視圖：最新快照摘要
-CREATE OR REPLACE VIEW latest_snapshot_summary AS
-SELECT 
-    ds.id,
-    ds.snapshot_date,
-    ds.snapshot_time,
-    ds.description,
-    ds.status,
-    ds.total_records,
-    COUNT(DISTINCT CONCAT(ws.inv_type_code, ws.hotel_id)) as room_types_count,
-    COUNT(DISTINCT ws.hotel_id) as hotels_count,
-    MIN(ws.week_start_date) as earliest_week,
-    MAX(ws.week_start_date) as latest_week
+-- 舊版資料庫補上 snapshot_date 欄位，並以 data_snapshots 填入既有列
+-- （讀取快照都以 snapshot_id 與 snapshot_date 篩選，留空的列不會被查到）
+ALTER TABLE inventory_snapshots ADD COLUMN IF NOT EXISTS snapshot_date DATE;
+ALTER TABLE weekly_statistics_snapshots ADD COLUMN IF NOT EXISTS snapshot_date DATE;
+
+UPDATE inventory_snapshots s SET snapshot_date = ds.snapshot_date
 FROM data_snapshots ds
-LEFT JOIN weekly_statistics_snapshots ws ON ds.id = ws.snapshot_id
-WHERE ds.status = 'completed'
-GROUP BY ds.id, ds.snapshot_date, ds.snapshot_time, ds.description, ds.status, ds.total_records
-ORDER BY ds.snapshot_date DESC;
+WHERE s.snapshot_id = ds.id AND s.snapshot_date IS NULL;
+
+UPDATE weekly_statistics_snapshots s SET snapshot_date = ds.snapshot_date
+FROM data_snapshots ds
+WHERE s.snapshot_id = ds.id AND s.snapshot_date IS NULL;
+
+-- 沒有對應快照的列（snapshot_id 為空）無法被讀取，直接刪除
+DELETE FROM inventory_snapshots WHERE snapshot_date IS NULL AND snapshot_id IS NULL;
+DELETE FROM weekly_statistics_snapshots WHERE snapshot_date IS NULL AND snapshot_id IS NULL;
+
+ALTER TABLE inventory_snapshots ALTER COLUMN snapshot_date SET NOT NULL;
+ALTER TABLE weekly_statistics_snapshots ALTER COLUMN snapshot_date SET NOT NULL;
+
+-- 舊版資料庫補上快照摘要欄位
+ALTER TABLE data_snapshots ADD COLUMN IF NOT EXISTS inventory_records INTEGER;
+ALTER TABLE data_snapshots ADD COLUMN IF NOT EXISTS weekly_statistics_records INTEGER;
+ALTER TABLE data_snapshots ADD COLUMN IF NOT EXISTS room_types_count INTEGER;
+ALTER TABLE data_snapshots ADD COLUMN IF NOT EXISTS hotels_count INTEGER;
+ALTER TABLE data_snapshots ADD COLUMN IF NOT EXISTS earliest_week DATE;
+ALTER TABLE data_snapshots ADD COLUMN IF NOT EXISTS latest_week DATE;
+ALTER TABLE data_snapshots ADD COLUMN IF NOT EXISTS size_bytes BIGINT;
+
+-- 為既有快照補算摘要（只處理尚未有摘要的快照，可重複執行）
+UPDATE data_snapshots ds
+SET weekly_statistics_records = COALESCE(ws.records, 0),
+    room_types_count = COALESCE(ws.room_types_count, 0),
+    hotels_count = COALESCE(ws.hotels_count, 0),
+    earliest_week = ws.earliest_week,
+    latest_week = ws.latest_week,
+    inventory_records = COALESCE(inv.records, 0),
+    size_bytes = COALESCE(ws.size_bytes, 0) + COALESCE(inv.size_bytes, 0)
+FROM data_snapshots target
+LEFT JOIN (
+    SELECT snapshot_id,
+           COUNT(*) AS records,
+           SUM(pg_column_size(w.*)) AS size_bytes,
+           COUNT(DISTINCT (inv_type_code, hotel_id)) AS room_types_count,
+           COUNT(DISTINCT hotel_id) AS hotels_count,
+           MIN(week_start_date) AS earliest_week,
+           MAX(week_start_date) AS latest_week
+    FROM weekly_statistics_snapshots w
+    GROUP BY snapshot_id
+) ws ON ws.snapshot_id = target.id
+LEFT JOIN (
+    SELECT snapshot_id, COUNT(*) AS records, SUM(pg_column_size(i.*)) AS size_bytes
+    FROM inventory_snapshots i
+    GROUP BY snapshot_id
+) inv ON inv.snapshot_id = target.id
+WHERE ds.id = target.id
+  AND ds.room_types_count IS NULL;
+
+-- 4. 快照摘要視圖（保留給既有查詢使用，摘要已存於 data_snapshots）
+DROP VIEW IF EXISTS latest_snapshot_summary;
+CREATE VIEW latest_snapshot_summary AS
+SELECT 
+    id,
+    snapshot_date,
+    snapshot_time,
+    description,
+    status,
+    total_records,
+    room_types_count,
+    hotels_count,
+    earliest_week,
+    latest_week,
+    inventory_records,
+    weekly_statistics_records,
+    size_bytes
+FROM data_snapshots
+WHERE status = 'completed'
+ORDER BY snapshot_date DESC;
 
 -- 5. 創建索引以提升查詢效能
 CREATE INDEX IF NOT EXISTS idx_inventory_snapshots_lookup 
@@ -70,6 +140,13 @@ ON inventory_snapshots(snapshot_id, inv_type_code, hotel_id, date);
 CREATE INDEX IF NOT EXISTS idx_weekly_snapshots_lookup 
 ON weekly_statistics_snapshots(snapshot_id, inv_type_code, hotel_id, week_start_date);
 
+-- 歷史時點查詢（as_of）依日期或週區間讀取單一快照
+CREATE INDEX IF NOT EXISTS idx_inventory_snapshots_date 
+ON inventory_snapshots(snapshot_id, date);
+
+CREATE INDEX IF NOT EXISTS idx_weekly_snapshots_week 
+ON weekly_statistics_snapshots(snapshot_id, week_start_date);
+
 CREATE INDEX IF NOT EXISTS idx_snapshots_date 
 ON data_snapshots(snapshot_date DESC);
 
@@ -87,3 +164,27 @@ BEGIN
     RETURN deleted_count;
 END;
 $$ LANGUAGE plpgsql;
+
+-- 7. 快照比較結果快取（完成的快照不再變動，同一組快照與篩選條件只計算一次；刪除快照時一併刪除）
+CREATE TABLE IF NOT EXISTS snapshot_comparisons (
+    from_snapshot_id INTEGER NOT NULL REFERENCES data_snapshots(id) ON DELETE CASCADE,
+    to_snapshot_id INTEGER NOT NULL REFERENCES data_snapshots(id) ON DELETE CASCADE,
+    filters_key VARCHAR(200) NOT NULL,  -- 篩選條件的 JSON 字串，例如 {"hotel_id": "2436"}
+    result JSON NOT NULL,  -- JSON 保留原始文字（JSONB 會重排鍵的順序），回應與直接計算時相同
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (from_snapshot_id, to_snapshot_id, filters_key)
+);
+
+-- 既有資料庫的 result 為 JSONB：改為 JSON，已保存的結果鍵順序已被重排，清除後重新計算
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'snapshot_comparisons' AND column_name = 'result') = 'jsonb' THEN
+        DELETE FROM snapshot_comparisons;
+        ALTER TABLE snapshot_comparisons ALTER COLUMN result TYPE JSON USING result::json;
+    END IF;
+END $$;
+
+-- 刪除快照時以 to_snapshot_id 找出要一併刪除的比較結果
+CREATE INDEX IF NOT EXISTS idx_snapshot_comparisons_to
+ON snapshot_comparisons(to_snapshot_id);
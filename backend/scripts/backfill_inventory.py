@@ -0,0 +1,101 @@
+"""
+歷史庫存批次匯入
+
+用法:
+    # 從檔案匯入（欄位需包含 inv_type_code, hotel_id, date, quantity, status；可直接使用 export_data.py 的匯出檔）
+    python scripts/backfill_inventory.py inventory_2023.csv inventory_2024.parquet
+
+    # 從 PMS 分段抽取兩年歷史
+    python scripts/backfill_inventory.py --pms --start-date 2023-01-01 --end-date 2024-12-31 --hotel-id 2436
+
+所有來源先 COPY 進暫存表，再一次合併進 inventory_data 並重算受影響的週統計與期間統計。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from backfill import PMS_CHUNK_DAYS, PMS_CONCURRENCY, run_backfill, stage_file, stage_pms  # noqa: E402
+from pms_client import HotelAPI  # noqa: E402
+
+
+def parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+async def backfill_inventory(args):
+    connection_params = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', '5432')),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', 'password'),
+        'database': os.getenv('DB_NAME', 'hotel_management')
+    }
+
+    conn = await asyncpg.connect(**connection_params)
+    print(f"✅ 成功連接到資料庫: {connection_params['host']}:{connection_params['port']}")
+    started = time.perf_counter()
+    failed = []
+
+    try:
+        if args.pms:
+            if args.hotel_id:
+                room_types = await conn.fetch(
+                    "SELECT inv_type_code, hotel_id FROM room_types WHERE hotel_id = $1", args.hotel_id)
+            else:
+                room_types = await conn.fetch("SELECT inv_type_code, hotel_id FROM room_types")
+            print(f"📥 從 PMS 抽取 {len(room_types)} 個房型 ({args.start_date} ~ {args.end_date})...")
+
+            async def stage(c):
+                return await stage_pms(c, HotelAPI(), room_types, args.start_date, args.end_date,
+                                       chunk_days=args.chunk_days, concurrency=args.concurrency, failed=failed)
+        else:
+            async def stage(c):
+                total = 0
+                for path in args.files:
+                    count = await stage_file(c, path)
+                    print(f"📥 {path}: {count} 筆")
+                    total += count
+                return total
+
+        result = await run_backfill(conn, stage, recompute=not args.skip_statistics)
+    finally:
+        await conn.close()
+
+    print(f"✅ 合併 {result.merged_rows} 筆庫存 ({result.start_date} ~ {result.end_date})")
+    print(f"📊 週統計 {result.weekly_statistics_rows} 筆, 期間統計 {result.period_statistics_rows} 筆")
+    for message in failed:
+        print(f"⚠️ 分段失敗: {message}")
+    print(f"⏱️ 耗時 {time.perf_counter() - started:.1f} 秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="歷史庫存批次匯入")
+    parser.add_argument("files", nargs="*", help="CSV 或 Parquet 檔案")
+    parser.add_argument("--pms", action="store_true", help="從 PMS 分段抽取，需指定日期範圍")
+    parser.add_argument("--start-date", type=parse_date, help="YYYY-MM-DD")
+    parser.add_argument("--end-date", type=parse_date, help="YYYY-MM-DD")
+    parser.add_argument("--hotel-id")
+    parser.add_argument("--chunk-days", type=int, default=PMS_CHUNK_DAYS)
+    parser.add_argument("--concurrency", type=int, default=PMS_CONCURRENCY)
+    parser.add_argument("--skip-statistics", action="store_true", help="只匯入庫存，不重算統計")
+    args = parser.parse_args()
+
+    if args.pms and not (args.start_date and args.end_date):
+        parser.error("--pms 需要 --start-date 與 --end-date")
+    if not args.pms and not args.files:
+        parser.error("請指定要匯入的檔案，或使用 --pms")
+
+    asyncio.run(backfill_inventory(args))
+
+
+if __name__ == "__main__":
+    main()
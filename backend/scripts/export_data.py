@@ -0,0 +1,67 @@
+"""
+匯出庫存、週統計或快照資料為 CSV / Parquet 檔案
+
+用法:
+    python scripts/export_data.py inventory --hotel-id 2436 --start-date 2023-01-01 --end-date 2025-12-31
+    python scripts/export_data.py weekly_statistics --format parquet -o weekly.parquet
+
+與 /export/{dataset} 端點使用相同的串流匯出，多年資料也只佔用固定記憶體。
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import asyncpg
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from export import EXPORT_DATASETS, EXPORT_FORMATS, build_export_query, export_filename, stream_export  # noqa: E402
+
+load_dotenv()
+
+
+def parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+async def export_data(args):
+    connection_params = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', '5432')),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', 'password'),
+        'database': os.getenv('DB_NAME', 'hotel_management')
+    }
+
+    query, query_args = build_export_query(args.dataset, args.hotel_id, args.inv_type_code,
+                                           args.start_date, args.end_date)
+    output = args.output or export_filename(args.dataset, args.format, args.start_date, args.end_date)
+
+    conn = await asyncpg.connect(**connection_params)
+    try:
+        written = 0
+        with open(output, "wb") as f:
+            async for chunk in stream_export(conn, args.format, query, query_args):
+                f.write(chunk)
+                written += len(chunk)
+        print(f"✅ 已匯出 {args.dataset} 到 {output} ({written / 1024 / 1024:.1f} MB)")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匯出資料為 CSV / Parquet")
+    parser.add_argument("dataset", choices=list(EXPORT_DATASETS))
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--hotel-id")
+    parser.add_argument("--inv-type-code")
+    parser.add_argument("--start-date", type=parse_date, help="YYYY-MM-DD")
+    parser.add_argument("--end-date", type=parse_date, help="YYYY-MM-DD")
+    parser.add_argument("-o", "--output", help="輸出檔案，預設依資料集與日期命名")
+    asyncio.run(export_data(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+入住率預測批次計算（每晚執行）
+
+用法:
+    python scripts/run_forecast.py
+    python scripts/run_forecast.py --hotel-id 2436 --workers 1
+
+crontab 範例（每天 02:30）:
+    30 2 * * * cd /app/backend && python scripts/run_forecast.py >> /app/logs/forecast.log 2>&1
+
+結果寫入 occupancy_forecasts，GET /forecasts 直接讀取。
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from forecast import FORECAST_WEEKS, FORECAST_WORKERS, run_forecast  # noqa: E402
+
+
+def parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+async def forecast(args):
+    connection_params = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', '5432')),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', 'password'),
+        'database': os.getenv('DB_NAME', 'hotel_management')
+    }
+
+    conn = await asyncpg.connect(**connection_params)
+    print(f"✅ 成功連接到資料庫: {connection_params['host']}:{connection_params['port']}")
+
+    try:
+        result = await run_forecast(conn, as_of=args.as_of, weeks=args.weeks,
+                                    hotel_id=args.hotel_id, workers=args.workers)
+    finally:
+        await conn.close()
+
+    print(f"📈 {result.hotels} 家酒店，寫入 {result.rows} 筆預測")
+    print(f"⏱️ 耗時 {result.duration_s} 秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入住率預測批次計算")
+    parser.add_argument("--hotel-id", help="只重算指定酒店")
+    parser.add_argument("--weeks", type=int, default=FORECAST_WEEKS, help="預測週數（含本週）")
+    parser.add_argument("--workers", type=int, default=FORECAST_WORKERS, help="平行擬合的行程數")
+    parser.add_argument("--as-of", type=parse_date, help="以指定日期為今天 (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    if args.weeks < 1:
+        parser.error("--weeks 必須大於 0")
+
+    asyncio.run(forecast(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+依房間資訊檔案同步房型
+
+用法:
+    python scripts/sync_room_types.py 房間資訊.xlsx
+    python scripts/sync_room_types.py new_campground.csv --dry-run
+    python scripts/sync_room_types.py 房間資訊.xlsx --delete-missing
+
+檔案欄位：inv_type_code（或 inv_type_c）、name、total_rooms（或 total_room）、hotel_id。
+只影響檔案中出現的酒店，可重複執行；與 /room-types/sync 端點使用相同的比對與批次寫入。
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from room_type_sync import read_room_types_file, sync_room_types  # noqa: E402
+
+
+async def sync_from_file(args):
+    connection_params = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', '5432')),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', 'password'),
+        'database': os.getenv('DB_NAME', 'hotel_management')
+    }
+
+    room_types = read_room_types_file(args.file)
+    print(f"📖 讀取 {len(room_types)} 筆房型: {args.file}")
+
+    conn = await asyncpg.connect(**connection_params)
+    try:
+        plan = await sync_room_types(conn, room_types, args.delete_missing, args.dry_run)
+    finally:
+        await conn.close()
+
+    for room in plan.inserts:
+        print(f"   ➕ Hotel {room.hotel_id}: {room.inv_type_code} - {room.name} ({room.total_rooms}間)")
+    for room in plan.updates:
+        print(f"   ✏️ Hotel {room.hotel_id}: {room.inv_type_code} - {room.name} ({room.total_rooms}間)")
+    for hotel_id, inv_type_code in plan.deletes:
+        print(f"   🗑️ Hotel {hotel_id}: {inv_type_code}")
+    for row in plan.blocked:
+        print(f"   ⛔ Hotel {row['hotel_id']}: {row['inv_type_code']} 仍有 {row['inventory_count']} 筆庫存、"
+              f"{row['statistics_count']} 筆統計，無法刪除")
+
+    summary = plan.summary()
+    prefix = "🔍 預覽" if args.dry_run else "✅ 同步完成"
+    print(f"{prefix}: 新增 {summary['inserted']}, 更新 {summary['updated']}, "
+          f"刪除 {summary['deleted']}, 未變更 {summary['unchanged']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="依房間資訊檔案同步房型")
+    parser.add_argument("file", nargs="?", default="房間資訊.xlsx", help=".xlsx 或 .csv")
+    parser.add_argument("--delete-missing", action="store_true", help="刪除檔案中酒店但不在檔案內的房型")
+    parser.add_argument("--dry-run", action="store_true", help="只顯示變更，不寫入")
+    asyncio.run(sync_from_file(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
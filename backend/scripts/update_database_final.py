@@ -1,11 +1,14 @@
 import asyncio
 import asyncpg
-import pandas as pd
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from room_type_sync import read_room_types_file, sync_room_types  # noqa: E402
+
 async def update_database_final():
     """最終版本：更新資料庫結構，支援多酒店相同房型代碼"""
     
@@ -51,16 +54,12 @@ async def update_database_final():
         
         # 步驟5: 讀取 Excel 資料並插入新的房型資料
         print("📖 讀取 Excel 房型資料...")
-        df = pd.read_excel('房間資訊.xlsx')
-        
-        print(f"📝 插入 {len(df)} 筆房型資料...")
-        for _, row in df.iterrows():
-            await conn.execute("""
-                INSERT INTO room_types (inv_type_code, name, total_rooms, hotel_id)
-                VALUES ($1, $2, $3, $4)
-            """, row['inv_type_c'], row['name'], row['total_room'], str(row['hotel_id']))
-            
-            print(f"   ✅ Hotel {row['hotel_id']}: {row['inv_type_c']} - {row['name']} ({row['total_room']}間)")
+        room_types = read_room_types_file('房間資訊.xlsx')
+        
+        print(f"📝 插入 {len(room_types)} 筆房型資料...")
+        plan = await sync_room_types(conn, room_types)
+        for room in plan.inserts:
+            print(f"   ✅ Hotel {room.hotel_id}: {room.inv_type_code} - {room.name} ({room.total_rooms}間)")
         
         # 步驟6: 為其他表格添加約束
         print("🔧 添加其他表格約束...")
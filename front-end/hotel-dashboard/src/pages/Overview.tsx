@@ -41,20 +41,17 @@ const Overview: React.FC = () => {
   const [error, setError] = useState<string | null>(null);
 
   // 載入數據
-  const loadData = async (hotelId?: string) => {
+  const loadData = async (hotelId?: string, silent: boolean = false) => {
     try {
-      setLoading(true);
+      if (!silent) setLoading(true);
       setError(null);
 
-      const [summaryData, chartsData, roomTypesData] = await Promise.all([
-        apiService.getDashboardSummary(hotelId),
-        apiService.getDashboardCharts(hotelId, 8),
-        apiService.getRoomTypes(hotelId),
-      ]);
+      // 摘要、圖表與房型一次請求取得
+      const bundle = await apiService.getDashboardBundle(hotelId, 8);
 
-      setSummary(summaryData);
-      setCharts(chartsData);
-      setRoomTypes(roomTypesData);
+      setSummary(bundle.summary);
+      setCharts(bundle.charts);
+      setRoomTypes(bundle.room_types);
     } catch (err: any) {
       setError(err.message || '載入數據失敗');
       console.error('Overview data loading error:', err);
@@ -80,6 +77,20 @@ const Overview: React.FC = () => {
     loadData(selectedHotel);
   }, [selectedHotel]);
 
+  // 後端資料更新時才重新載入；週更新會連續發出多個事件，合併為一次
+  useEffect(() => {
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    const unsubscribe = apiService.subscribeDataUpdates(() => {
+      clearTimeout(timer);
+      timer = setTimeout(() => loadData(selectedHotel, true), 2000);
+    }, selectedHotel);
+
+    return () => {
+      clearTimeout(timer);
+      unsubscribe();
+    };
+  }, [selectedHotel]);
+
   // 手動重新整理
   const handleRefresh = () => {
     loadData(selectedHotel);
@@ -44,6 +44,9 @@ const RoomManagement: React.FC = () => {
   const [editingKey, setEditingKey] = useState<number | null>(null);
   const [selectedHotel, setSelectedHotel] = useState<string | undefined>(undefined);
   const [isModalVisible, setIsModalVisible] = useState(false);
+  const [selectedRowKeys, setSelectedRowKeys] = useState<React.Key[]>([]);
+  const [bulkEditing, setBulkEditing] = useState(false);
+  const [drafts, setDrafts] = useState<Record<number, { name: string; total_rooms: number }>>({});
   const [form] = Form.useForm();
   const [editForm] = Form.useForm();
 
@@ -53,6 +56,7 @@ const RoomManagement: React.FC = () => {
     try {
       const data = await apiService.getRoomTypes(selectedHotel);
       setRoomTypes(data);
+      setSelectedRowKeys([]);
     } catch (error) {
       message.error('獲取房間數據失敗');
       console.error('Error fetching room types:', error);
@@ -134,6 +138,80 @@ const RoomManagement: React.FC = () => {
     }
   };
 
+  // 批次編輯：所有房型同時可編輯，保存時只送出有變更的房型
+  const startBulkEdit = () => {
+    const initial: Record<number, { name: string; total_rooms: number }> = {};
+    roomTypes.forEach(room => {
+      initial[room.id] = { name: room.name, total_rooms: room.total_rooms };
+    });
+    setDrafts(initial);
+    setEditingKey(null);
+    setBulkEditing(true);
+  };
+
+  const cancelBulkEdit = () => {
+    setBulkEditing(false);
+    setDrafts({});
+  };
+
+  const updateDraft = (id: number, changes: Partial<{ name: string; total_rooms: number }>) => {
+    setDrafts(prev => ({ ...prev, [id]: { ...prev[id], ...changes } }));
+  };
+
+  const getChangedRooms = () =>
+    roomTypes.filter(room => {
+      const draft = drafts[room.id];
+      return draft && (draft.name !== room.name || draft.total_rooms !== room.total_rooms);
+    });
+
+  const saveBulkEdit = async () => {
+    const changed = getChangedRooms();
+    if (changed.length === 0) {
+      cancelBulkEdit();
+      return;
+    }
+    if (changed.some(room => !drafts[room.id].name?.trim() || !(drafts[room.id].total_rooms >= 1))) {
+      message.error('房間名稱不可為空，房間總數必須大於0');
+      return;
+    }
+
+    try {
+      setLoading(true);
+      await apiService.batchRoomTypes({
+        updates: changed.map(room => ({
+          id: room.id,
+          name: drafts[room.id].name.trim(),
+          total_rooms: drafts[room.id].total_rooms
+        }))
+      });
+      message.success(`已更新 ${changed.length} 個房間類型`);
+      cancelBulkEdit();
+      await fetchRoomTypes();
+    } catch (error: any) {
+      const errorMessage = error.response?.data?.detail || '批次更新房間信息失敗';
+      message.error(errorMessage);
+      console.error('Error batch updating room types:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  // 批次刪除所選房間（任一房型仍有數據時全部不刪除）
+  const deleteSelected = async () => {
+    try {
+      setLoading(true);
+      await apiService.batchRoomTypes({ deletes: selectedRowKeys as number[] });
+      message.success(`已刪除 ${selectedRowKeys.length} 個房間類型`);
+      await fetchRoomTypes();
+    } catch (error: any) {
+      const errorMessage = error.response?.data?.detail || '批次刪除房間類型失敗';
+      message.error(errorMessage);
+      console.error('Error batch deleting room types:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   // 創建新房間
   const createRoomType = async (values: any) => {
     try {
@@ -172,6 +250,14 @@ const RoomManagement: React.FC = () => {
       dataIndex: 'name',
       key: 'name',
       render: (text: string, record: RoomType) => {
+        if (bulkEditing) {
+          return (
+            <Input
+              value={drafts[record.id]?.name}
+              onChange={e => updateDraft(record.id, { name: e.target.value })}
+            />
+          );
+        }
         const isEditing = record.id === editingKey;
         return isEditing ? (
           <Form.Item
@@ -192,6 +278,16 @@ const RoomManagement: React.FC = () => {
       key: 'total_rooms',
       width: 120,
       render: (text: number, record: RoomType) => {
+        if (bulkEditing) {
+          return (
+            <InputNumber
+              min={1}
+              style={{ width: '100%' }}
+              value={drafts[record.id]?.total_rooms}
+              onChange={value => updateDraft(record.id, { total_rooms: Number(value ?? 0) })}
+            />
+          );
+        }
         const isEditing = record.id === editingKey;
         return isEditing ? (
           <Form.Item
@@ -265,7 +361,7 @@ const RoomManagement: React.FC = () => {
               icon={<EditOutlined />}
               size="small"
               onClick={() => startEdit(record)}
-              disabled={editingKey !== null}
+              disabled={editingKey !== null || bulkEditing}
             >
               編輯
             </Button>
@@ -281,7 +377,7 @@ const RoomManagement: React.FC = () => {
                 danger
                 icon={<DeleteOutlined />}
                 size="small"
-                disabled={editingKey !== null}
+                disabled={editingKey !== null || bulkEditing}
               >
                 刪除
               </Button>
@@ -331,13 +427,54 @@ const RoomManagement: React.FC = () => {
             </Space>
           </Col>
           <Col>
-            <Button
-              type="primary"
-              icon={<PlusOutlined />}
-              onClick={() => setIsModalVisible(true)}
-            >
-              新增房間類型
-            </Button>
+            <Space>
+              {bulkEditing ? (
+                <>
+                  <Button
+                    type="primary"
+                    icon={<SaveOutlined />}
+                    onClick={saveBulkEdit}
+                    loading={loading}
+                  >
+                    保存全部（{getChangedRooms().length}）
+                  </Button>
+                  <Button icon={<CloseOutlined />} onClick={cancelBulkEdit}>
+                    取消
+                  </Button>
+                </>
+              ) : (
+                <Button
+                  icon={<EditOutlined />}
+                  onClick={startBulkEdit}
+                  disabled={editingKey !== null || roomTypes.length === 0}
+                >
+                  批次編輯
+                </Button>
+              )}
+              <Popconfirm
+                title={`確定要刪除所選的 ${selectedRowKeys.length} 個房間類型嗎？`}
+                description="任一房型仍有庫存或統計數據時，全部不會刪除。"
+                onConfirm={deleteSelected}
+                okText="確定"
+                cancelText="取消"
+                disabled={selectedRowKeys.length === 0}
+              >
+                <Button
+                  danger
+                  icon={<DeleteOutlined />}
+                  disabled={selectedRowKeys.length === 0 || bulkEditing}
+                >
+                  刪除所選（{selectedRowKeys.length}）
+                </Button>
+              </Popconfirm>
+              <Button
+                type="primary"
+                icon={<PlusOutlined />}
+                onClick={() => setIsModalVisible(true)}
+              >
+                新增房間類型
+              </Button>
+            </Space>
           </Col>
         </Row>
       </Card>
@@ -357,6 +494,11 @@ const RoomManagement: React.FC = () => {
             columns={columns}
             rowKey="id"
             loading={loading}
+            rowSelection={{
+              selectedRowKeys,
+              onChange: setSelectedRowKeys,
+              getCheckboxProps: () => ({ disabled: bulkEditing })
+            }}
             pagination={{
               total: roomTypes.length,
               pageSize: 10,
@@ -37,6 +37,7 @@ import {
   formatDate,
   getStatusTag,
   formatNumber,
+  formatBytes,
   getChangeDisplay,
 } from '../utils/format';
 
@@ -85,11 +86,22 @@ const Snapshots: React.FC = () => {
     loadWeeklyChanges();
   }, []);
 
+  // 快照在背景建立，完成時（snapshot.created）重新載入列表
+  useEffect(() => {
+    const unsubscribe = apiService.subscribeDataUpdates((event) => {
+      if (event.event === 'snapshot.created') {
+        loadSnapshots();
+        loadWeeklyChanges();
+      }
+    });
+    return unsubscribe;
+  }, []);
+
   // 創建新快照
   const handleCreateSnapshot = async () => {
     try {
-      await apiService.createSnapshot(newSnapshotDescription || undefined);
-      message.success('快照創建成功');
+      const result = await apiService.createSnapshot(newSnapshotDescription || undefined);
+      message.success(result.status === 'completed' ? '今天的快照已存在' : '快照建立中，完成後自動更新列表');
       setCreateModalVisible(false);
       setNewSnapshotDescription('');
       loadSnapshots();
@@ -184,6 +196,20 @@ const Snapshots: React.FC = () => {
       key: 'hotels_count',
       render: (value: number) => value || '-',
     },
+    {
+      title: '週範圍',
+      key: 'week_range',
+      render: (_, record: DataSnapshot) =>
+        record.earliest_week && record.latest_week
+          ? `${formatDate(record.earliest_week)} ~ ${formatDate(record.latest_week)}`
+          : '-',
+    },
+    {
+      title: '大小',
+      dataIndex: 'size_bytes',
+      key: 'size_bytes',
+      render: (value?: number | null) => (value != null ? formatBytes(value) : '-'),
+    },
     {
       title: '操作',
       key: 'actions',
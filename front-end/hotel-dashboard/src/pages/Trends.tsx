@@ -126,14 +126,19 @@ const Trends: React.FC = () => {
 
   // 準備熱力圖數據
   const prepareHeatmapData = () => {
-    if (!heatmapData?.charts.room_performance_heatmap) return [];
+    const matrix = heatmapData?.charts.room_performance_matrix;
+    if (!matrix) return [];
     
-    return heatmapData.charts.room_performance_heatmap.map(item => ({
-      roomType: item.inv_type_code,
-      week: getWeekRange(item.week_start_date),
-      occupancy: item.actual_occupancy_rate,
-      date: item.week_start_date,
-    }));
+    return matrix.room_types.flatMap((roomType, i) =>
+      matrix.weeks
+        .map((week, j) => ({
+          roomType: roomType.inv_type_code,
+          week: getWeekRange(week),
+          occupancy: matrix.occupancy[i][j],
+          date: week,
+        }))
+        .filter(item => item.occupancy !== null)
+    );
   };
 
   // 準備表格數據
@@ -2,15 +2,30 @@ import axios, { AxiosInstance, AxiosResponse } from 'axios';
 import {
   ApiResponse,
   RoomType,
+  RoomTypeBatchRequest,
+  RoomTypeBatchResult,
   WeeklyStatistics,
   DataSnapshot,
   DashboardSummary,
   RoomTypeTrends,
   DashboardCharts,
+  DashboardBundle,
+  DataUpdateEvent,
+  DataUpdateEventName,
   SnapshotComparison,
+  SnapshotInventoryDiff,
+  SnapshotInventoryDiffParams,
+  SnapshotRestore,
   WeeklyChanges,
   InventoryData,
-  SalesStatus
+  SalesStatus,
+  BookingPace,
+  BookingPickup,
+  OccupancyForecasts,
+  AvailabilitySearch,
+  AvailabilitySearchParams,
+  InventoryAlertRule,
+  InventoryAlerts
 } from '../types/api';
 
 // API 基礎配置
@@ -117,12 +132,14 @@ class ApiService {
   async getWeeklyStatistics(
     invTypeCode?: string,
     weeks?: number,
-    hotelId?: string
+    hotelId?: string,
+    asOf?: string
   ): Promise<WeeklyStatistics[]> {
     const params: any = {};
     if (invTypeCode) params.inv_type_code = invTypeCode;
     if (weeks) params.weeks = weeks;
     if (hotelId) params.hotel_id = hotelId;
+    if (asOf) params.as_of = asOf;
 
     const response = await this.api.get('/weekly-statistics', { params });
     return response.data;
@@ -139,7 +156,10 @@ class ApiService {
   // ===================
   // 快照管理 API
   // ===================
-  async createSnapshot(description?: string): Promise<ApiResponse<{ snapshot_id: number }>> {
+  // 快照在背景建立，完成時發出 snapshot.created；今天已有快照時返回同一個快照
+  async createSnapshot(
+    description?: string
+  ): Promise<ApiResponse & { snapshot_id: number; status: DataSnapshot['status'] }> {
     const params = description ? { description } : {};
     const response = await this.api.post('/create-snapshot', null, { params });
     return response.data;
@@ -160,13 +180,44 @@ class ApiService {
     return response.data;
   }
 
+  // 預設只預覽差異，dryRun=false 時才寫回即時資料
+  async restoreSnapshot(
+    snapshotId: number,
+    hotelId?: string,
+    dryRun: boolean = true
+  ): Promise<SnapshotRestore> {
+    const params: any = { dry_run: dryRun };
+    if (hotelId) params.hotel_id = hotelId;
+
+    const response = await this.api.post(`/snapshots/${snapshotId}/restore`, null, { params });
+    return response.data;
+  }
+
   // ===================
   // 比較分析 API
   // ===================
-  async compareSnapshots(fromDate: string, toDate: string): Promise<SnapshotComparison> {
-    const response = await this.api.get('/compare-snapshots', {
-      params: { from_date: fromDate, to_date: toDate },
-    });
+  async compareSnapshots(fromDate: string, toDate: string, hotelId?: string): Promise<SnapshotComparison> {
+    const params: any = { from_date: fromDate, to_date: toDate };
+    if (hotelId) params.hotel_id = hotelId;
+
+    const response = await this.api.get('/compare-snapshots', { params });
+    return response.data;
+  }
+
+  async getSnapshotInventoryDiff(
+    fromDate: string,
+    toDate: string,
+    options: SnapshotInventoryDiffParams = {}
+  ): Promise<SnapshotInventoryDiff> {
+    const params: any = { from_date: fromDate, to_date: toDate };
+    if (options.hotelId) params.hotel_id = options.hotelId;
+    if (options.invTypeCode) params.inv_type_code = options.invTypeCode;
+    if (options.startDate) params.start_date = options.startDate;
+    if (options.endDate) params.end_date = options.endDate;
+    if (options.limit) params.limit = options.limit;
+    if (options.cursor) params.cursor = options.cursor;
+
+    const response = await this.api.get('/compare-snapshots/inventory', { params });
     return response.data;
   }
 
@@ -178,11 +229,87 @@ class ApiService {
     return response.data;
   }
 
+  // ===================
+  // 訂房進度 API
+  // ===================
+  async getBookingPace(
+    startDate: string,
+    endDate: string,
+    hotelId?: string,
+    invTypeCode?: string,
+    maxDays: number = 90
+  ): Promise<BookingPace> {
+    const params: any = { start_date: startDate, end_date: endDate, max_days: maxDays };
+    if (hotelId) params.hotel_id = hotelId;
+    if (invTypeCode) params.inv_type_code = invTypeCode;
+
+    const response = await this.api.get('/booking-pace', { params });
+    return response.data;
+  }
+
+  async getBookingPickup(
+    startDate: string,
+    endDate: string,
+    hotelId?: string,
+    days: number = 7
+  ): Promise<BookingPickup> {
+    const params: any = { start_date: startDate, end_date: endDate, days };
+    if (hotelId) params.hotel_id = hotelId;
+
+    const response = await this.api.get('/booking-pace/pickup', { params });
+    return response.data;
+  }
+
+  // ===================
+  // 入住率預測 API
+  // ===================
+  async getForecasts(hotelId?: string, invTypeCode?: string, weeks: number = 26): Promise<OccupancyForecasts> {
+    const params: any = { weeks };
+    if (hotelId) params.hotel_id = hotelId;
+    if (invTypeCode) params.inv_type_code = invTypeCode;
+
+    const response = await this.api.get('/forecasts', { params });
+    return response.data;
+  }
+
+  // ===================
+  // 空房搜尋 API
+  // ===================
+  async searchAvailability(params: AvailabilitySearchParams): Promise<AvailabilitySearch> {
+    const response = await this.api.get('/availability/search', { params });
+    return response.data;
+  }
+
+  // ===================
+  // 庫存告警 API
+  // ===================
+  async getAlerts(
+    hotelId?: string,
+    rule?: InventoryAlertRule,
+    includeAcknowledged: boolean = false,
+    limit: number = 100
+  ): Promise<InventoryAlerts> {
+    const params: any = { include_acknowledged: includeAcknowledged, limit };
+    if (hotelId) params.hotel_id = hotelId;
+    if (rule) params.rule = rule;
+
+    const response = await this.api.get('/alerts', { params });
+    return response.data;
+  }
+
+  async acknowledgeAlert(alertId: number): Promise<{ success: boolean; id: number; acknowledged_at: string }> {
+    const response = await this.api.post(`/alerts/${alertId}/acknowledge`);
+    return response.data;
+  }
+
   // ===================
   // Dashboard 專用 API
   // ===================
-  async getDashboardSummary(hotelId?: string): Promise<DashboardSummary> {
-    const params = hotelId ? { hotel_id: hotelId } : {};
+  // asOf: YYYY-MM-DD 日期或快照 ID，讀取該時點的快照
+  async getDashboardSummary(hotelId?: string, asOf?: string): Promise<DashboardSummary> {
+    const params: any = {};
+    if (hotelId) params.hotel_id = hotelId;
+    if (asOf) params.as_of = asOf;
     const response = await this.api.get('/dashboard-summary', { params });
     return response.data;
   }
@@ -190,22 +317,51 @@ class ApiService {
   async getRoomTypeTrends(
     invTypeCode: string,
     hotelId: string,
-    weeks: number = 12
+    weeks: number = 12,
+    asOf?: string
   ): Promise<RoomTypeTrends> {
-    const response = await this.api.get(`/room-type-trends/${invTypeCode}`, {
-      params: { hotel_id: hotelId, weeks },
-    });
+    const params: any = { hotel_id: hotelId, weeks };
+    if (asOf) params.as_of = asOf;
+
+    const response = await this.api.get(`/room-type-trends/${invTypeCode}`, { params });
     return response.data;
   }
 
-  async getDashboardCharts(hotelId?: string, weeks: number = 8): Promise<DashboardCharts> {
+  async getDashboardCharts(hotelId?: string, weeks: number = 8, asOf?: string): Promise<DashboardCharts> {
     const params: any = { weeks };
     if (hotelId) params.hotel_id = hotelId;
+    if (asOf) params.as_of = asOf;
 
     const response = await this.api.get('/dashboard-charts', { params });
     return response.data;
   }
 
+  async getDashboardBundle(hotelId?: string, weeks: number = 8): Promise<DashboardBundle> {
+    const params: any = { weeks };
+    if (hotelId) params.hotel_id = hotelId;
+
+    const response = await this.api.get('/dashboard-bundle', { params });
+    return response.data;
+  }
+
+  // ===================
+  // 資料更新事件（SSE）
+  // ===================
+  subscribeDataUpdates(onUpdate: (event: DataUpdateEvent) => void, hotelId?: string): () => void {
+    const url = new URL(`${API_BASE_URL}/events`, window.location.origin);
+    if (hotelId) url.searchParams.set('hotel_id', hotelId);
+
+    const source = new EventSource(url.toString());
+    const events: DataUpdateEventName[] = [
+      'inventory.updated', 'statistics.updated', 'snapshot.created', 'forecasts.updated', 'alerts.fired'
+    ];
+    const handler = (e: MessageEvent) => onUpdate(JSON.parse(e.data));
+    events.forEach(name => source.addEventListener(name, handler as EventListener));
+
+    // 斷線時 EventSource 會依伺服器的 retry 設定自動重連
+    return () => source.close();
+  }
+
   // ===================
   // 銷售狀況 API
   // ===================
@@ -214,6 +370,7 @@ class ApiService {
     end_date: string;
     hotel_id?: string;
     inv_type_code?: string;
+    as_of?: string;
   }): Promise<SalesStatus> {
     const searchParams = new URLSearchParams({
       start_date: params.start_date,
@@ -228,6 +385,10 @@ class ApiService {
       searchParams.append('inv_type_code', params.inv_type_code);
     }
     
+    if (params.as_of) {
+      searchParams.append('as_of', params.as_of);
+    }
+    
     const response = await this.api.get(`/sales-status?${searchParams}`);
     return response.data;
   }
@@ -261,6 +422,12 @@ class ApiService {
     const response = await this.api.delete(`/room-types/${roomId}`);
     return response.data;
   }
+
+  // 批次新增、更新、刪除房間類型（一次請求、單一交易）
+  async batchRoomTypes(data: RoomTypeBatchRequest): Promise<RoomTypeBatchResult> {
+    const response = await this.api.post('/room-types/batch', data);
+    return response.data;
+  }
 }
 
 // 創建單例實例
@@ -17,6 +17,29 @@ export interface RoomType {
   updated_at: string;
 }
 
+// 房型批次變更（/room-types/batch，單一交易全部套用或全部不套用）
+export interface RoomTypeBatchRequest {
+  creates?: Array<{
+    inv_type_code: string;
+    name: string;
+    total_rooms: number;
+    hotel_id: string;
+  }>;
+  updates?: Array<{
+    id: number;
+    name: string;
+    total_rooms: number;
+  }>;
+  deletes?: number[];
+}
+
+export interface RoomTypeBatchResult {
+  success: boolean;
+  created: RoomType[];
+  updated: RoomType[];
+  deleted: number[];
+}
+
 // 庫存數據類型
 export interface InventoryData {
   date: string;
@@ -55,11 +78,21 @@ export interface DataSnapshot {
   hotels_count?: number;
   earliest_week?: string;
   latest_week?: string;
+  inventory_records?: number;
+  weekly_statistics_records?: number;
+  size_bytes?: number | null;
+}
+
+// 歷史時點查詢（as_of）實際使用的快照，即時資料為 null
+export interface AsOfSnapshot {
+  snapshot_id: number;
+  snapshot_date: string;
 }
 
 // Dashboard 摘要類型
 export interface DashboardSummary {
   success: boolean;
+  as_of?: AsOfSnapshot | null;
   summary: {
     total_hotels: number;
     total_room_types: number;
@@ -91,6 +124,7 @@ export interface DashboardSummary {
 // 房型趨勢類型
 export interface RoomTypeTrends {
   success: boolean;
+  as_of?: AsOfSnapshot | null;
   room_type: RoomType;
   period: string;
   data_points: WeeklyStatistics[];
@@ -118,7 +152,18 @@ export interface DashboardCharts {
       avg_occupancy: number;
       room_types_count: number;
     }>;
-    room_performance_heatmap: Array<{
+    // 房型 × 週矩陣：occupancy[i][j] 為 room_types[i] 在 weeks[j] 的入住率
+    room_performance_matrix: {
+      weeks: string[];
+      room_types: Array<{
+        inv_type_code: string;
+        hotel_id: string;
+        hotel_name?: string;
+      }>;
+      occupancy: Array<Array<number | null>>;
+    };
+    // 舊版逐筆格式，僅在 heatmap=rows 時返回
+    room_performance_heatmap?: Array<{
       inv_type_code: string;
       hotel_id: string;
       hotel_name?: string;
@@ -137,9 +182,35 @@ export interface DashboardCharts {
     period: string;
     hotel_id: string | null;
     data_points: number;
+    as_of?: AsOfSnapshot | null;
   };
 }
 
+// Dashboard 總覽頁整合數據類型
+export interface DashboardBundle {
+  success: boolean;
+  summary: DashboardSummary;
+  charts: DashboardCharts;
+  room_types: RoomType[];
+  weekly_statistics: WeeklyStatistics[];
+  snapshots: DataSnapshot[];
+}
+
+// 資料更新事件（/events SSE）
+export type DataUpdateEventName =
+  | 'inventory.updated'
+  | 'statistics.updated'
+  | 'snapshot.created'
+  | 'forecasts.updated'
+  | 'alerts.fired';
+
+export interface DataUpdateEvent {
+  event: DataUpdateEventName;
+  ts: string;
+  hotel_id?: string | null;
+  [key: string]: any;
+}
+
 // 快照比較類型
 export interface SnapshotComparison {
   success: boolean;
@@ -171,6 +242,67 @@ export interface SnapshotComparison {
   };
 }
 
+// 快照庫存逐日比較類型（游標分頁）
+export interface SnapshotInventoryChange {
+  inv_type_code: string;
+  hotel_id: string;
+  date: string;
+  from_quantity: number | null;
+  to_quantity: number | null;
+  from_status: 'OPEN' | 'CLOSE' | null;
+  to_status: 'OPEN' | 'CLOSE' | null;
+  change_type: 'new' | 'removed' | 'changed';
+  quantity_diff: number | null;
+}
+
+export interface SnapshotInventoryDiff {
+  success: boolean;
+  from_snapshot: { id: number; snapshot_date: string };
+  to_snapshot: { id: number; snapshot_date: string };
+  count: number;
+  changes: SnapshotInventoryChange[];
+  next_cursor: string | null;
+}
+
+export interface SnapshotInventoryDiffParams {
+  hotelId?: string;
+  invTypeCode?: string;
+  startDate?: string;
+  endDate?: string;
+  limit?: number;
+  cursor?: string;
+}
+
+// 快照還原類型（dry_run 時只返回差異，不寫入）
+export interface SnapshotRestoreCounts {
+  insert: number;
+  update: number;
+  delete: number;
+}
+
+export interface SnapshotRestoreChange {
+  action: 'insert' | 'update' | 'delete';
+  inv_type_code: string;
+  hotel_id: string;
+  date: string;
+  current_quantity: number | null;
+  snapshot_quantity: number | null;
+  current_status: 'OPEN' | 'CLOSE' | null;
+  snapshot_status: 'OPEN' | 'CLOSE' | null;
+}
+
+export interface SnapshotRestore {
+  success: boolean;
+  dry_run: boolean;
+  snapshot: { snapshot_id: number; snapshot_date: string };
+  hotel_id: string | null;
+  inventory: SnapshotRestoreCounts;
+  weekly_statistics: SnapshotRestoreCounts;
+  date_range: { start_date: string | null; end_date: string | null };
+  period_statistics_rows: number;
+  preview: SnapshotRestoreChange[];
+}
+
 // 週變化趨勢類型
 export interface WeeklyChanges {
   success: boolean;
@@ -198,6 +330,7 @@ export interface WeeklyChanges {
 // 銷售狀況類型
 export interface SalesStatus {
   success: boolean;
+  as_of?: AsOfSnapshot | null;
   period: {
     start_date: string;
     end_date: string;
@@ -238,3 +371,133 @@ export interface SalesStatus {
     avg_occupancy_rate: number;
   }>;
 }
+
+// 訂房進度類型（pace / pickup）
+export interface BookingPacePoint {
+  days_before_arrival: number;
+  sold_rooms: number;
+  stay_dates: number;
+}
+
+export interface BookingPace {
+  success: boolean;
+  start_date: string;
+  end_date: string;
+  as_of: string;
+  hotel_id: string | null;
+  inv_type_code: string | null;
+  stay_dates: number;
+  pace: BookingPacePoint[];
+  last_year?: {
+    start_date: string;
+    end_date: string;
+    stay_dates: number;
+    pace: BookingPacePoint[];
+  };
+}
+
+export interface BookingPickup {
+  success: boolean;
+  as_of: string;
+  days: number;
+  hotel_id: string | null;
+  inv_type_code: string | null;
+  count: number;
+  pickup: Array<{
+    stay_date: string;
+    days_before_arrival: number;
+    on_the_books: number | null;
+    pickup: number | null;
+    last_year_on_the_books: number | null;
+    last_year_pickup: number | null;
+  }>;
+}
+
+// 入住率預測類型（每晚預先計算）
+export type ForecastModel = 'seasonal' | 'pickup' | 'blend' | 'on_the_books';
+
+export interface OccupancyForecast {
+  hotel_id: string;
+  hotel_name: string;
+  inv_type_code: string;
+  room_type_name: string;
+  week_start_date: string;
+  week_end_date: string;
+  forecast_occupancy_rate: number;
+  on_the_books_rate: number | null;
+  baseline_rate: number | null;
+  pickup_rate: number | null;
+  lead_days: number;
+  model: ForecastModel;
+  generated_at: string;
+}
+
+export interface OccupancyForecasts {
+  success: boolean;
+  hotel_id: string | null;
+  inv_type_code: string | null;
+  generated_at: string | null;
+  count: number;
+  forecasts: OccupancyForecast[];
+}
+
+// 空房搜尋類型
+export interface AvailabilitySearchParams {
+  start_date: string;
+  end_date: string;
+  min_units?: number;
+  hotel_id?: string;
+  inv_type_code?: string;
+  require_all_dates?: boolean;
+}
+
+export interface AvailabilityMatch {
+  hotel_id: string;
+  hotel_name: string;
+  inv_type_code: string;
+  room_type_name: string;
+  min_available: number;
+  dates: Array<{
+    date: string;
+    available: number;
+  }>;
+}
+
+export interface AvailabilitySearch {
+  success: boolean;
+  start_date: string;
+  end_date: string;
+  min_units: number;
+  require_all_dates: boolean;
+  index_loaded_at: string;
+  hotels: Array<{
+    hotel_id: string;
+    hotel_name: string;
+    room_types: number;
+  }>;
+  count: number;
+  results: AvailabilityMatch[];
+}
+
+// 庫存告警類型
+export type InventoryAlertRule = 'low_availability' | 'occupancy_jump' | 'status_closed' | 'suspicious_response';
+
+export interface InventoryAlert {
+  id: number;
+  rule: InventoryAlertRule;
+  severity: 'info' | 'warning' | 'critical';
+  hotel_id: string;
+  hotel_name: string;
+  inv_type_code: string | null;
+  target_date: string | null;
+  message: string;
+  details: Record<string, any>;
+  fired_at: string;
+  acknowledged_at: string | null;
+}
+
+export interface InventoryAlerts {
+  success: boolean;
+  count: number;
+  alerts: InventoryAlert[];
+}
@@ -36,6 +36,20 @@ export const formatNumber = (value: number): string => {
   return new Intl.NumberFormat('zh-TW').format(value);
 };
 
+/**
+ * 格式化資料大小
+ */
+export const formatBytes = (bytes: number): string => {
+  const units = ['B', 'KB', 'MB', 'GB'];
+  let value = bytes;
+  let unit = 0;
+  while (value >= 1024 && unit < units.length - 1) {
+    value /= 1024;
+    unit += 1;
+  }
+  return `${unit === 0 ? value : value.toFixed(1)} ${units[unit]}`;
+};
+
 /**
  * 獲取相對時間
  */